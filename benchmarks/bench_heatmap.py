@@ -0,0 +1,134 @@
+"""Broker-free benchmarks of the SkeletonsHeatmap stages.
+
+Each result is printed as a JSON line. Run from the repository root, as synthetic
+data comes from the tests, e.g.:
+
+    python -m benchmarks.bench_heatmap --quick > bench_output.txt
+"""
+import argparse
+import itertools
+import json
+import sys
+import time
+from typing import Any, Callable, Dict, Iterator, List, TextIO
+
+import numpy as np
+from google.protobuf.json_format import ParseDict
+
+from is_skeletons_heatmap.conf.options_pb2 import SkeletonsHeatmapOptions
+from is_skeletons_heatmap.heatmap import SkeletonsHeatmap
+from is_skeletons_heatmap.render import HeatmapRenderer
+from is_skeletons_heatmap.transformation import (
+    StaticTransformationFetcher,
+    transform_object_annotations,
+)
+from is_skeletons_heatmap.utils import array2image
+
+from tests.synthetic import synthetic_annotations, synthetic_transformations
+
+DST_FRAME = 1000
+
+BASE_OPTIONS = {
+    "limits": {"xmin": -4.0, "xmax": 4.0, "ymin": -4.0, "ymax": 4.0},
+    "output_scale": 3.0,
+    "referential": {"x": 0.0, "y": 0.0, "length": 50},
+    "frame_id": DST_FRAME,
+    "draw_grid": True,
+    "flip_vertical": True,
+    "log_scale": True,
+    "period_ms": 200,
+}
+
+
+def timings(function: Callable[[], Any], repeat: int) -> Dict[str, float]:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        samples.append((time.perf_counter() - start) * 1000.0)
+    return {
+        "mean_ms": float(np.mean(samples)),
+        "p50_ms": float(np.percentile(samples, 50)),
+        "p95_ms": float(np.percentile(samples, 95)),
+        "min_ms": float(np.min(samples)),
+        "repeat": repeat,
+    }
+
+
+def scenarios(quick: bool) -> Iterator[Dict[str, Any]]:
+    bins_steps = [0.05, 0.01] if quick else [0.1, 0.05, 0.02, 0.01]
+    samples = [0, 100] if quick else [0, 1000, 10000]
+    loads = [(5, 18, 1), (20, 18, 4)] if quick else [(5, 18, 1), (20, 18, 4), (50, 25, 8)]
+    for bins_step, n_samples, (people, keypoints, frames) in itertools.product(
+        bins_steps,
+        samples,
+        loads,
+    ):
+        yield {
+            "bins_step": bins_step,
+            "samples": n_samples,
+            "people": people,
+            "keypoints": keypoints,
+            "frames": frames,
+        }
+
+
+def run_scenario(scenario: Dict[str, Any], repeat: int) -> List[Dict[str, Any]]:
+    rng = np.random.default_rng(seed=0)
+    options = ParseDict(BASE_OPTIONS, SkeletonsHeatmapOptions())
+    options.bins_step = scenario["bins_step"]
+    options.samples = scenario["samples"]
+    frame_ids = [DST_FRAME + frame for frame in range(scenario["frames"])]
+    transformations = synthetic_transformations(frame_ids, DST_FRAME, rng)
+    heatmap = SkeletonsHeatmap(options, StaticTransformationFetcher(transformations))
+    ticks = [
+        synthetic_annotations(
+            people=scenario["people"],
+            keypoints=scenario["keypoints"],
+            frame_ids=frame_ids,
+            limits=options.limits,
+            transformations=transformations,
+            dst=DST_FRAME,
+            rng=rng,
+        )
+        for _ in range(16)
+    ]
+    # fills the window, so evictions are part of the measured updates
+    for tick in range(scenario["samples"]):
+        heatmap.update_heatmap(ticks[tick % len(ticks)])
+
+    cycle = itertools.cycle(ticks)
+    renderer = HeatmapRenderer(options, heatmap.get_histogram().shape)
+    histogram = np.log10(np.clip(heatmap.get_histogram(), a_min=1.0, a_max=None))
+    image = heatmap.get_np_image()
+    annotations = ticks[0][-1]
+    transformation = transformations.get(annotations.frame_id, {}).get(DST_FRAME, np.eye(4))
+    stages = {
+        "update_heatmap": lambda: heatmap.update_heatmap(next(cycle)),
+        "transform_object_annotations": lambda: transform_object_annotations(
+            annotations,
+            transformation,
+            DST_FRAME,
+        ),
+        "render": lambda: renderer.render(histogram),
+        "encode": lambda: array2image(image, encode_format=".jpeg", compression_level=0.8),
+    }
+    return [
+        {"stage": stage, **scenario, **timings(function, repeat)}
+        for stage, function in stages.items()
+    ]
+
+
+def main(argv: List[str] = sys.argv[1:], output: TextIO = sys.stdout) -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--quick", action="store_true", help="run a reduced set of scenarios")
+    parser.add_argument("--repeat", type=int, default=50, help="runs of each stage")
+    args = parser.parse_args(argv)
+    for scenario in scenarios(quick=args.quick):
+        for result in run_scenario(scenario, repeat=args.repeat):
+            output.write(json.dumps(result) + "\n")
+            output.flush()
+
+
+if __name__ == "__main__":
+    main()
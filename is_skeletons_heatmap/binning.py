@@ -0,0 +1,106 @@
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+import numpy.typing as npt
+
+from is_skeletons_heatmap.conf.options_pb2 import AreaLimits, HeatmapLayer
+
+Bins = Tuple[npt.NDArray[np.int64], npt.NDArray[np.int64]]
+
+
+def merge_bins(list_bins: List[Bins]) -> Bins:
+    # sums counts of the same flat index, so the result has unique indices
+    indices = np.concatenate([np.empty(0, dtype=np.int64), *(bins[0] for bins in list_bins)])
+    counts = np.concatenate([np.empty(0, dtype=np.int64), *(bins[1] for bins in list_bins)])
+    indices, inverse = np.unique(indices, return_inverse=True)
+    merged = np.bincount(inverse, weights=counts, minlength=indices.size)
+    return indices, merged.astype(np.int64)
+
+
+class HistogramBinning:
+    def __init__(
+        self,
+        limits: AreaLimits,
+        step: float,
+        layers: Sequence[HeatmapLayer] = (),
+    ) -> None:
+        x_edges = np.arange(start=limits.xmin, stop=limits.xmax, step=step)
+        y_edges = np.arange(start=limits.ymin, stop=limits.ymax, step=step)
+        rows, cols = max(0, y_edges.size - 1), max(0, x_edges.size - 1)
+        self.cells = rows * cols
+        # a layered histogram is (layers, rows, cols), flat indices run over all layers
+        self.shape: Tuple[int, ...] = (rows, cols)
+        if len(layers) > 0:
+            self.shape = (len(layers), rows, cols)
+        self.size = max(1, len(layers)) * self.cells
+        self._step = step
+        self._xmin, self._ymin = limits.xmin, limits.ymin
+        # same bins of np.histogram2d: half-open intervals, except the last one
+        # that also includes its right edge.
+        self._xmax = x_edges[-1] if x_edges.size > 1 else -np.inf
+        self._ymax = y_edges[-1] if y_edges.size > 1 else -np.inf
+        self._layers = len(layers)
+        self._zmin = np.array(
+            [layer.zmin.value if layer.HasField("zmin") else -np.inf for layer in layers]
+        )
+        self._zmax = np.array(
+            [layer.zmax.value if layer.HasField("zmax") else np.inf for layer in layers]
+        )
+        # whether each keypoint id, up to the largest one used, belongs to each layer
+        ids = [int(i) for layer in layers for i in layer.keypoint_ids]
+        self._max_id = max(ids, default=-1)
+        self._any_id = np.array([len(layer.keypoint_ids) == 0 for layer in layers])
+        self._layer_ids = np.zeros(shape=(self._max_id + 2, len(layers)), dtype=bool)
+        for index, layer in enumerate(layers):
+            self._layer_ids[[i for i in layer.keypoint_ids if i >= 0], index] = True
+
+    def flat_indices(
+        self,
+        positions: npt.NDArray[np.float64],
+        keypoint_ids: Optional[npt.NDArray[np.int64]] = None,
+    ) -> npt.NDArray[np.int64]:
+        x, y = positions[:, 0], positions[:, 1]
+        valid = (x >= self._xmin) & (x <= self._xmax) & (y >= self._ymin) & (y <= self._ymax)
+        rows, cols = self.shape[-2:]
+        col = np.minimum((x[valid] - self._xmin) // self._step, cols - 1).astype(np.int64)
+        row = np.minimum((y[valid] - self._ymin) // self._step, rows - 1).astype(np.int64)
+        cells = row * cols + col
+        if self._layers == 0:
+            return cells
+        # (keypoints, layers) mask of the layers each keypoint is counted on
+        z = positions[valid, 2, np.newaxis]
+        selected = (z >= self._zmin) & (z < self._zmax)
+        if keypoint_ids is None:
+            keypoint_ids = np.full(shape=positions.shape[0], fill_value=-1, dtype=np.int64)
+        ids = keypoint_ids[valid]
+        # ids out of range point to the last row, which belongs to no layer
+        ids = np.where((ids >= 0) & (ids <= self._max_id), ids, self._max_id + 1)
+        selected &= self._any_id | self._layer_ids[ids]
+        keypoints, layers = np.nonzero(selected)
+        return layers * self.cells + cells[keypoints]
+
+    def bin_slices(
+        self,
+        xmin: float,
+        xmax: float,
+        ymin: float,
+        ymax: float,
+    ) -> Tuple[slice, slice]:
+        # rows and cols of the bins overlapping a rectangle, clipped to the histogram
+        # edges closer than 'eps' bins to a rectangle side, e.g. after rounding, count
+        # as on it
+        rows, cols, eps = *self.shape[-2:], 1e-6
+
+        def bins(vmin: float, vmax: float, origin: float, size: int) -> slice:
+            start = int(np.clip(np.floor((vmin - origin) / self._step + eps), 0, size))
+            stop = int(np.clip(np.ceil((vmax - origin) / self._step - eps), 0, size))
+            return slice(start, max(start, stop))
+
+        return bins(ymin, ymax, self._ymin, rows), bins(xmin, xmax, self._xmin, cols)
+
+    def count(
+        self,
+        positions: npt.NDArray[np.float64],
+        keypoint_ids: Optional[npt.NDArray[np.int64]] = None,
+    ) -> Bins:
+        return np.unique(self.flat_indices(positions, keypoint_ids), return_counts=True)
@@ -0,0 +1,129 @@
+import json
+import os
+import shutil
+import threading
+import time
+from typing import Any, Dict, Optional
+
+import numpy as np
+import numpy.typing as npt
+from google.protobuf.json_format import MessageToDict
+
+from is_skeletons_heatmap.conf.options_pb2 import SkeletonsHeatmapOptions
+from is_skeletons_heatmap.logger import Logger
+
+State = Dict[str, npt.NDArray[Any]]
+
+
+class HistogramCheckpoint:
+    # Each checkpoint is a directory of .npy files written through np.memmap. A checkpoint
+    # only becomes visible when the 'CURRENT' file is atomically replaced to point to it,
+    # so a crash while writing leaves the previous checkpoint untouched.
+    def __init__(self, path: str, options: SkeletonsHeatmapOptions, period: float) -> None:
+        self.log = Logger("HistogramCheckpoint")
+        self._path = path
+        self._period = period
+        self._metadata = {
+            "limits": [
+                options.limits.xmin,
+                options.limits.xmax,
+                options.limits.ymin,
+                options.limits.ymax,
+            ],
+            "bins_step": options.bins_step,
+            "samples": max(0, options.samples),
+            "decay": options.half_life_s > 0,
+            "window_s": options.window_s,
+            "layers": [MessageToDict(layer) for layer in options.layers],
+        }
+        self._last_save = time.monotonic()
+        self._thread: Optional[threading.Thread] = None
+        os.makedirs(self._path, exist_ok=True)
+
+    def load(self) -> Optional[State]:
+        try:
+            with open(os.path.join(self._path, "CURRENT"), "r", encoding="utf-8") as file:
+                directory = os.path.join(self._path, file.read().strip())
+            with open(os.path.join(directory, "metadata.json"), "r", encoding="utf-8") as file:
+                metadata = json.load(file)
+        except FileNotFoundError:
+            return None
+        if metadata != self._metadata:
+            self.log.warn(
+                "event=IgnoredCheckpoint, path={}, expected={}, found={}",
+                directory,
+                self._metadata,
+                metadata,
+            )
+            return None
+        self.log.info("event=LoadedCheckpoint, path={}", directory)
+        return {
+            name[: -len(".npy")]: np.load(os.path.join(directory, name), mmap_mode="r")
+            for name in os.listdir(directory)
+            if name.endswith(".npy")
+        }
+
+    def due(self) -> bool:
+        return time.monotonic() - self._last_save >= self._period
+
+    def save(self, state: State) -> bool:
+        # Writes the state on a background thread. The state must not be modified
+        # afterwards, so callers should pass copies of their arrays.
+        if self._thread is not None and self._thread.is_alive():
+            return False
+        self._last_save = time.monotonic()
+        self._thread = threading.Thread(
+            target=self._write,
+            args=(state,),
+            name="HistogramCheckpoint",
+            daemon=True,
+        )
+        self._thread.start()
+        return True
+
+    def join(self, timeout: Optional[float] = None) -> None:
+        # waits for the last save to be written
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _write(self, state: State) -> None:
+        generation = f"{time.time_ns():x}"
+        directory = os.path.join(self._path, generation)
+        os.makedirs(directory)
+        for name, array in state.items():
+            filename = os.path.join(directory, f"{name}.npy")
+            output = np.lib.format.open_memmap(
+                filename,
+                mode="w+",
+                dtype=array.dtype,
+                shape=array.shape,
+            )
+            output[...] = array
+            output.flush()
+            del output
+            _fsync(filename)
+        filename = os.path.join(directory, "metadata.json")
+        with open(filename, "w", encoding="utf-8") as file:
+            json.dump(self._metadata, file)
+        _fsync(filename)
+
+        current = os.path.join(self._path, "CURRENT")
+        with open(f"{current}.tmp", "w", encoding="utf-8") as file:
+            file.write(generation)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(f"{current}.tmp", current)
+        _fsync(self._path)
+        for name in os.listdir(self._path):
+            other = os.path.join(self._path, name)
+            if name != generation and os.path.isdir(other):
+                shutil.rmtree(other, ignore_errors=True)
+        self.log.debug("event=SavedCheckpoint, path={}", directory)
+
+
+def _fsync(path: str) -> None:
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
@@ -12,21 +12,48 @@ _sym_db = _symbol_database.Default()
 
 
 from google.protobuf import wrappers_pb2 as google_dot_protobuf_dot_wrappers__pb2
+from is_msgs import image_pb2 as is__msgs_dot_image__pb2
 
 
-DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\roptions.proto\x12\x02is\x1a\x1egoogle/protobuf/wrappers.proto\"D\n\nAreaLimits\x12\x0c\n\x04xmin\x18\x01 \x01(\x02\x12\x0c\n\x04xmax\x18\x02 \x01(\x02\x12\x0c\n\x04ymin\x18\x03 \x01(\x02\x12\x0c\n\x04ymax\x18\x04 \x01(\x02\"=\n\x15ReferentialProperties\x12\t\n\x01x\x18\x01 \x01(\x02\x12\t\n\x01y\x18\x02 \x01(\x02\x12\x0e\n\x06length\x18\x03 \x01(\r\"\xd1\x03\n\x17SkeletonsHeatmapOptions\x12\x12\n\nbroker_uri\x18\x01 \x01(\t\x12\x13\n\x0bzipkin_host\x18\x02 \x01(\t\x12\x13\n\x0bzipkin_port\x18\x03 \x01(\r\x12\x11\n\tgroup_ids\x18\x04 \x03(\r\x12\x1e\n\x06limits\x18\x05 \x01(\x0b\x32\x0e.is.AreaLimits\x12\x11\n\tbins_step\x18\x06 \x01(\x02\x12\x31\n\x0coutput_scale\x18\x07 \x01(\x0b\x32\x1b.google.protobuf.FloatValue\x12&\n\routput_rotate\x18\x0f \x01(\x0e\x32\x0f.is.RotateFlags\x12\x10\n\x08\x66rame_id\x18\x11 \x01(\x03\x12.\n\x0breferential\x18\x08 \x01(\x0b\x32\x19.is.ReferentialProperties\x12\x11\n\tdraw_grid\x18\t \x01(\x08\x12\x17\n\x0f\x66lip_horizontal\x18\n \x01(\x08\x12\x15\n\rflip_vertical\x18\x0b \x01(\x08\x12\x11\n\tlog_scale\x18\x0c \x01(\x08\x12\x1b\n\x13\x61verage_coordinates\x18\r \x01(\x08\x12\x0f\n\x07samples\x18\x0e \x01(\x05\x12\x11\n\tperiod_ms\x18\x10 \x01(\x05*L\n\x0bRotateFlags\x12\x08\n\x04NONE\x10\x00\x12\x10\n\x0cROTATE_90_CW\x10\x01\x12\x0e\n\nROTATE_180\x10\x02\x12\x11\n\rROTATE_90_CCW\x10\x03\x62\x06proto3')
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\roptions.proto\x12\x02is\x1a\x1egoogle/protobuf/wrappers.proto\x1a\x13is_msgs/image.proto\"D\n\nAreaLimits\x12\x0c\n\x04xmin\x18\x01 \x01(\x02\x12\x0c\n\x04xmax\x18\x02 \x01(\x02\x12\x0c\n\x04ymin\x18\x03 \x01(\x02\x12\x0c\n\x04ymax\x18\x04 \x01(\x02\"=\n\x15ReferentialProperties\x12\t\n\x01x\x18\x01 \x01(\x02\x12\t\n\x01y\x18\x02 \x01(\x02\x12\x0e\n\x06length\x18\x03 \x01(\r\"]\n\x0fPipelineOptions\x12\x0f\n\x07\x65nabled\x18\x01 \x01(\x08\x12\x12\n\nqueue_size\x18\x02 \x01(\r\x12%\n\x0cqueue_policy\x18\x03 \x01(\x0e\x32\x0f.is.QueuePolicy\"\x96\x01\n\x0f\x43onsumerOptions\x12\x12\n\nbulk_drain\x18\x01 \x01(\x08\x12\x16\n\x0eprefetch_count\x18\x02 \x01(\r\x12\x16\n\x0emax_batch_size\x18\x03 \x01(\r\x12\x14\n\x0cmax_drain_ms\x18\x04 \x01(\x02\x12)\n\x0eoverrun_policy\x18\x05 \x01(\x0e\x32\x11.is.OverrunPolicy\"l\n\x15TransformationOptions\x12\x1a\n\x12prefetch_frame_ids\x18\x01 \x03(\x03\x12\x11\n\ttimeout_s\x18\x02 \x01(\x02\x12\r\n\x05ttl_s\x18\x03 \x01(\x02\x12\x15\n\rmax_backoff_s\x18\x04 \x01(\x02\"\x9c\x01\n\x0cHeatmapLayer\x12\x0c\n\x04name\x18\x01 \x01(\t\x12\x14\n\x0ckeypoint_ids\x18\x02 \x03(\x03\x12)\n\x04zmin\x18\x03 \x01(\x0b\x32\x1b.google.protobuf.FloatValue\x12)\n\x04zmax\x18\x04 \x01(\x0b\x32\x1b.google.protobuf.FloatValue\x12\x12\n\nskip_image\x18\x05 \x01(\x08\"\xb9\x03\n\x0bHeatmapView\x12\r\n\x05topic\x18\x01 \x01(\t\x12\x1e\n\x06limits\x18\x02 \x01(\x0b\x32\x0e.is.AreaLimits\x12\x11\n\tbins_step\x18\x03 \x01(\x02\x12\x31\n\x0coutput_scale\x18\x04 \x01(\x0b\x32\x1b.google.protobuf.FloatValue\x12&\n\routput_rotate\x18\x05 \x01(\x0e\x32\x0f.is.RotateFlags\x12\x10\n\x08\x66rame_id\x18\x06 \x01(\x03\x12.\n\x0breferential\x18\x07 \x01(\x0b\x32\x19.is.ReferentialProperties\x12\x11\n\tdraw_grid\x18\x08 \x01(\x08\x12\x17\n\x0f\x66lip_horizontal\x18\t \x01(\x08\x12\x15\n\rflip_vertical\x18\n \x01(\x08\x12\x11\n\tlog_scale\x18\x0b \x01(\x08\x12\x1b\n\x13\x61verage_coordinates\x18\x0c \x01(\x08\x12\x0f\n\x07samples\x18\r \x01(\x05\x12\x13\n\x0bhalf_life_s\x18\x0e \x01(\x02\x12\x10\n\x08window_s\x18\x0f \x01(\r\x12 \n\x06layers\x18\x10 \x03(\x0b\x32\x10.is.HeatmapLayer\"3\n\x11\x43heckpointOptions\x12\x0c\n\x04path\x18\x01 \x01(\t\x12\x10\n\x08period_s\x18\x02 \x01(\x02\"W\n\x16HistogramStreamOptions\x12\x0f\n\x07\x65nabled\x18\x01 \x01(\x08\x12\x17\n\x0fkeyframe_period\x18\x02 \x01(\r\x12\x13\n\x0bskip_images\x18\x03 \x01(\x08\"\"\n\x0fShardingOptions\x12\x0f\n\x07workers\x18\x01 \x01(\r\",\n\x0eMetricsOptions\x12\x0c\n\x04port\x18\x01 \x01(\r\x12\x0c\n\x04host\x18\x02 \x01(\t\"\x1f\n\x0cQueryOptions\x12\x0f\n\x07\x65nabled\x18\x01 \x01(\x08\"\'\n\x0eTracingOptions\x12\x15\n\rsampling_rate\x18\x01 \x01(\x02\"\xf5\x07\n\x17SkeletonsHeatmapOptions\x12\x12\n\nbroker_uri\x18\x01 \x01(\t\x12\x13\n\x0bzipkin_host\x18\x02 \x01(\t\x12\x13\n\x0bzipkin_port\x18\x03 \x01(\r\x12\x11\n\tgroup_ids\x18\x04 \x03(\r\x12\x1e\n\x06limits\x18\x05 \x01(\x0b\x32\x0e.is.AreaLimits\x12\x11\n\tbins_step\x18\x06 \x01(\x02\x12\x31\n\x0coutput_scale\x18\x07 \x01(\x0b\x32\x1b.google.protobuf.FloatValue\x12&\n\routput_rotate\x18\x0f \x01(\x0e\x32\x0f.is.RotateFlags\x12\x10\n\x08\x66rame_id\x18\x11 \x01(\x03\x12.\n\x0breferential\x18\x08 \x01(\x0b\x32\x19.is.ReferentialProperties\x12\x11\n\tdraw_grid\x18\t \x01(\x08\x12\x17\n\x0f\x66lip_horizontal\x18\n \x01(\x08\x12\x15\n\rflip_vertical\x18\x0b \x01(\x08\x12\x11\n\tlog_scale\x18\x0c \x01(\x08\x12\x1b\n\x13\x61verage_coordinates\x18\r \x01(\x08\x12\x0f\n\x07samples\x18\x0e \x01(\x05\x12\x11\n\tperiod_ms\x18\x10 \x01(\x05\x12,\n\x0cimage_format\x18\x12 \x01(\x0b\x32\x16.is.vision.ImageFormat\x12\x14\n\x0cheartbeat_ms\x18\x13 \x01(\x05\x12%\n\x08pipeline\x18\x14 \x01(\x0b\x32\x13.is.PipelineOptions\x12\x32\n\x0ftransformations\x18\x15 \x01(\x0b\x32\x19.is.TransformationOptions\x12\x1e\n\x05views\x18\x16 \x03(\x0b\x32\x0f.is.HeatmapView\x12\x13\n\x0bhalf_life_s\x18\x17 \x01(\x02\x12)\n\ncheckpoint\x18\x18 \x01(\x0b\x32\x15.is.CheckpointOptions\x12#\n\x07metrics\x18\x19 \x01(\x0b\x32\x12.is.MetricsOptions\x12#\n\x07tracing\x18\x1a \x01(\x0b\x32\x12.is.TracingOptions\x12%\n\x08\x63onsumer\x18\x1b \x01(\x0b\x32\x13.is.ConsumerOptions\x12\x34\n\x10histogram_stream\x18\x1c \x01(\x0b\x32\x1a.is.HistogramStreamOptions\x12%\n\x08sharding\x18\x1d \x01(\x0b\x32\x13.is.ShardingOptions\x12\x10\n\x08window_s\x18\x1e \x01(\r\x12 \n\x06layers\x18\x1f \x03(\x0b\x32\x10.is.HeatmapLayer\x12!\n\x07queries\x18  \x01(\x0b\x32\x10.is.QueryOptions*L\n\x0bRotateFlags\x12\x08\n\x04NONE\x10\x00\x12\x10\n\x0cROTATE_90_CW\x10\x01\x12\x0e\n\nROTATE_180\x10\x02\x12\x11\n\rROTATE_90_CCW\x10\x03*)\n\x0bQueuePolicy\x12\t\n\x05\x42LOCK\x10\x00\x12\x0f\n\x0b\x44ROP_OLDEST\x10\x01*4\n\rOverrunPolicy\x12\x0c\n\x08\x43\x41TCH_UP\x10\x00\x12\x08\n\x04SKIP\x10\x01\x12\x0b\n\x07REALIGN\x10\x02\x62\x06proto3')
 
 _builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, globals())
 _builder.BuildTopDescriptorsAndMessages(DESCRIPTOR, 'options_pb2', globals())
 if _descriptor._USE_C_DESCRIPTORS == False:
 
   DESCRIPTOR._options = None
-  _ROTATEFLAGS._serialized_start=654
-  _ROTATEFLAGS._serialized_end=730
-  _AREALIMITS._serialized_start=53
-  _AREALIMITS._serialized_end=121
-  _REFERENTIALPROPERTIES._serialized_start=123
-  _REFERENTIALPROPERTIES._serialized_end=184
-  _SKELETONSHEATMAPOPTIONS._serialized_start=187
-  _SKELETONSHEATMAPOPTIONS._serialized_end=652
+  _ROTATEFLAGS._serialized_start=2482
+  _ROTATEFLAGS._serialized_end=2558
+  _QUEUEPOLICY._serialized_start=2560
+  _QUEUEPOLICY._serialized_end=2601
+  _OVERRUNPOLICY._serialized_start=2603
+  _OVERRUNPOLICY._serialized_end=2655
+  _AREALIMITS._serialized_start=74
+  _AREALIMITS._serialized_end=142
+  _REFERENTIALPROPERTIES._serialized_start=144
+  _REFERENTIALPROPERTIES._serialized_end=205
+  _PIPELINEOPTIONS._serialized_start=207
+  _PIPELINEOPTIONS._serialized_end=300
+  _CONSUMEROPTIONS._serialized_start=303
+  _CONSUMEROPTIONS._serialized_end=453
+  _TRANSFORMATIONOPTIONS._serialized_start=455
+  _TRANSFORMATIONOPTIONS._serialized_end=563
+  _HEATMAPLAYER._serialized_start=566
+  _HEATMAPLAYER._serialized_end=722
+  _HEATMAPVIEW._serialized_start=725
+  _HEATMAPVIEW._serialized_end=1166
+  _CHECKPOINTOPTIONS._serialized_start=1168
+  _CHECKPOINTOPTIONS._serialized_end=1219
+  _HISTOGRAMSTREAMOPTIONS._serialized_start=1221
+  _HISTOGRAMSTREAMOPTIONS._serialized_end=1308
+  _SHARDINGOPTIONS._serialized_start=1310
+  _SHARDINGOPTIONS._serialized_end=1344
+  _METRICSOPTIONS._serialized_start=1346
+  _METRICSOPTIONS._serialized_end=1390
+  _QUERYOPTIONS._serialized_start=1392
+  _QUERYOPTIONS._serialized_end=1423
+  _TRACINGOPTIONS._serialized_start=1425
+  _TRACINGOPTIONS._serialized_end=1464
+  _SKELETONSHEATMAPOPTIONS._serialized_start=1467
+  _SKELETONSHEATMAPOPTIONS._serialized_end=2480
 # @@protoc_insertion_point(module_scope)
@@ -1,75 +1,247 @@
 from google.protobuf import wrappers_pb2 as _wrappers_pb2
+from is_msgs import image_pb2 as _image_pb2
 from google.protobuf.internal import containers as _containers
 from google.protobuf.internal import enum_type_wrapper as _enum_type_wrapper
 from google.protobuf import descriptor as _descriptor
 from google.protobuf import message as _message
-from typing import ClassVar, Iterable, Mapping, Optional, Union
+from typing import ClassVar as _ClassVar, Iterable as _Iterable, Mapping as _Mapping, Optional as _Optional, Union as _Union
 
+BLOCK: QueuePolicy
+CATCH_UP: OverrunPolicy
 DESCRIPTOR: _descriptor.FileDescriptor
+DROP_OLDEST: QueuePolicy
 NONE: RotateFlags
+REALIGN: OverrunPolicy
 ROTATE_180: RotateFlags
 ROTATE_90_CCW: RotateFlags
 ROTATE_90_CW: RotateFlags
+SKIP: OverrunPolicy
 
 class AreaLimits(_message.Message):
     __slots__ = ["xmax", "xmin", "ymax", "ymin"]
-    XMAX_FIELD_NUMBER: ClassVar[int]
-    XMIN_FIELD_NUMBER: ClassVar[int]
-    YMAX_FIELD_NUMBER: ClassVar[int]
-    YMIN_FIELD_NUMBER: ClassVar[int]
+    XMAX_FIELD_NUMBER: _ClassVar[int]
+    XMIN_FIELD_NUMBER: _ClassVar[int]
+    YMAX_FIELD_NUMBER: _ClassVar[int]
+    YMIN_FIELD_NUMBER: _ClassVar[int]
     xmax: float
     xmin: float
     ymax: float
     ymin: float
-    def __init__(self, xmin: Optional[float] = ..., xmax: Optional[float] = ..., ymin: Optional[float] = ..., ymax: Optional[float] = ...) -> None: ...
+    def __init__(self, xmin: _Optional[float] = ..., xmax: _Optional[float] = ..., ymin: _Optional[float] = ..., ymax: _Optional[float] = ...) -> None: ...
+
+class CheckpointOptions(_message.Message):
+    __slots__ = ["path", "period_s"]
+    PATH_FIELD_NUMBER: _ClassVar[int]
+    PERIOD_S_FIELD_NUMBER: _ClassVar[int]
+    path: str
+    period_s: float
+    def __init__(self, path: _Optional[str] = ..., period_s: _Optional[float] = ...) -> None: ...
+
+class ConsumerOptions(_message.Message):
+    __slots__ = ["bulk_drain", "max_batch_size", "max_drain_ms", "overrun_policy", "prefetch_count"]
+    BULK_DRAIN_FIELD_NUMBER: _ClassVar[int]
+    MAX_BATCH_SIZE_FIELD_NUMBER: _ClassVar[int]
+    MAX_DRAIN_MS_FIELD_NUMBER: _ClassVar[int]
+    OVERRUN_POLICY_FIELD_NUMBER: _ClassVar[int]
+    PREFETCH_COUNT_FIELD_NUMBER: _ClassVar[int]
+    bulk_drain: bool
+    max_batch_size: int
+    max_drain_ms: float
+    overrun_policy: OverrunPolicy
+    prefetch_count: int
+    def __init__(self, bulk_drain: bool = ..., prefetch_count: _Optional[int] = ..., max_batch_size: _Optional[int] = ..., max_drain_ms: _Optional[float] = ..., overrun_policy: _Optional[_Union[OverrunPolicy, str]] = ...) -> None: ...
+
+class HeatmapLayer(_message.Message):
+    __slots__ = ["keypoint_ids", "name", "skip_image", "zmax", "zmin"]
+    KEYPOINT_IDS_FIELD_NUMBER: _ClassVar[int]
+    NAME_FIELD_NUMBER: _ClassVar[int]
+    SKIP_IMAGE_FIELD_NUMBER: _ClassVar[int]
+    ZMAX_FIELD_NUMBER: _ClassVar[int]
+    ZMIN_FIELD_NUMBER: _ClassVar[int]
+    keypoint_ids: _containers.RepeatedScalarFieldContainer[int]
+    name: str
+    skip_image: bool
+    zmax: _wrappers_pb2.FloatValue
+    zmin: _wrappers_pb2.FloatValue
+    def __init__(self, name: _Optional[str] = ..., keypoint_ids: _Optional[_Iterable[int]] = ..., zmin: _Optional[_Union[_wrappers_pb2.FloatValue, _Mapping]] = ..., zmax: _Optional[_Union[_wrappers_pb2.FloatValue, _Mapping]] = ..., skip_image: bool = ...) -> None: ...
+
+class HeatmapView(_message.Message):
+    __slots__ = ["average_coordinates", "bins_step", "draw_grid", "flip_horizontal", "flip_vertical", "frame_id", "half_life_s", "layers", "limits", "log_scale", "output_rotate", "output_scale", "referential", "samples", "topic", "window_s"]
+    AVERAGE_COORDINATES_FIELD_NUMBER: _ClassVar[int]
+    BINS_STEP_FIELD_NUMBER: _ClassVar[int]
+    DRAW_GRID_FIELD_NUMBER: _ClassVar[int]
+    FLIP_HORIZONTAL_FIELD_NUMBER: _ClassVar[int]
+    FLIP_VERTICAL_FIELD_NUMBER: _ClassVar[int]
+    FRAME_ID_FIELD_NUMBER: _ClassVar[int]
+    HALF_LIFE_S_FIELD_NUMBER: _ClassVar[int]
+    LAYERS_FIELD_NUMBER: _ClassVar[int]
+    LIMITS_FIELD_NUMBER: _ClassVar[int]
+    LOG_SCALE_FIELD_NUMBER: _ClassVar[int]
+    OUTPUT_ROTATE_FIELD_NUMBER: _ClassVar[int]
+    OUTPUT_SCALE_FIELD_NUMBER: _ClassVar[int]
+    REFERENTIAL_FIELD_NUMBER: _ClassVar[int]
+    SAMPLES_FIELD_NUMBER: _ClassVar[int]
+    TOPIC_FIELD_NUMBER: _ClassVar[int]
+    WINDOW_S_FIELD_NUMBER: _ClassVar[int]
+    average_coordinates: bool
+    bins_step: float
+    draw_grid: bool
+    flip_horizontal: bool
+    flip_vertical: bool
+    frame_id: int
+    half_life_s: float
+    layers: _containers.RepeatedCompositeFieldContainer[HeatmapLayer]
+    limits: AreaLimits
+    log_scale: bool
+    output_rotate: RotateFlags
+    output_scale: _wrappers_pb2.FloatValue
+    referential: ReferentialProperties
+    samples: int
+    topic: str
+    window_s: int
+    def __init__(self, topic: _Optional[str] = ..., limits: _Optional[_Union[AreaLimits, _Mapping]] = ..., bins_step: _Optional[float] = ..., output_scale: _Optional[_Union[_wrappers_pb2.FloatValue, _Mapping]] = ..., output_rotate: _Optional[_Union[RotateFlags, str]] = ..., frame_id: _Optional[int] = ..., referential: _Optional[_Union[ReferentialProperties, _Mapping]] = ..., draw_grid: bool = ..., flip_horizontal: bool = ..., flip_vertical: bool = ..., log_scale: bool = ..., average_coordinates: bool = ..., samples: _Optional[int] = ..., half_life_s: _Optional[float] = ..., window_s: _Optional[int] = ..., layers: _Optional[_Iterable[_Union[HeatmapLayer, _Mapping]]] = ...) -> None: ...
+
+class HistogramStreamOptions(_message.Message):
+    __slots__ = ["enabled", "keyframe_period", "skip_images"]
+    ENABLED_FIELD_NUMBER: _ClassVar[int]
+    KEYFRAME_PERIOD_FIELD_NUMBER: _ClassVar[int]
+    SKIP_IMAGES_FIELD_NUMBER: _ClassVar[int]
+    enabled: bool
+    keyframe_period: int
+    skip_images: bool
+    def __init__(self, enabled: bool = ..., keyframe_period: _Optional[int] = ..., skip_images: bool = ...) -> None: ...
+
+class MetricsOptions(_message.Message):
+    __slots__ = ["host", "port"]
+    HOST_FIELD_NUMBER: _ClassVar[int]
+    PORT_FIELD_NUMBER: _ClassVar[int]
+    host: str
+    port: int
+    def __init__(self, port: _Optional[int] = ..., host: _Optional[str] = ...) -> None: ...
+
+class PipelineOptions(_message.Message):
+    __slots__ = ["enabled", "queue_policy", "queue_size"]
+    ENABLED_FIELD_NUMBER: _ClassVar[int]
+    QUEUE_POLICY_FIELD_NUMBER: _ClassVar[int]
+    QUEUE_SIZE_FIELD_NUMBER: _ClassVar[int]
+    enabled: bool
+    queue_policy: QueuePolicy
+    queue_size: int
+    def __init__(self, enabled: bool = ..., queue_size: _Optional[int] = ..., queue_policy: _Optional[_Union[QueuePolicy, str]] = ...) -> None: ...
+
+class QueryOptions(_message.Message):
+    __slots__ = ["enabled"]
+    ENABLED_FIELD_NUMBER: _ClassVar[int]
+    enabled: bool
+    def __init__(self, enabled: bool = ...) -> None: ...
 
 class ReferentialProperties(_message.Message):
     __slots__ = ["length", "x", "y"]
-    LENGTH_FIELD_NUMBER: ClassVar[int]
-    X_FIELD_NUMBER: ClassVar[int]
-    Y_FIELD_NUMBER: ClassVar[int]
+    LENGTH_FIELD_NUMBER: _ClassVar[int]
+    X_FIELD_NUMBER: _ClassVar[int]
+    Y_FIELD_NUMBER: _ClassVar[int]
     length: int
     x: float
     y: float
-    def __init__(self, x: Optional[float] = ..., y: Optional[float] = ..., length: Optional[int] = ...) -> None: ...
+    def __init__(self, x: _Optional[float] = ..., y: _Optional[float] = ..., length: _Optional[int] = ...) -> None: ...
+
+class ShardingOptions(_message.Message):
+    __slots__ = ["workers"]
+    WORKERS_FIELD_NUMBER: _ClassVar[int]
+    workers: int
+    def __init__(self, workers: _Optional[int] = ...) -> None: ...
 
 class SkeletonsHeatmapOptions(_message.Message):
-    __slots__ = ["average_coordinates", "bins_step", "broker_uri", "draw_grid", "flip_horizontal", "flip_vertical", "frame_id", "group_ids", "limits", "log_scale", "output_rotate", "output_scale", "period_ms", "referential", "samples", "zipkin_host", "zipkin_port"]
-    AVERAGE_COORDINATES_FIELD_NUMBER: ClassVar[int]
-    BINS_STEP_FIELD_NUMBER: ClassVar[int]
-    BROKER_URI_FIELD_NUMBER: ClassVar[int]
-    DRAW_GRID_FIELD_NUMBER: ClassVar[int]
-    FLIP_HORIZONTAL_FIELD_NUMBER: ClassVar[int]
-    FLIP_VERTICAL_FIELD_NUMBER: ClassVar[int]
-    FRAME_ID_FIELD_NUMBER: ClassVar[int]
-    GROUP_IDS_FIELD_NUMBER: ClassVar[int]
-    LIMITS_FIELD_NUMBER: ClassVar[int]
-    LOG_SCALE_FIELD_NUMBER: ClassVar[int]
-    OUTPUT_ROTATE_FIELD_NUMBER: ClassVar[int]
-    OUTPUT_SCALE_FIELD_NUMBER: ClassVar[int]
-    PERIOD_MS_FIELD_NUMBER: ClassVar[int]
-    REFERENTIAL_FIELD_NUMBER: ClassVar[int]
-    SAMPLES_FIELD_NUMBER: ClassVar[int]
-    ZIPKIN_HOST_FIELD_NUMBER: ClassVar[int]
-    ZIPKIN_PORT_FIELD_NUMBER: ClassVar[int]
+    __slots__ = ["average_coordinates", "bins_step", "broker_uri", "checkpoint", "consumer", "draw_grid", "flip_horizontal", "flip_vertical", "frame_id", "group_ids", "half_life_s", "heartbeat_ms", "histogram_stream", "image_format", "layers", "limits", "log_scale", "metrics", "output_rotate", "output_scale", "period_ms", "pipeline", "queries", "referential", "samples", "sharding", "tracing", "transformations", "views", "window_s", "zipkin_host", "zipkin_port"]
+    AVERAGE_COORDINATES_FIELD_NUMBER: _ClassVar[int]
+    BINS_STEP_FIELD_NUMBER: _ClassVar[int]
+    BROKER_URI_FIELD_NUMBER: _ClassVar[int]
+    CHECKPOINT_FIELD_NUMBER: _ClassVar[int]
+    CONSUMER_FIELD_NUMBER: _ClassVar[int]
+    DRAW_GRID_FIELD_NUMBER: _ClassVar[int]
+    FLIP_HORIZONTAL_FIELD_NUMBER: _ClassVar[int]
+    FLIP_VERTICAL_FIELD_NUMBER: _ClassVar[int]
+    FRAME_ID_FIELD_NUMBER: _ClassVar[int]
+    GROUP_IDS_FIELD_NUMBER: _ClassVar[int]
+    HALF_LIFE_S_FIELD_NUMBER: _ClassVar[int]
+    HEARTBEAT_MS_FIELD_NUMBER: _ClassVar[int]
+    HISTOGRAM_STREAM_FIELD_NUMBER: _ClassVar[int]
+    IMAGE_FORMAT_FIELD_NUMBER: _ClassVar[int]
+    LAYERS_FIELD_NUMBER: _ClassVar[int]
+    LIMITS_FIELD_NUMBER: _ClassVar[int]
+    LOG_SCALE_FIELD_NUMBER: _ClassVar[int]
+    METRICS_FIELD_NUMBER: _ClassVar[int]
+    OUTPUT_ROTATE_FIELD_NUMBER: _ClassVar[int]
+    OUTPUT_SCALE_FIELD_NUMBER: _ClassVar[int]
+    PERIOD_MS_FIELD_NUMBER: _ClassVar[int]
+    PIPELINE_FIELD_NUMBER: _ClassVar[int]
+    QUERIES_FIELD_NUMBER: _ClassVar[int]
+    REFERENTIAL_FIELD_NUMBER: _ClassVar[int]
+    SAMPLES_FIELD_NUMBER: _ClassVar[int]
+    SHARDING_FIELD_NUMBER: _ClassVar[int]
+    TRACING_FIELD_NUMBER: _ClassVar[int]
+    TRANSFORMATIONS_FIELD_NUMBER: _ClassVar[int]
+    VIEWS_FIELD_NUMBER: _ClassVar[int]
+    WINDOW_S_FIELD_NUMBER: _ClassVar[int]
+    ZIPKIN_HOST_FIELD_NUMBER: _ClassVar[int]
+    ZIPKIN_PORT_FIELD_NUMBER: _ClassVar[int]
     average_coordinates: bool
     bins_step: float
     broker_uri: str
+    checkpoint: CheckpointOptions
+    consumer: ConsumerOptions
     draw_grid: bool
     flip_horizontal: bool
     flip_vertical: bool
     frame_id: int
     group_ids: _containers.RepeatedScalarFieldContainer[int]
+    half_life_s: float
+    heartbeat_ms: int
+    histogram_stream: HistogramStreamOptions
+    image_format: _image_pb2.ImageFormat
+    layers: _containers.RepeatedCompositeFieldContainer[HeatmapLayer]
     limits: AreaLimits
     log_scale: bool
+    metrics: MetricsOptions
     output_rotate: RotateFlags
     output_scale: _wrappers_pb2.FloatValue
     period_ms: int
+    pipeline: PipelineOptions
+    queries: QueryOptions
     referential: ReferentialProperties
     samples: int
+    sharding: ShardingOptions
+    tracing: TracingOptions
+    transformations: TransformationOptions
+    views: _containers.RepeatedCompositeFieldContainer[HeatmapView]
+    window_s: int
     zipkin_host: str
     zipkin_port: int
-    def __init__(self, broker_uri: Optional[str] = ..., zipkin_host: Optional[str] = ..., zipkin_port: Optional[int] = ..., group_ids: Optional[Iterable[int]] = ..., limits: Optional[Union[AreaLimits, Mapping]] = ..., bins_step: Optional[float] = ..., output_scale: Optional[Union[_wrappers_pb2.FloatValue, Mapping]] = ..., output_rotate: Optional[Union[RotateFlags, str]] = ..., frame_id: Optional[int] = ..., referential: Optional[Union[ReferentialProperties, Mapping]] = ..., draw_grid: bool = ..., flip_horizontal: bool = ..., flip_vertical: bool = ..., log_scale: bool = ..., average_coordinates: bool = ..., samples: Optional[int] = ..., period_ms: Optional[int] = ...) -> None: ...
+    def __init__(self, broker_uri: _Optional[str] = ..., zipkin_host: _Optional[str] = ..., zipkin_port: _Optional[int] = ..., group_ids: _Optional[_Iterable[int]] = ..., limits: _Optional[_Union[AreaLimits, _Mapping]] = ..., bins_step: _Optional[float] = ..., output_scale: _Optional[_Union[_wrappers_pb2.FloatValue, _Mapping]] = ..., output_rotate: _Optional[_Union[RotateFlags, str]] = ..., frame_id: _Optional[int] = ..., referential: _Optional[_Union[ReferentialProperties, _Mapping]] = ..., draw_grid: bool = ..., flip_horizontal: bool = ..., flip_vertical: bool = ..., log_scale: bool = ..., average_coordinates: bool = ..., samples: _Optional[int] = ..., period_ms: _Optional[int] = ..., image_format: _Optional[_Union[_image_pb2.ImageFormat, _Mapping]] = ..., heartbeat_ms: _Optional[int] = ..., pipeline: _Optional[_Union[PipelineOptions, _Mapping]] = ..., transformations: _Optional[_Union[TransformationOptions, _Mapping]] = ..., views: _Optional[_Iterable[_Union[HeatmapView, _Mapping]]] = ..., half_life_s: _Optional[float] = ..., checkpoint: _Optional[_Union[CheckpointOptions, _Mapping]] = ..., metrics: _Optional[_Union[MetricsOptions, _Mapping]] = ..., tracing: _Optional[_Union[TracingOptions, _Mapping]] = ..., consumer: _Optional[_Union[ConsumerOptions, _Mapping]] = ..., histogram_stream: _Optional[_Union[HistogramStreamOptions, _Mapping]] = ..., sharding: _Optional[_Union[ShardingOptions, _Mapping]] = ..., window_s: _Optional[int] = ..., layers: _Optional[_Iterable[_Union[HeatmapLayer, _Mapping]]] = ..., queries: _Optional[_Union[QueryOptions, _Mapping]] = ...) -> None: ...
+
+class TracingOptions(_message.Message):
+    __slots__ = ["sampling_rate"]
+    SAMPLING_RATE_FIELD_NUMBER: _ClassVar[int]
+    sampling_rate: float
+    def __init__(self, sampling_rate: _Optional[float] = ...) -> None: ...
+
+class TransformationOptions(_message.Message):
+    __slots__ = ["max_backoff_s", "prefetch_frame_ids", "timeout_s", "ttl_s"]
+    MAX_BACKOFF_S_FIELD_NUMBER: _ClassVar[int]
+    PREFETCH_FRAME_IDS_FIELD_NUMBER: _ClassVar[int]
+    TIMEOUT_S_FIELD_NUMBER: _ClassVar[int]
+    TTL_S_FIELD_NUMBER: _ClassVar[int]
+    max_backoff_s: float
+    prefetch_frame_ids: _containers.RepeatedScalarFieldContainer[int]
+    timeout_s: float
+    ttl_s: float
+    def __init__(self, prefetch_frame_ids: _Optional[_Iterable[int]] = ..., timeout_s: _Optional[float] = ..., ttl_s: _Optional[float] = ..., max_backoff_s: _Optional[float] = ...) -> None: ...
 
 class RotateFlags(int, metaclass=_enum_type_wrapper.EnumTypeWrapper):
     __slots__ = []
+
+class QueuePolicy(int, metaclass=_enum_type_wrapper.EnumTypeWrapper):
+    __slots__ = []
+
+class OverrunPolicy(int, metaclass=_enum_type_wrapper.EnumTypeWrapper):
+    __slots__ = []
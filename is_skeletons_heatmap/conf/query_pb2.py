@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+# Generated by the protocol buffer compiler.  DO NOT EDIT!
+# source: query.proto
+"""Generated protocol buffer code."""
+from google.protobuf.internal import builder as _builder
+from google.protobuf import descriptor as _descriptor
+from google.protobuf import descriptor_pool as _descriptor_pool
+from google.protobuf import symbol_database as _symbol_database
+# @@protoc_insertion_point(imports)
+
+_sym_db = _symbol_database.Default()
+
+
+from is_msgs import common_pb2 as is__msgs_dot_common__pb2
+from is_msgs import image_pb2 as is__msgs_dot_image__pb2
+
+
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x0bquery.proto\x12\x02is\x1a\x14is_msgs/common.proto\x1a\x13is_msgs/image.proto\"E\n\x0bHeatmapZone\x12\x0c\n\x04xmin\x18\x01 \x01(\x02\x12\x0c\n\x04xmax\x18\x02 \x01(\x02\x12\x0c\n\x04ymin\x18\x03 \x01(\x02\x12\x0c\n\x04ymax\x18\x04 \x01(\x02\"~\n\x0cHeatmapQuery\x12\r\n\x05layer\x18\x01 \x01(\r\x12\x1e\n\x05zones\x18\x02 \x03(\x0b\x32\x0f.is.HeatmapZone\x12\x1d\n\x04\x61rea\x18\x03 \x01(\x0b\x32\x0f.is.HeatmapZone\x12\x10\n\x08max_size\x18\x04 \x01(\r\x12\x0e\n\x06render\x18\x05 \x01(\x08\"\x9c\x01\n\x11HeatmapQueryReply\x12\x0e\n\x06totals\x18\x01 \x03(\x01\x12$\n\thistogram\x18\x02 \x01(\x0b\x32\x11.is.common.Tensor\x12\x1d\n\x04\x61rea\x18\x03 \x01(\x0b\x32\x0f.is.HeatmapZone\x12\x11\n\tcell_size\x18\x04 \x01(\x02\x12\x1f\n\x05image\x18\x05 \x01(\x0b\x32\x10.is.vision.Imageb\x06proto3')
+
+_builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, globals())
+_builder.BuildTopDescriptorsAndMessages(DESCRIPTOR, 'query_pb2', globals())
+if _descriptor._USE_C_DESCRIPTORS == False:
+
+  DESCRIPTOR._options = None
+  _HEATMAPZONE._serialized_start=62
+  _HEATMAPZONE._serialized_end=131
+  _HEATMAPQUERY._serialized_start=133
+  _HEATMAPQUERY._serialized_end=259
+  _HEATMAPQUERYREPLY._serialized_start=262
+  _HEATMAPQUERYREPLY._serialized_end=418
+# @@protoc_insertion_point(module_scope)
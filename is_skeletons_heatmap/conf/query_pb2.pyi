@@ -0,0 +1,48 @@
+from is_msgs import common_pb2 as _common_pb2
+from is_msgs import image_pb2 as _image_pb2
+from google.protobuf.internal import containers as _containers
+from google.protobuf import descriptor as _descriptor
+from google.protobuf import message as _message
+from typing import ClassVar as _ClassVar, Iterable as _Iterable, Mapping as _Mapping, Optional as _Optional, Union as _Union
+
+DESCRIPTOR: _descriptor.FileDescriptor
+
+class HeatmapQuery(_message.Message):
+    __slots__ = ["area", "layer", "max_size", "render", "zones"]
+    AREA_FIELD_NUMBER: _ClassVar[int]
+    LAYER_FIELD_NUMBER: _ClassVar[int]
+    MAX_SIZE_FIELD_NUMBER: _ClassVar[int]
+    RENDER_FIELD_NUMBER: _ClassVar[int]
+    ZONES_FIELD_NUMBER: _ClassVar[int]
+    area: HeatmapZone
+    layer: int
+    max_size: int
+    render: bool
+    zones: _containers.RepeatedCompositeFieldContainer[HeatmapZone]
+    def __init__(self, layer: _Optional[int] = ..., zones: _Optional[_Iterable[_Union[HeatmapZone, _Mapping]]] = ..., area: _Optional[_Union[HeatmapZone, _Mapping]] = ..., max_size: _Optional[int] = ..., render: bool = ...) -> None: ...
+
+class HeatmapQueryReply(_message.Message):
+    __slots__ = ["area", "cell_size", "histogram", "image", "totals"]
+    AREA_FIELD_NUMBER: _ClassVar[int]
+    CELL_SIZE_FIELD_NUMBER: _ClassVar[int]
+    HISTOGRAM_FIELD_NUMBER: _ClassVar[int]
+    IMAGE_FIELD_NUMBER: _ClassVar[int]
+    TOTALS_FIELD_NUMBER: _ClassVar[int]
+    area: HeatmapZone
+    cell_size: float
+    histogram: _common_pb2.Tensor
+    image: _image_pb2.Image
+    totals: _containers.RepeatedScalarFieldContainer[float]
+    def __init__(self, totals: _Optional[_Iterable[float]] = ..., histogram: _Optional[_Union[_common_pb2.Tensor, _Mapping]] = ..., area: _Optional[_Union[HeatmapZone, _Mapping]] = ..., cell_size: _Optional[float] = ..., image: _Optional[_Union[_image_pb2.Image, _Mapping]] = ...) -> None: ...
+
+class HeatmapZone(_message.Message):
+    __slots__ = ["xmax", "xmin", "ymax", "ymin"]
+    XMAX_FIELD_NUMBER: _ClassVar[int]
+    XMIN_FIELD_NUMBER: _ClassVar[int]
+    YMAX_FIELD_NUMBER: _ClassVar[int]
+    YMIN_FIELD_NUMBER: _ClassVar[int]
+    xmax: float
+    xmin: float
+    ymax: float
+    ymin: float
+    def __init__(self, xmin: _Optional[float] = ..., xmax: _Optional[float] = ..., ymin: _Optional[float] = ..., ymax: _Optional[float] = ...) -> None: ...
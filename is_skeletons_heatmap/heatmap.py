@@ -1,183 +1,366 @@
-from collections import deque
-from typing import List, TypedDict, Deque
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 
-import cv2
-import matplotlib.pyplot as plt
 import numpy as np
 import numpy.typing as npt
-import scipy
-from is_msgs.image_pb2 import Image, ObjectAnnotation, ObjectAnnotations
+from is_msgs.image_pb2 import Image, ImageFormats, ObjectAnnotations
 
-from is_skeletons_heatmap.conf.options_pb2 import RotateFlags, SkeletonsHeatmapOptions
-from is_skeletons_heatmap.logger import Logger
-from is_skeletons_heatmap.transformation import (
-    TransformationFetcher,
-    transform_object_annotations,
+from is_skeletons_heatmap.binning import HistogramBinning
+from is_skeletons_heatmap.checkpoint import HistogramCheckpoint
+from is_skeletons_heatmap.conf.options_pb2 import (
+    HeatmapLayer,
+    HeatmapView,
+    SkeletonsHeatmapOptions,
 )
-from is_skeletons_heatmap.utils import array2image
+from is_skeletons_heatmap.conf.query_pb2 import HeatmapQuery, HeatmapQueryReply, HeatmapZone
+from is_skeletons_heatmap.index import HistogramIndex
+from is_skeletons_heatmap.localizations import Keypoints, Localizations
+from is_skeletons_heatmap.logger import Logger
+from is_skeletons_heatmap.render import HeatmapRenderer
+from is_skeletons_heatmap.transformation import TransformationFetcher
+from is_skeletons_heatmap.utils import array2image, array2tensor
+from is_skeletons_heatmap.window import SlidingWindow, TimeWindow
+
+
+def view_options(
+    options: SkeletonsHeatmapOptions,
+    view: HeatmapView,
+) -> SkeletonsHeatmapOptions:
+    # options of a single view, where every field of the view replaces the global one
+    merged = SkeletonsHeatmapOptions()
+    merged.CopyFrom(options)
+    merged.ClearField("views")
+    for field in HeatmapView.DESCRIPTOR.fields:
+        if field.name == "topic":
+            continue
+        if field.label == field.LABEL_REPEATED:
+            merged.ClearField(field.name)
+            getattr(merged, field.name).extend(getattr(view, field.name))
+        elif field.message_type is not None:
+            merged.ClearField(field.name)
+            if view.HasField(field.name):
+                getattr(merged, field.name).CopyFrom(getattr(view, field.name))
+        else:
+            setattr(merged, field.name, getattr(view, field.name))
+    return merged
 
 
-class Coordinates(TypedDict):
-    x: list
-    y: list
+def heatmap_views(
+    options: SkeletonsHeatmapOptions,
+    service_name: str,
+) -> List[Tuple[SkeletonsHeatmapOptions, str]]:
+    # options and topic of each heatmap
+    if len(options.views) > 0:
+        return [(view_options(options, view), view.topic) for view in options.views]
+    return [(options, f"{service_name}.Rendered")]
 
 
 class SkeletonsHeatmap:
-    def __init__(self, options: SkeletonsHeatmapOptions) -> None:
+    def __init__(
+        self,
+        options: SkeletonsHeatmapOptions,
+        tf_fetcher: Optional[TransformationFetcher] = None,
+        checkpoint: Optional[HistogramCheckpoint] = None,
+    ) -> None:
         self.log = Logger("SkeletonsHeatmap")
         self._options = options
-        fh, fv = self._options.flip_horizontal, self._options.flip_vertical
-        self._flip = fh or fv
-        self._flip_code = -1 if fh and fv else (1 if fh and not fv else 0)
-        x_bins = np.arange(
-            start=self._options.limits.xmin,
-            stop=self._options.limits.xmax,
+        self._binning = HistogramBinning(
+            limits=self._options.limits,
             step=self._options.bins_step,
+            layers=self._options.layers,
         )
-        y_bins = np.arange(
-            start=self._options.limits.ymin,
-            stop=self._options.limits.ymax,
-            step=self._options.bins_step,
+        self._lin_histogram = np.zeros(shape=self._binning.shape, dtype=np.float64)
+        rows, cols = self._binning.shape[-2:]
+        self._renderer = HeatmapRenderer(options=self._options, shape=(rows, cols))
+        # rendered and encoded images of each layer
+        self._np_images: Dict[int, npt.NDArray[np.uint8]] = {}
+        self._pb_images: Dict[int, Image] = {}
+        self._changed = False
+        # bins changed since the last call to 'pop_changed_bins', only tracked once
+        # 'track_changes' is called. On decay mode these are the bins whose stored value
+        # changed, every bin when the scale is renormalized.
+        self._changes: Optional[List[npt.NDArray[np.int64]]] = None
+        self._all_changed = True
+        # copy of the histogram answering queries from another thread, only kept once
+        # 'track_queries' is called
+        self._index: Optional[HistogramIndex] = None
+        self._encode_format, self._compression_level = ".jpeg", 0.8
+        if self._options.HasField("image_format"):
+            image_format = self._options.image_format
+            self._encode_format = {
+                ImageFormats.Value("PNG"): ".png",
+                ImageFormats.Value("JPEG"): ".jpeg",
+                ImageFormats.Value("WebP"): ".webp",
+            }[image_format.format]
+            if image_format.HasField("compression"):
+                self._compression_level = image_format.compression.value
+        self._window: Optional[SlidingWindow] = None
+        if self._options.samples > 0:
+            self._window = SlidingWindow(samples=self._options.samples)
+        self._time_window: Optional[TimeWindow] = None
+        if self._options.window_s > 0:
+            self._time_window = TimeWindow(seconds=self._options.window_s)
+        # On decay mode, the histogram is '_lin_histogram' times '_scale'. New counts are
+        # divided by the scale, so decaying is a single multiplication per period and the
+        # whole histogram is only touched when the scale needs to be renormalized. The
+        # decay follows the time elapsed between updates, so skipped periods still fade.
+        self._scale, self._peak = 1.0, 0.0
+        self._last_update: Optional[float] = None
+        if tf_fetcher is None:
+            tf_fetcher = TransformationFetcher(
+                broker_uri=self._options.broker_uri,
+                options=self._options.transformations,
+            )
+        self._tf_fetcher = tf_fetcher
+        self._tf_fetcher.prefetch(
+            sources=self._options.transformations.prefetch_frame_ids,
+            dst=self._options.frame_id,
         )
-        self._bins = (x_bins, y_bins)
-        size = (y_bins.size - 1, x_bins.size - 1)
-        self._dx = self._options.limits.xmax - self._options.limits.xmin
-        self._dy = self._options.limits.ymax - self._options.limits.ymin
-        self._lin_histogram = np.zeros(shape=size, dtype=np.float64)
-        self._cmap = plt.cm.jet_r
-        self._scale = self._options.output_scale.value
-        self._white = (255, 255, 255)
-        self._red = (0, 0, 255)
-        self._green = (0, 255, 0)
-        self._image_histogram = np.empty(shape=1, dtype=np.uint8)
-        if self._options.samples > 100000:
-            self.log.critical("Number of samples must be less or equal than 100000.")
-        self._infinity_mode = self._options.samples < 1
-        maxlen = max(0, self._options.samples)
-        self._sparse_histograms: Deque[scipy.sparse.csr_matrix] = deque(iterable=[], maxlen=maxlen)
-        self._tf_fetcher = TransformationFetcher(broker_uri=self._options.broker_uri)
+        self._checkpoint = checkpoint
+        state = None if self._checkpoint is None else self._checkpoint.load()
+        if state is not None:
+            self.set_state(state)
 
     def update_heatmap(self, list_annotations: List[ObjectAnnotations]) -> None:
-        coordinates = Coordinates(x=[], y=[])
-        average = self._options.average_coordinates
-        for skeletons in list_annotations:
-            src, dst = skeletons.frame_id, self._options.frame_id
-            if src != dst:
-                transformation = self._tf_fetcher.get_transformation(src, dst)
-                if transformation is None:
-                    continue
-                skeletons = transform_object_annotations(skeletons, transformation, dst)
-            for skeleton in skeletons.objects:
-                coordinates["x"].extend(self._get_coordinate(skeleton, "x", average))
-                coordinates["y"].extend(self._get_coordinate(skeleton, "y", average))
-
-        histogram, _, _ = np.histogram2d(
-            x=np.array(coordinates["x"]),
-            y=np.array(coordinates["y"]),
-            bins=self._bins,
-        )
-        self._sparse_histograms.append(scipy.sparse.csr_matrix(histogram.T))
-        self._lin_histogram += histogram.T
-        if not self._infinity_mode:
-            oldest_h = scipy.sparse.csr_matrix.todense(self._sparse_histograms[0])
-            self._lin_histogram -= oldest_h
-        if self._options.log_scale:
-            self._lin_histogram = np.clip(self._lin_histogram, a_min=1.0, a_max=None)
-            final = np.log10(self._lin_histogram)
-        else:
-            final = self._lin_histogram
+        self.update_localizations(Localizations(list_annotations, self._tf_fetcher))
+
+    def update_localizations(
+        self,
+        localizations: Localizations,
+        timestamp: Optional[float] = None,
+    ) -> None:
+        positions, keypoint_ids = self.localize(localizations)
+        self.update_positions(positions, timestamp, keypoint_ids)
 
-        norm = plt.Normalize(vmin=final.min(), vmax=final.max())
-        self._image_histogram = (255 * self._cmap(norm(final))[:, :, :-1]).astype(
-            np.uint8
+    def localize(self, localizations: Localizations) -> Keypoints:
+        return localizations.keypoints(
+            frame_id=self._options.frame_id,
+            average=self._options.average_coordinates,
         )
 
-        if self._options.HasField("output_scale"):
-            self._image_histogram = cv2.resize(
-                src=self._image_histogram,
-                dsize=(0, 0),
-                fx=self._scale,
-                fy=self._scale,
+    def update_positions(
+        self,
+        positions: npt.NDArray[np.float64],
+        timestamp: Optional[float] = None,
+        keypoint_ids: Optional[npt.NDArray[np.int64]] = None,
+    ) -> None:
+        # 'keypoint_ids' are only needed by layers selecting keypoints
+        indices, counts = self._binning.count(positions, keypoint_ids)
+        self.update_bins(indices, counts, timestamp)
+
+    def update_bins(
+        self,
+        indices: npt.NDArray[np.int64],
+        counts: npt.NDArray[np.int64],
+        timestamp: Optional[float] = None,
+    ) -> None:
+        # 'timestamp' is used by decay and the time window, defaulting to the current time
+        timestamp = time.time() if timestamp is None else timestamp
+        lin_histogram = self._lin_histogram.reshape(-1)
+        self._changed = indices.size > 0
+        if self.decaying:
+            if self._last_update is None:
+                self._last_update = timestamp
+            # timestamps going back, e.g. on clock adjustments, do not decay
+            elapsed = max(0.0, timestamp - self._last_update)
+            self._scale *= 0.5 ** (elapsed / self._options.half_life_s)
+            self._last_update = max(timestamp, self._last_update)
+            if self._scale < 1e-12:
+                lin_histogram *= self._scale
+                self._peak *= self._scale
+                self._scale = 1.0
+                self._all_changed = True
+                if self._index is not None:
+                    self._index.rebuild(self._lin_histogram)
+            lin_histogram[indices] += counts / self._scale
+            if indices.size > 0:
+                self._peak = max(self._peak, lin_histogram[indices].max())
+            # once every bin is below 1.0 the clipped log image stops changing
+            self._changed = self._changed or (
+                self._options.log_scale and self._peak * self._scale >= 1.0
             )
-        if self._options.draw_grid:
-            self._draw_grid()
-        if self._options.HasField("referential"):
-            self._draw_referential()
-        if self._flip:
-            self._image_histogram = cv2.flip(
-                src=self._image_histogram,
-                flipCode=self._flip_code,
+        else:
+            lin_histogram[indices] += counts
+        if self._changes is not None:
+            self._changes.append(indices)
+        expired = None
+        if self._window is not None:
+            expired = self._window.push(indices, counts)
+        elif self._time_window is not None:
+            expired = self._time_window.push(timestamp, indices, counts)
+        if expired is not None:
+            expired_indices, expired_counts = expired
+            lin_histogram[expired_indices] -= expired_counts
+            self._changed = self._changed or expired_indices.size > 0
+            if self._changes is not None:
+                self._changes.append(expired_indices)
+        if self._index is not None:
+            # windows only exist without decay, so the scale is 1.0 when they expire
+            deltas = [(indices, counts / self._scale if self.decaying else counts)]
+            if expired is not None:
+                deltas.append((expired[0], -expired[1]))
+            self._index.add(
+                np.concatenate([bins for bins, _ in deltas]),
+                np.concatenate([values for _, values in deltas]),
+                self._scale,
             )
-        if self._options.output_rotate != RotateFlags.Value("NONE"):
-            self._image_histogram = cv2.rotate(
-                src=self._image_histogram,
-                rotateCode=self._options.output_rotate - 1,
+        if self._changed:
+            self._invalidate()
+        if self._checkpoint is not None and self._checkpoint.due():
+            self._checkpoint.save(self.get_state())
+
+    def get_histogram(self) -> npt.NDArray[np.float64]:
+        if self._scale == 1.0:
+            return self._lin_histogram
+        return self._lin_histogram * self._scale
+
+    def get_stored_histogram(self) -> npt.NDArray[np.float64]:
+        # on decay mode, the histogram divided by 'scale'
+        return self._lin_histogram
+
+    @property
+    def scale(self) -> float:
+        return self._scale
+
+    def get_state(self) -> Dict[str, npt.NDArray[Any]]:
+        state = {
+            "histogram": self._lin_histogram.copy(),
+            "decay": np.array(
+                [
+                    self._scale,
+                    self._peak,
+                    np.nan if self._last_update is None else self._last_update,
+                ]
+            ),
+        }
+        if self._window is not None:
+            state.update(self._window.get_state())
+        if self._time_window is not None:
+            state.update(self._time_window.get_state())
+        return state
+
+    def set_state(self, state: Dict[str, npt.NDArray[Any]]) -> None:
+        self._lin_histogram[...] = state["histogram"]
+        self._scale, self._peak, last_update = (float(value) for value in state["decay"])
+        self._last_update = None if np.isnan(last_update) else last_update
+        if self._window is not None:
+            self._window.set_state(state)
+        if self._time_window is not None:
+            self._time_window.set_state(state)
+        if self._index is not None:
+            self._index.rebuild(self._lin_histogram, self._scale)
+        self._all_changed = True
+        self._invalidate()
+
+    @property
+    def changed(self) -> bool:
+        return self._changed
+
+    @property
+    def layers(self) -> Sequence[HeatmapLayer]:
+        return self._options.layers
+
+    @property
+    def decaying(self) -> bool:
+        return self._options.half_life_s > 0
+
+    @property
+    def cumulative(self) -> bool:
+        # counts are never removed nor faded, so updates can be merged
+        return self._window is None and self._time_window is None and not self.decaying
+
+    def track_changes(self) -> None:
+        if self._changes is None:
+            self._changes = []
+
+    def pop_changed_bins(self) -> Optional[npt.NDArray[np.int64]]:
+        # Flat indices of the bins changed since the last call, or None if any bin
+        # may have changed.
+        if self._changes is None:
+            raise RuntimeError("Changes are not tracked, call 'track_changes' first.")
+        all_changed = self._all_changed
+        changes, self._changes = self._changes, []
+        self._all_changed = False
+        if all_changed:
+            return None
+        return np.unique(np.concatenate([np.empty(0, dtype=np.int64), *changes]))
+
+    def track_queries(self) -> None:
+        if self._index is None:
+            self._index = HistogramIndex(self._binning.shape)
+            self._index.rebuild(self._lin_histogram, self._scale)
+
+    def query(self, request: HeatmapQuery) -> HeatmapQueryReply:
+        # Safe to call from another thread than the one updating the heatmap. Zones and
+        # the area are snapped outwards to whole bins.
+        if self._index is None:
+            raise RuntimeError("Queries are not tracked, call 'track_queries' first.")
+        reply = HeatmapQueryReply()
+        for zone in request.zones:
+            rows, cols = self._binning.bin_slices(zone.xmin, zone.xmax, zone.ymin, zone.ymax)
+            reply.totals.append(self._index.total(request.layer, rows, cols))
+        if not request.HasField("area"):
+            return reply
+        area = request.area
+        rows, cols = self._binning.bin_slices(area.xmin, area.xmax, area.ymin, area.ymax)
+        histogram, level = self._index.crop(request.layer, rows, cols, request.max_size)
+        # cells of the crop start at multiples of their size
+        cell_size = self._options.bins_step * 2**level
+        xmin = self._options.limits.xmin + (cols.start >> level) * cell_size
+        ymin = self._options.limits.ymin + (rows.start >> level) * cell_size
+        reply.histogram.CopyFrom(array2tensor(histogram))
+        reply.area.CopyFrom(
+            HeatmapZone(
+                xmin=xmin,
+                xmax=xmin + histogram.shape[1] * cell_size,
+                ymin=ymin,
+                ymax=ymin + histogram.shape[0] * cell_size,
             )
+        )
+        reply.cell_size = cell_size
+        if request.render and histogram.size > 0:
+            if self._options.log_scale:
+                histogram = np.log10(np.clip(histogram, a_min=1.0, a_max=None))
+            reply.image.CopyFrom(self.encode_image(self._renderer.colorize(histogram)))
+        return reply
+
+    def get_window_occupancy(self) -> float:
+        if self._window is not None:
+            return self._window.occupancy
+        if self._time_window is not None:
+            return self._time_window.occupancy
+        return 1.0
+
+    def get_np_image(self, layer: int = 0) -> npt.NDArray[np.uint8]:
+        # rendered on demand, so a histogram updated several times is rendered once
+        if layer not in self._np_images:
+            self._np_images[layer] = self._render(layer)
+        return self._np_images[layer]
 
-    def get_np_image(self) -> npt.NDArray[np.uint8]:
-        return self._image_histogram
+    def get_pb_image(self, layer: int = 0) -> Image:
+        if layer not in self._pb_images:
+            self._pb_images[layer] = self.encode_image(self.get_np_image(layer))
+        return self._pb_images[layer]
 
-    def get_pb_image(self) -> Image:
+    def encode_image(self, image: npt.NDArray[np.uint8]) -> Image:
         return array2image(
-            input_image=self._image_histogram,
-            encode_format=".jpeg",
-            compression_level=0.8,
+            input_image=image,
+            encode_format=self._encode_format,
+            compression_level=self._compression_level,
         )
 
-    def _get_coordinate(
-        self,
-        skeleton: ObjectAnnotation,
-        axis: str,
-        mean: bool = False,
-    ) -> List[float]:
-        coordinates = [
-            getattr(keypoint.position, axis) for keypoint in skeleton.keypoints
-        ]
-        return [float(np.mean(np.array(coordinates)))] if mean else coordinates
-
-    def _draw_grid(self) -> None:
-        steps = lambda smin, smax: np.arange(np.floor(smin), np.ceil(smax) + 1.0, 1.0)
-        xmin, xmax = self._options.limits.xmin, self._options.limits.xmax
-        ymin, ymax = self._options.limits.ymin, self._options.limits.ymax
-        height, width, _ = self._image_histogram.shape
-        x_steps = width * (steps(xmin, xmax) - xmin) / self._dx
-        y_steps = height * (steps(ymin, ymax) - ymin) / self._dy
-        for x in map(int, x_steps):
-            self._image_histogram = cv2.line(
-                img=self._image_histogram,
-                pt1=(x, 0),
-                pt2=(x, height),
-                color=self._white,
-            )
-        for y in map(int, y_steps):
-            self._image_histogram = cv2.line(
-                img=self._image_histogram,
-                pt1=(0, y),
-                pt2=(width, y),
-                color=self._white,
-            )
+    def _invalidate(self) -> None:
+        self._np_images.clear()
+        self._pb_images.clear()
 
-    def _draw_referential(self) -> None:
-        xmin, _ = self._options.limits.xmin, self._options.limits.xmax
-        ymin, _ = self._options.limits.ymin, self._options.limits.ymax
-        width, height = self._image_histogram.shape[1], self._image_histogram.shape[0]
-        px = int(width * (self._options.referential.x - xmin) / self._dx)
-        py = int(height * (self._options.referential.y - ymin) / self._dy)
-        length = self._options.referential.length
-        pt1, pt2_x, pt2_y = (px, py), (px + length, py), (px, py + length)
-        self._image_histogram = cv2.arrowedLine(
-            img=self._image_histogram,
-            pt1=pt1,
-            pt2=pt2_x,
-            color=self._red,
-            thickness=3,
-            tipLength=0.2,
-        )
-        self._image_histogram = cv2.arrowedLine(
-            img=self._image_histogram,
-            pt1=pt1,
-            pt2=pt2_y,
-            color=self._green,
-            thickness=3,
-            tipLength=0.2,
-        )
+    def _render(self, layer: int) -> npt.NDArray[np.uint8]:
+        lin_histogram = self._lin_histogram
+        if len(self.layers) > 0:
+            lin_histogram = lin_histogram[layer]
+        if self._options.log_scale:
+            histogram = lin_histogram if self._scale == 1.0 else lin_histogram * self._scale
+            final = np.log10(np.clip(histogram, a_min=1.0, a_max=None))
+        else:
+            # normalization on render does not depend on the decay scale
+            final = lin_histogram
+        return self._renderer.render(final)
@@ -0,0 +1,126 @@
+import threading
+from typing import Any, List, Tuple
+
+import numpy as np
+import numpy.typing as npt
+
+
+class HistogramIndex:
+    # Copy of a histogram kept up to date with its changes, so queries never touch the
+    # whole grid. A 2D Fenwick tree (binary indexed tree) of each layer gives the sum
+    # of any rectangle of bins in O(log(rows) * log(cols)), and a pyramid of 2x2 sums
+    # gives crops at every power-of-two resolution in O(output cells). Values are
+    # stored as the heatmap stores them, along with the scale of decay mode. Updates
+    # and queries may run on different threads.
+    def __init__(self, shape: Tuple[int, ...]) -> None:
+        self._layers, self._rows, self._cols = shape if len(shape) == 3 else (1, *shape)
+        self._lock = threading.Lock()
+        self._scale = 1.0
+        # 1-based, so the tree of each layer is (rows + 1, cols + 1)
+        self._tree = np.zeros(shape=(self._layers, self._rows + 1, self._cols + 1))
+        self._levels: List[npt.NDArray[np.float64]] = []
+        rows, cols = self._rows, self._cols
+        while True:
+            self._levels.append(np.zeros(shape=(self._layers, rows, cols)))
+            if rows <= 1 and cols <= 1:
+                break
+            rows, cols = (rows + 1) // 2, (cols + 1) // 2
+
+    def add(
+        self,
+        indices: npt.NDArray[np.int64],
+        values: npt.NDArray[Any],
+        scale: float = 1.0,
+    ) -> None:
+        # 'values' are added to the bins with these flat indices, which may repeat
+        cells = self._rows * self._cols
+        layer, cell = np.divmod(indices, cells)
+        row, col = np.divmod(cell, self._cols)
+        values = values.astype(np.float64)
+        # every node covering each bin, walking all bins at once along rows, and then
+        # along cols for each row node, so the tree is updated by a single accumulation
+        nodes, node_values = [], []
+        i, i_col, i_layer, i_values = row + 1, col, layer, values
+        while i.size > 0:
+            j, j_i, j_layer, j_values = i_col + 1, i, i_layer, i_values
+            while j.size > 0:
+                nodes.append((j_layer * (self._rows + 1) + j_i) * (self._cols + 1) + j)
+                node_values.append(j_values)
+                j = j + (j & -j)
+                keep = j <= self._cols
+                j, j_i, j_layer, j_values = j[keep], j_i[keep], j_layer[keep], j_values[keep]
+            i = i + (i & -i)
+            keep = i <= self._rows
+            i, i_col, i_layer, i_values = i[keep], i_col[keep], i_layer[keep], i_values[keep]
+        with self._lock:
+            self._scale = scale
+            for level, histogram in enumerate(self._levels):
+                np.add.at(histogram, (layer, row >> level, col >> level), values)
+            if len(nodes) > 0:
+                tree = self._tree.reshape(-1)
+                np.add.at(tree, np.concatenate(nodes), np.concatenate(node_values))
+
+    def rebuild(self, histogram: npt.NDArray[np.float64], scale: float = 1.0) -> None:
+        # from scratch, e.g. after restoring a checkpoint
+        histogram = histogram.reshape(self._layers, self._rows, self._cols)
+        levels = [histogram.astype(np.float64)]
+        for _ in self._levels[1:]:
+            previous = levels[-1]
+            rows, cols = previous.shape[1:]
+            padded = np.zeros(shape=(self._layers, rows + rows % 2, cols + cols % 2))
+            padded[:, :rows, :cols] = previous
+            blocks = padded.reshape(self._layers, padded.shape[1] // 2, 2, padded.shape[2] // 2, 2)
+            levels.append(blocks.sum(axis=(2, 4)))
+        # each node sums a (i & -i) x (j & -j) block ending at (i, j)
+        prefix = np.zeros(shape=self._tree.shape)
+        prefix[:, 1:, 1:] = levels[0].cumsum(axis=1).cumsum(axis=2)
+        i = np.arange(1, self._rows + 1)[:, np.newaxis]
+        j = np.arange(1, self._cols + 1)[np.newaxis, :]
+        i0, j0 = i - (i & -i), j - (j & -j)
+        tree = np.zeros(shape=self._tree.shape)
+        tree[:, 1:, 1:] = prefix[:, i, j] - prefix[:, i0, j] - prefix[:, i, j0] + prefix[:, i0, j0]
+        with self._lock:
+            self._scale = scale
+            self._levels = levels
+            self._tree = tree
+
+    def total(self, layer: int, rows: slice, cols: slice) -> float:
+        with self._lock:
+            total = self._prefix(layer, rows.stop, cols.stop)
+            total -= self._prefix(layer, rows.start, cols.stop)
+            total -= self._prefix(layer, rows.stop, cols.start)
+            total += self._prefix(layer, rows.start, cols.start)
+            return total * self._scale
+
+    def crop(
+        self,
+        layer: int,
+        rows: slice,
+        cols: slice,
+        max_size: int = 0,
+    ) -> Tuple[npt.NDArray[np.float64], int]:
+        # Histogram of the given bins on the finest level with at most 'max_size' cells
+        # on each side, and that level. Cells of level 'k' sum 2^k x 2^k bins.
+        def cells(bins: slice, level: int) -> slice:
+            # snapped outwards to the cells of that level
+            return slice(bins.start >> level, (bins.stop + (1 << level) - 1) >> level)
+
+        level = 0
+        while max_size > 0 and level < len(self._levels) - 1:
+            if all(c.stop - c.start <= max_size for c in (cells(rows, level), cells(cols, level))):
+                break
+            level += 1
+        with self._lock:
+            histogram = self._levels[level][layer, cells(rows, level), cells(cols, level)]
+            return histogram * self._scale, level
+
+    def _prefix(self, layer: int, row: int, col: int) -> float:
+        total = 0.0
+        i = row
+        while i > 0:
+            j = col
+            while j > 0:
+                total += self._tree[layer, i, j]
+                j -= j & -j
+            i -= i & -i
+        return total
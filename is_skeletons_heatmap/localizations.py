@@ -0,0 +1,116 @@
+from collections import defaultdict
+from typing import Dict, Iterable, List, Set, Tuple
+
+import numpy as np
+import numpy.typing as npt
+from is_msgs.image_pb2 import ObjectAnnotations
+
+from is_skeletons_heatmap.logger import Logger
+from is_skeletons_heatmap.transformation import TransformationFetcher, transform_array
+from is_skeletons_heatmap.utils import annotations2array, group_mean
+
+
+AnnotationsArrays = Tuple[
+    int,
+    npt.NDArray[np.float64],
+    npt.NDArray[np.int64],
+    npt.NDArray[np.int64],
+]
+Keypoints = Tuple[npt.NDArray[np.float64], npt.NDArray[np.int64]]
+
+
+class Localizations:
+    def __init__(
+        self,
+        list_annotations: List[ObjectAnnotations],
+        tf_fetcher: TransformationFetcher,
+    ) -> None:
+        self.log = Logger("Localizations")
+        self._tf_fetcher = tf_fetcher
+        self._load(
+            (annotations.frame_id, *annotations2array(annotations))
+            for annotations in list_annotations
+        )
+
+    @classmethod
+    def from_arrays(
+        cls,
+        list_arrays: Iterable[AnnotationsArrays],
+        tf_fetcher: TransformationFetcher,
+    ) -> "Localizations":
+        # from (frame_id, positions, objects, ids) of each message, as given by
+        # annotations2array
+        localizations = cls([], tf_fetcher)
+        localizations._load(list_arrays)
+        return localizations
+
+    def _load(self, list_arrays: Iterable[AnnotationsArrays]) -> None:
+        list_positions: Dict[int, List[npt.NDArray[np.float64]]] = defaultdict(list)
+        list_objects: Dict[int, List[npt.NDArray[np.int64]]] = defaultdict(list)
+        list_ids: Dict[int, List[npt.NDArray[np.int64]]] = defaultdict(list)
+        n_objects = 0
+        self._messages: Dict[int, int] = defaultdict(int)
+        for frame_id, positions, objects, ids in list_arrays:
+            self._messages[frame_id] += 1
+            list_positions[frame_id].append(positions)
+            list_objects[frame_id].append(objects + n_objects)
+            list_ids[frame_id].append(ids)
+            n_objects += int(objects[-1]) + 1 if objects.size > 0 else 0
+        # keypoints of every source frame, with the index of the object they belong to
+        # and their ids
+        self._frames: Dict[
+            int,
+            Tuple[npt.NDArray[np.float64], npt.NDArray[np.int64], npt.NDArray[np.int64]],
+        ] = {}
+        for frame_id in list_positions:
+            self._frames[frame_id] = (
+                np.concatenate(list_positions[frame_id]),
+                np.concatenate(list_objects[frame_id]),
+                np.concatenate(list_ids[frame_id]),
+            )
+        self._cache: Dict[Tuple[int, bool], Keypoints] = {}
+        # source frames dropped so far for lacking a transformation to a requested frame
+        self._untransformable: Set[int] = set()
+
+    @property
+    def untransformable(self) -> int:
+        # messages dropped for at least one requested frame, each one counted once
+        return sum(self._messages[frame_id] for frame_id in self._untransformable)
+
+    def __len__(self) -> int:
+        return sum(positions.shape[0] for positions, _, _ in self._frames.values())
+
+    def positions(self, frame_id: int, average: bool = False) -> npt.NDArray[np.float64]:
+        # Positions of all keypoints (or of the mean of each skeleton if 'average' is set)
+        # on the given frame. Results are cached, so views sharing the same frame only
+        # transform the keypoints once.
+        return self.keypoints(frame_id, average)[0]
+
+    def keypoints(self, frame_id: int, average: bool = False) -> Keypoints:
+        # Same positions, along with the id of each keypoint. Averaged positions have
+        # an id of -1.
+        if (frame_id, average) not in self._cache:
+            self._cache[(frame_id, average)] = self._keypoints(frame_id, average)
+        return self._cache[(frame_id, average)]
+
+    def _keypoints(self, dst: int, average: bool) -> Keypoints:
+        batch = [np.empty(shape=(0, 3), dtype=np.float64)]
+        batch_ids = [np.empty(shape=0, dtype=np.int64)]
+        for src, (positions, objects, ids) in self._frames.items():
+            if average:
+                positions = group_mean(positions, objects)
+                ids = np.full(shape=positions.shape[0], fill_value=-1, dtype=np.int64)
+            if src != dst:
+                transformation = self._tf_fetcher.get_transformation(src, dst)
+                if transformation is None:
+                    self.log.debug(
+                        "event=DroppedLocalizations, frame_id={}, keypoints={}",
+                        src,
+                        len(positions),
+                    )
+                    self._untransformable.add(src)
+                    continue
+                positions = transform_array(positions, transformation)
+            batch.append(positions)
+            batch_ids.append(ids)
+        return np.concatenate(batch), np.concatenate(batch_ids)
@@ -0,0 +1,117 @@
+import time
+from types import TracebackType
+from typing import Callable, Optional, Type
+
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, start_http_server
+
+STAGE_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, float("inf"),
+)
+COUNT_BUCKETS = (0, 1, 5, 10, 50, 100, 500, 1000, 5000, 10000, 50000, float("inf"))
+
+
+class StageTimer:
+    def __init__(self, histogram: Histogram) -> None:
+        self._histogram = histogram
+        self._start = 0.0
+        self.elapsed_ms = 0.0
+
+    def __enter__(self) -> "StageTimer":
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc_value: Optional[BaseException],
+        traceback: Optional[TracebackType],
+    ) -> None:
+        elapsed = time.perf_counter() - self._start
+        self._histogram.observe(elapsed)
+        self.elapsed_ms = elapsed * 1000.0
+
+
+class ServiceMetrics:
+    # Metrics live on their own registry, so several instances (e.g. on tests)
+    # do not clash on the global one.
+    def __init__(self, namespace: str = "skeletons_heatmap") -> None:
+        self.registry = CollectorRegistry()
+        self._stages = Histogram(
+            "stage_seconds",
+            "Time spent on each stage of a period",
+            labelnames=["stage"],
+            namespace=namespace,
+            registry=self.registry,
+            buckets=STAGE_BUCKETS,
+        )
+        self.messages = Histogram(
+            "messages_per_period",
+            "Localization messages consumed on each period",
+            namespace=namespace,
+            registry=self.registry,
+            buckets=COUNT_BUCKETS,
+        )
+        self.points = Histogram(
+            "points_per_period",
+            "Keypoints received on each period",
+            namespace=namespace,
+            registry=self.registry,
+            buckets=COUNT_BUCKETS,
+        )
+        self.untransformable = Counter(
+            "untransformable_messages_total",
+            "Messages dropped because the transformation to the heatmap frame is unknown",
+            namespace=namespace,
+            registry=self.registry,
+        )
+        self.overrun = Histogram(
+            "deadline_overrun_seconds",
+            "How late the consumption of a period started after its deadline",
+            namespace=namespace,
+            registry=self.registry,
+            buckets=STAGE_BUCKETS,
+        )
+        self.published = Counter(
+            "published_messages_total",
+            "Messages published on each topic",
+            labelnames=["topic"],
+            namespace=namespace,
+            registry=self.registry,
+        )
+        self._dropped = Gauge(
+            "dropped_periods",
+            "Periods dropped by a full pipeline queue since startup",
+            labelnames=["queue"],
+            namespace=namespace,
+            registry=self.registry,
+        )
+        self._lag = Histogram(
+            "stage_queue_lag_seconds",
+            "How long items waited on a pipeline queue before the next stage took them",
+            labelnames=["queue"],
+            namespace=namespace,
+            registry=self.registry,
+            buckets=STAGE_BUCKETS,
+        )
+        self._occupancy = Gauge(
+            "window_occupancy_ratio",
+            "Fraction of the sliding window filled with samples",
+            labelnames=["topic"],
+            namespace=namespace,
+            registry=self.registry,
+        )
+
+    def time(self, stage: str) -> StageTimer:
+        return StageTimer(self._stages.labels(stage))
+
+    def track_dropped(self, queue: str, function: Callable[[], float]) -> None:
+        self._dropped.labels(queue).set_function(function)
+
+    def observe_lag(self, queue: str, seconds: float) -> None:
+        self._lag.labels(queue).observe(seconds)
+
+    def track_occupancy(self, topic: str, function: Callable[[], float]) -> None:
+        self._occupancy.labels(topic).set_function(function)
+
+    def serve(self, port: int, host: str = "") -> None:
+        start_http_server(port=port, addr=host, registry=self.registry)
@@ -0,0 +1,56 @@
+import threading
+import time
+from collections import deque
+from typing import Callable, Deque, Generic, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+class StageQueue(Generic[T]):
+    def __init__(self, maxsize: int, drop_oldest: bool = False) -> None:
+        self._maxsize = max(1, maxsize)
+        self._drop_oldest = drop_oldest
+        self._items: Deque[Tuple[float, T]] = deque()
+        self._condition = threading.Condition()
+        self.dropped = 0
+
+    def __len__(self) -> int:
+        with self._condition:
+            return len(self._items)
+
+    def put(self, item: T) -> None:
+        with self._condition:
+            while len(self._items) >= self._maxsize:
+                if self._drop_oldest:
+                    self._items.popleft()
+                    self.dropped += 1
+                else:
+                    self._condition.wait()
+            self._items.append((time.perf_counter(), item))
+            self._condition.notify_all()
+
+    def get(self) -> Tuple[T, float]:
+        # Returns the oldest item and for how many seconds it waited on the queue.
+        with self._condition:
+            while len(self._items) == 0:
+                self._condition.wait()
+            timestamp, item = self._items.popleft()
+            self._condition.notify_all()
+        return item, time.perf_counter() - timestamp
+
+
+def start_stage(
+    name: str,
+    target: Callable[[], None],
+    failed: threading.Event,
+) -> threading.Thread:
+    def run() -> None:
+        try:
+            while not failed.is_set():
+                target()
+        finally:
+            failed.set()
+
+    thread = threading.Thread(target=run, name=name, daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,48 @@
+import threading
+from typing import Any, List, Tuple
+
+from is_wire.core import Channel, Status, StatusCode
+from is_wire.rpc import ServiceProvider
+from is_wire.rpc.context import Context
+
+from is_skeletons_heatmap.conf.query_pb2 import HeatmapQuery, HeatmapQueryReply
+from is_skeletons_heatmap.heatmap import SkeletonsHeatmap
+from is_skeletons_heatmap.logger import Logger
+
+
+class QueryServer:
+    # Serves HeatmapQuery requests on '<topic>.Query' of each heatmap. It runs on its
+    # own thread and connection, since AMQP channels are not thread-safe, and queries
+    # only hold the lock of an index for as long as they read from it.
+    def __init__(
+        self,
+        broker_uri: str,
+        heatmaps: List[Tuple[SkeletonsHeatmap, str]],
+    ) -> None:
+        self.log = Logger("QueryServer")
+        self._provider = ServiceProvider(Channel(uri=broker_uri, exchange="is"))
+        self._topics = [f"{topic}.Query" for _, topic in heatmaps]
+        for (heatmap, _), topic in zip(heatmaps, self._topics):
+            heatmap.track_queries()
+            self._provider.delegate(
+                topic=topic,
+                function=self._handler(heatmap),
+                request_type=HeatmapQuery,
+                reply_type=HeatmapQueryReply,
+            )
+        self._thread = threading.Thread(target=self._provider.run, name="Query", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+        self.log.info("event=ServingQueries, topics={}", self._topics)
+
+    def _handler(self, heatmap: SkeletonsHeatmap) -> Any:
+        def query(request: HeatmapQuery, context: Context) -> Any:
+            if request.layer >= max(1, len(heatmap.layers)):
+                return Status(
+                    code=StatusCode.INVALID_ARGUMENT,
+                    why=f"Layer {request.layer} not found, heatmap has {len(heatmap.layers)}.",
+                )
+            return heatmap.query(request)
+
+        return query
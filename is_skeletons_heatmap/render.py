@@ -0,0 +1,163 @@
+from typing import Tuple
+
+import cv2
+import numpy as np
+import numpy.typing as npt
+
+from is_skeletons_heatmap.conf.options_pb2 import RotateFlags, SkeletonsHeatmapOptions
+
+# (x, value) points of each channel of matplotlib's 'jet' colormap, which is linearly
+# interpolated between them. Kept here to avoid importing matplotlib on startup.
+JET = {
+    "red": ((0.0, 0.0), (0.35, 0.0), (0.66, 1.0), (0.89, 1.0), (1.0, 0.5)),
+    "green": ((0.0, 0.0), (0.125, 0.0), (0.375, 1.0), (0.64, 1.0), (0.91, 0.0), (1.0, 0.0)),
+    "blue": ((0.0, 0.5), (0.11, 1.0), (0.34, 1.0), (0.65, 0.0), (1.0, 0.0)),
+}
+
+
+def jet_r_lut(size: int = 256) -> npt.NDArray[np.uint8]:
+    # same colors of (255 * plt.cm.jet_r(np.arange(size))[:, :-1]).astype(np.uint8),
+    # interpolated the same way to match it exactly
+    xind: npt.NDArray[np.float64] = (size - 1) * np.linspace(0.0, 1.0, size)
+    channels = []
+    for name in ("red", "green", "blue"):
+        # the reversed colormap mirrors the points of each channel
+        points = np.array(JET[name][::-1], dtype=np.float64)
+        x, y = (size - 1) * (1.0 - points[:, 0]), points[:, 1]
+        ind = np.searchsorted(x, xind[1:-1])
+        distance = (xind[1:-1] - x[ind - 1]) / (x[ind] - x[ind - 1])
+        lut = np.concatenate([[y[0]], distance * (y[ind] - y[ind - 1]) + y[ind - 1], [y[-1]]])
+        channels.append(np.clip(lut, 0.0, 1.0))
+    return (255 * np.stack(channels, axis=1)).astype(np.uint8)
+
+
+JET_R_LUT = jet_r_lut()
+
+
+class HeatmapRenderer:
+    def __init__(self, options: SkeletonsHeatmapOptions, shape: Tuple[int, int]) -> None:
+        self._options = options
+        self._white = (255, 255, 255)
+        self._red = (0, 0, 255)
+        self._green = (0, 255, 0)
+        self._lut = JET_R_LUT
+
+        rows, cols = shape
+        scale = options.output_scale.value if options.HasField("output_scale") else 1.0
+        self._scale = scale
+        self._resize = scale != 1.0
+        # same size cv2.resize gives with 'fx' and 'fy'
+        height, width = rows, cols
+        if self._resize:
+            height, width = self._resize_image(np.zeros(shape=(rows, cols), dtype=np.uint8)).shape
+        overlay = np.zeros(shape=(height, width, 3), dtype=np.uint8)
+        if options.draw_grid:
+            self._draw_grid(overlay)
+        if options.HasField("referential"):
+            self._draw_referential(overlay)
+
+        # Without resizing, flip and rotation are applied on the histogram as NumPy views,
+        # and materialized by the colormap lookup itself. A resize by an integer scale
+        # commutes with flips and half turns, so those stay views before it, leaving a
+        # cv2.rotate after the resize only for quarter turns, whose rounding differs
+        # otherwise. Non-integer scales commute with none of them, so resized images are
+        # flipped and rotated after it, as cv2 does. The overlay is drawn and transformed
+        # only once, here.
+        fh, fv = options.flip_horizontal, options.flip_vertical
+        self._flip_axes = tuple(axis for axis, flip in ((0, fv), (1, fh)) if flip)
+        self._rotations = {
+            RotateFlags.Value("NONE"): 0,
+            RotateFlags.Value("ROTATE_90_CW"): -1,
+            RotateFlags.Value("ROTATE_180"): 2,
+            RotateFlags.Value("ROTATE_90_CCW"): 1,
+        }[options.output_rotate]
+        self._flip_code = -1 if fh and fv else (1 if fh and not fv else 0)
+        self._rotate_code = options.output_rotate - 1
+        # views applied before resizing, and what cv2 still applies after it
+        self._view_flip_axes: Tuple[int, ...] = ()
+        self._view_rotations = 0
+        self._flip = fh or fv
+        self._rotate = self._rotations != 0
+        if self._resize and float(scale).is_integer():
+            half_turn = self._rotations == 2
+            self._view_flip_axes = self._flip_axes
+            self._view_rotations = 2 if half_turn else 0
+            self._flip, self._rotate = False, self._rotate and not half_turn
+        overlay = np.rot90(np.flip(overlay, axis=self._flip_axes), k=self._rotations).copy()
+        self._overlay_index = np.flatnonzero(overlay.any(axis=2))
+        self._overlay_pixels = overlay.reshape(-1, 3)[self._overlay_index]
+
+    def render(self, values: npt.NDArray[np.float64]) -> npt.NDArray[np.uint8]:
+        if self._resize:
+            image = self._transform(self._resize_image(self._colors(values)))
+        else:
+            image = self.colorize(values)
+        image.reshape(-1, 3)[self._overlay_index] = self._overlay_pixels
+        return image
+
+    def colorize(self, values: npt.NDArray[np.float64]) -> npt.NDArray[np.uint8]:
+        # flipped and rotated colors of the values, without the overlay nor resizing
+        indices = np.rot90(np.flip(self._levels(values), axis=self._flip_axes), k=self._rotations)
+        return self._lut[indices]
+
+    def _colors(self, values: npt.NDArray[np.float64]) -> npt.NDArray[np.uint8]:
+        # colors to be resized, with the flips and rotations that commute with it
+        levels = np.flip(self._levels(values), axis=self._view_flip_axes)
+        return self._lut[np.rot90(levels, k=self._view_rotations)]
+
+    def _levels(self, values: npt.NDArray[np.float64]) -> npt.NDArray[np.uint8]:
+        vmin, vmax = (values.min(), values.max()) if values.size > 0 else (0.0, 0.0)
+        if vmax > vmin:
+            # same quantization of a matplotlib colormap with 256 colors
+            levels = (values - vmin) / (vmax - vmin) * 256.0
+            indices = np.clip(levels, 0, 255, out=levels).astype(np.uint8)
+        else:
+            indices = np.zeros(shape=values.shape, dtype=np.uint8)
+        return indices
+
+    def _resize_image(self, image: npt.NDArray[np.uint8]) -> npt.NDArray[np.uint8]:
+        return cv2.resize(src=image, dsize=(0, 0), fx=self._scale, fy=self._scale)
+
+    def _transform(self, image: npt.NDArray[np.uint8]) -> npt.NDArray[np.uint8]:
+        if self._flip:
+            image = cv2.flip(src=image, flipCode=self._flip_code)
+        if self._rotate:
+            image = cv2.rotate(src=image, rotateCode=self._rotate_code)
+        return image
+
+    def _draw_grid(self, image: npt.NDArray[np.uint8]) -> None:
+        steps = lambda smin, smax: np.arange(np.floor(smin), np.ceil(smax) + 1.0, 1.0)
+        xmin, xmax = self._options.limits.xmin, self._options.limits.xmax
+        ymin, ymax = self._options.limits.ymin, self._options.limits.ymax
+        height, width, _ = image.shape
+        x_steps = width * (steps(xmin, xmax) - xmin) / (xmax - xmin)
+        y_steps = height * (steps(ymin, ymax) - ymin) / (ymax - ymin)
+        for x in map(int, x_steps):
+            cv2.line(img=image, pt1=(x, 0), pt2=(x, height), color=self._white)
+        for y in map(int, y_steps):
+            cv2.line(img=image, pt1=(0, y), pt2=(width, y), color=self._white)
+
+    def _draw_referential(self, image: npt.NDArray[np.uint8]) -> None:
+        xmin, xmax = self._options.limits.xmin, self._options.limits.xmax
+        ymin, ymax = self._options.limits.ymin, self._options.limits.ymax
+        width, height = image.shape[1], image.shape[0]
+        px = int(width * (self._options.referential.x - xmin) / (xmax - xmin))
+        py = int(height * (self._options.referential.y - ymin) / (ymax - ymin))
+        length = self._options.referential.length
+        pt1, pt2_x, pt2_y = (px, py), (px + length, py), (px, py + length)
+        cv2.arrowedLine(
+            img=image,
+            pt1=pt1,
+            pt2=pt2_x,
+            color=self._red,
+            thickness=3,
+            tipLength=0.2,
+        )
+        cv2.arrowedLine(
+            img=image,
+            pt1=pt1,
+            pt2=pt2_y,
+            color=self._green,
+            thickness=3,
+            tipLength=0.2,
+        )
@@ -0,0 +1,229 @@
+import argparse
+import json
+import os
+import sys
+import time
+from typing import IO, Any, Dict, Iterable, Iterator, List, Optional
+
+import cv2
+import numpy as np
+import numpy.typing as npt
+from google.protobuf.json_format import Parse, ParseDict
+from google.protobuf.message import Message as ProtobufMessage
+from is_msgs.camera_pb2 import FrameTransformation
+
+from is_skeletons_heatmap.conf.options_pb2 import SkeletonsHeatmapOptions
+from is_skeletons_heatmap.heatmap import SkeletonsHeatmap, heatmap_views
+from is_skeletons_heatmap.localizations import AnnotationsArrays, Localizations
+from is_skeletons_heatmap.logger import Logger
+from is_skeletons_heatmap.service import validate_options
+from is_skeletons_heatmap.transformation import StaticTransformationFetcher
+from is_skeletons_heatmap.utils import decode_annotations, tensor2array
+
+
+def write_delimited(file: IO[bytes], message: ProtobufMessage) -> None:
+    # same framing of Java's writeDelimitedTo: a varint with the size, then the message
+    data = message.SerializeToString()
+    size = len(data)
+    header = bytearray()
+    while True:
+        byte = size & 0x7F
+        size >>= 7
+        if size:
+            header.append(byte | 0x80)
+        else:
+            header.append(byte)
+            break
+    file.write(bytes(header))
+    file.write(data)
+
+
+def read_delimited(file: IO[bytes]) -> Iterator[bytes]:
+    while True:
+        size, shift = 0, 0
+        while True:
+            byte = file.read(1)
+            if not byte:
+                if shift > 0:
+                    raise EOFError("Truncated message size")
+                return
+            size |= (byte[0] & 0x7F) << shift
+            shift += 7
+            if not byte[0] & 0x80:
+                break
+        data = file.read(size)
+        if len(data) != size:
+            raise EOFError(f"Truncated message, expected {size} bytes, got {len(data)}")
+        yield data
+
+
+def read_annotations(paths: Iterable[str]) -> Iterator[AnnotationsArrays]:
+    # Recordings are decoded straight from the wire format, as parsing them to
+    # ObjectAnnotations dominates the replay time.
+    for path in paths:
+        with open(path, "rb") as file:
+            for data in read_delimited(file):
+                yield decode_annotations(data)
+
+
+def load_transformations(path: str) -> Dict[int, Dict[int, npt.NDArray[Any]]]:
+    # JSON list of is.vision.FrameTransformation, as replied by the frame
+    # transformation service
+    with open(path, "r", encoding="utf-8") as file:
+        list_tf = json.load(file)
+    transformations: Dict[int, Dict[int, npt.NDArray[Any]]] = {}
+    for value in list_tf:
+        tf = ParseDict(value, FrameTransformation())
+        transformations.setdefault(getattr(tf, "from"), {})[tf.to] = tensor2array(tf.tf)
+    return transformations
+
+
+def periods(
+    list_annotations: Iterable[AnnotationsArrays],
+    size: int,
+) -> Iterator[List[AnnotationsArrays]]:
+    period: List[AnnotationsArrays] = []
+    for annotations in list_annotations:
+        period.append(annotations)
+        if len(period) == size:
+            yield period
+            period = []
+    if len(period) > 0:
+        yield period
+
+
+class HeatmapWriter:
+    def __init__(self, heatmap: SkeletonsHeatmap, directory: str) -> None:
+        self._heatmap = heatmap
+        self._directory = directory
+        os.makedirs(self._directory, exist_ok=True)
+
+    def write(self, name: str) -> None:
+        # layers are written as '<name>.<layer>.png', the histogram holds all of them
+        images = {f"{name}.png": 0}
+        if len(self._heatmap.layers) > 0:
+            images = {
+                f"{name}.{layer.name}.png": index
+                for index, layer in enumerate(self._heatmap.layers)
+                if not layer.skip_image
+            }
+        for filename, layer in images.items():
+            image = self._heatmap.get_np_image(layer)
+            cv2.imwrite(os.path.join(self._directory, filename), image)
+        np.save(os.path.join(self._directory, f"{name}.npy"), self._heatmap.get_histogram())
+
+
+def replay(
+    heatmaps: List[SkeletonsHeatmap],
+    list_annotations: Iterable[AnnotationsArrays],
+    tf_fetcher: StaticTransformationFetcher,
+    period_size: int,
+    period_s: float,
+    chunk_size: int,
+    every: int = 0,
+    writers: Optional[List[HeatmapWriter]] = None,
+) -> int:
+    # Returns how many periods were replayed. Heatmaps that only accumulate do not
+    # depend on period boundaries, so consecutive periods are grouped in chunks of up
+    # to 'chunk_size' messages and binned at once. Memory is bounded by the chunk.
+    # Time windows see periods 'period_s' seconds apart.
+    batch = all(heatmap.cumulative for heatmap in heatmaps)
+    pending: List[AnnotationsArrays] = []
+    n_periods = 0
+    for n_periods, period in enumerate(periods(list_annotations, period_size), start=1):
+        pending.extend(period)
+        snapshot = every > 0 and n_periods % every == 0
+        if batch and len(pending) < chunk_size and not snapshot:
+            continue
+        localizations = Localizations.from_arrays(pending, tf_fetcher)
+        for heatmap in heatmaps:
+            heatmap.update_localizations(localizations, timestamp=n_periods * period_s)
+        pending = []
+        if snapshot and writers is not None:
+            for writer in writers:
+                writer.write(f"{n_periods:08d}")
+    if len(pending) > 0:
+        localizations = Localizations.from_arrays(pending, tf_fetcher)
+        for heatmap in heatmaps:
+            heatmap.update_localizations(localizations, timestamp=n_periods * period_s)
+    return n_periods
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Builds heatmaps from recorded localizations, without a broker.",
+    )
+    parser.add_argument("options", help="JSON options file, as used by the service")
+    parser.add_argument(
+        "recordings",
+        nargs="+",
+        help="files of length-delimited ObjectAnnotations, replayed in the given order",
+    )
+    parser.add_argument("--output", required=True, help="directory where results are written")
+    parser.add_argument(
+        "--transformations",
+        help="JSON list of FrameTransformation used instead of the broker",
+    )
+    parser.add_argument(
+        "--period-size",
+        type=int,
+        default=0,
+        help="consecutive messages on each period, defaults to the number of group_ids",
+    )
+    parser.add_argument(
+        "--every",
+        type=int,
+        default=0,
+        help="if greater than zero, also writes the heatmaps every N periods",
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=10000,
+        help="maximum number of messages binned at once",
+    )
+    args = parser.parse_args(sys.argv[1:] if argv is None else argv)
+
+    service_name = "SkeletonsHeatmap"
+    log = Logger(name=f"{service_name}.Replay")
+    with open(args.options, "r", encoding="utf-8") as file:
+        options = Parse(file.read(), SkeletonsHeatmapOptions())
+    # same options accepted by the service, e.g. periods set the replay clock
+    validate_options(options, log)
+    # heatmaps are built from scratch, never from a checkpoint of the service
+    options.ClearField("checkpoint")
+    transformations = {}
+    if args.transformations:
+        transformations = load_transformations(args.transformations)
+    tf_fetcher = StaticTransformationFetcher(transformations)
+
+    views = heatmap_views(options, service_name)
+    heatmaps = [SkeletonsHeatmap(view, tf_fetcher) for view, _ in views]
+    writers = [
+        HeatmapWriter(heatmap, os.path.join(args.output, topic))
+        for heatmap, (_, topic) in zip(heatmaps, views)
+    ]
+    period_size = args.period_size if args.period_size > 0 else max(1, len(options.group_ids))
+    started = time.perf_counter()
+    n_periods = replay(
+        heatmaps=heatmaps,
+        list_annotations=read_annotations(args.recordings),
+        tf_fetcher=tf_fetcher,
+        period_size=period_size,
+        period_s=options.period_ms / 1000.0,
+        chunk_size=max(1, args.chunk_size),
+        every=args.every,
+        writers=writers,
+    )
+    for writer in writers:
+        writer.write("heatmap")
+    log.info(
+        "event=Replayed periods={} took_s={:.2f} output={}",
+        n_periods,
+        time.perf_counter() - started,
+        args.output,
+    )
+
+
+if __name__ == "__main__":
+    main()
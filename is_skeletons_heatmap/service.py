@@ -1,22 +1,43 @@
+import os
+import random
 import sys
-from typing import List
+import threading
+import time
+from typing import Any, List, Optional, Tuple
 
-import dateutil.parser as dp
+import numpy as np
+import numpy.typing as npt
 from google.protobuf.json_format import Parse, ParseError
-from is_msgs.image_pb2 import ObjectAnnotations
-from is_wire.core import AsyncTransport, Message, Subscription, Tracer
-from opencensus.ext.zipkin.trace_exporter import ZipkinExporter
+from is_msgs.image_pb2 import Image, ObjectAnnotations
+from is_wire.core import AsyncTransport, Channel, ContentType, Message, Subscription, now
+from opencensus.trace.base_exporter import Exporter
+from opencensus.trace.base_span import BaseSpan
+from opencensus.trace.samplers.base import Sampler
 from opencensus.trace.span import Span
+from opencensus.trace.span_context import SpanContext
+from opencensus.trace.tracer import Tracer
 
+from is_skeletons_heatmap.binning import HistogramBinning
 from is_skeletons_heatmap.channel import CustomChannel
-from is_skeletons_heatmap.conf.options_pb2 import SkeletonsHeatmapOptions
-from is_skeletons_heatmap.heatmap import SkeletonsHeatmap
+from is_skeletons_heatmap.checkpoint import HistogramCheckpoint
+from is_skeletons_heatmap.conf.options_pb2 import (
+    ConsumerOptions,
+    PipelineOptions,
+    QueuePolicy,
+    SkeletonsHeatmapOptions,
+)
+from is_skeletons_heatmap.heatmap import SkeletonsHeatmap, heatmap_views
+from is_skeletons_heatmap.localizations import Localizations
 from is_skeletons_heatmap.logger import Logger
-
-
-def span_duration_ms(span: Span) -> float:
-    interval = dp.parse(span.end_time) - dp.parse(span.start_time)
-    return interval.total_seconds() * 1000.0
+from is_skeletons_heatmap.metrics import ServiceMetrics
+from is_skeletons_heatmap.pipeline import StageQueue, start_stage
+from is_skeletons_heatmap.query import QueryServer
+from is_skeletons_heatmap.sharding import ShardPool
+from is_skeletons_heatmap.transformation import (
+    StaticTransformationFetcher,
+    TransformationFetcher,
+)
+from is_skeletons_heatmap.utils import encode_tensor
 
 
 def unpack_all(messages: List[Message]) -> List[ObjectAnnotations]:
@@ -36,7 +57,14 @@ def load_options(logger: Logger) -> SkeletonsHeatmapOptions:
                 logger.critical("Unable to load options from '{}'. \n{}", op_file, ex)
     except FileNotFoundError:
         logger.critical("Unable to open file '{}'", op_file)
+    return validate_options(options, logger)
+
 
+def validate_options(
+    options: SkeletonsHeatmapOptions,
+    logger: Logger,
+) -> SkeletonsHeatmapOptions:
+    # exits on the first invalid field, also used by the replay
     message = options.DESCRIPTOR.full_name
     if options.period_ms < 200:
         message += " 'period_ms' field must be equal or greater than 200. "
@@ -46,53 +74,601 @@ def load_options(logger: Logger) -> SkeletonsHeatmapOptions:
         message += " 'period_ms' field must be equal or less than 1000. "
         message += f"Given {options.period_ms}"
         logger.critical(message)
+    if options.heartbeat_ms < 0:
+        message += " 'heartbeat_ms' field must be equal or greater than 0. "
+        message += f"Given {options.heartbeat_ms}"
+        logger.critical(message)
+    for view in [options, *options.views]:
+        if view.samples > 0 and view.half_life_s > 0:
+            message += " 'samples' and 'half_life_s' fields can not be used together. "
+            message += f"Given {view.samples} and {view.half_life_s}"
+            logger.critical(message)
+        if view.window_s > 0 and (view.samples > 0 or view.half_life_s > 0):
+            message += " 'window_s' field can not be used with 'samples' nor 'half_life_s'. "
+            message += f"Given {view.window_s}, {view.samples} and {view.half_life_s}"
+            logger.critical(message)
+    if options.consumer.max_drain_ms < 0:
+        message += " 'consumer.max_drain_ms' field must be equal or greater than 0. "
+        message += f"Given {options.consumer.max_drain_ms}"
+        logger.critical(message)
+    if not 0.0 <= options.tracing.sampling_rate <= 1.0:
+        message += " 'tracing.sampling_rate' field must be between 0 and 1. "
+        message += f"Given {options.tracing.sampling_rate}"
+        logger.critical(message)
+    if options.sharding.workers > 1 and options.pipeline.enabled:
+        message += " 'sharding' and 'pipeline' fields can not be used together. "
+        logger.critical(message)
+    if options.sharding.workers > 1:
+        # workers consume messages as they arrive, only the prefetch applies to them
+        consumer = ConsumerOptions()
+        consumer.CopyFrom(options.consumer)
+        consumer.ClearField("prefetch_count")
+        ignored = [field.name for field, _ in consumer.ListFields()]
+        if len(ignored) > 0:
+            message += " 'consumer' field only accepts 'prefetch_count' with 'sharding'. "
+            message += f"Given {ignored}"
+            logger.critical(message)
+    topics = [view.topic for view in options.views]
+    if "" in topics or len(set(topics)) != len(topics):
+        message += " 'topic' field of 'views' must be set and unique. "
+        message += f"Given {topics}"
+        logger.critical(message)
+    # geometry is checked here, so bad options fail before connecting to the broker
+    for view, topic in heatmap_views(options, "SkeletonsHeatmap"):
+        names = [layer.name for layer in view.layers]
+        if "" in names or len(set(names)) != len(names):
+            message += f" 'name' field of 'layers' of '{topic}' must be set and unique. "
+            message += f"Given {names}"
+            logger.critical(message)
+        for layer in view.layers:
+            if len(layer.keypoint_ids) > 0 and view.average_coordinates:
+                message += f" 'keypoint_ids' field of layer '{layer.name}' of '{topic}' "
+                message += "can not be used with 'average_coordinates'. "
+                logger.critical(message)
+            if layer.HasField("zmin") and layer.HasField("zmax"):
+                if layer.zmin.value >= layer.zmax.value:
+                    message += f" 'zmin' field of layer '{layer.name}' of '{topic}' "
+                    message += "must be less than 'zmax'. "
+                    message += f"Given {layer.zmin.value} and {layer.zmax.value}"
+                    logger.critical(message)
+        if view.bins_step <= 0:
+            message += f" 'bins_step' field of '{topic}' must be greater than 0. "
+            message += f"Given {view.bins_step}"
+            logger.critical(message)
+        if view.HasField("output_scale") and view.output_scale.value <= 0:
+            message += f" 'output_scale' field of '{topic}' must be greater than 0. "
+            message += f"Given {view.output_scale.value}"
+            logger.critical(message)
+        rows, cols = HistogramBinning(limits=view.limits, step=view.bins_step).shape
+        if rows == 0 or cols == 0:
+            message += f" 'limits' field of '{topic}' must span at least two 'bins_step'. "
+            message += f"Given {rows}x{cols} bins of {view.bins_step}"
+            logger.critical(message)
     return options
 
 
-def main() -> None:
-    service_name = "SkeletonsHeatmap"
-    log = Logger(name=service_name)
-    options = load_options(logger=log)
-    channel = CustomChannel(uri=options.broker_uri, exchange="is")
-    subscription = Subscription(channel=channel, name=f"{service_name}.Render")
-    exporter = ZipkinExporter(
+def create_heatmaps(
+    options: SkeletonsHeatmapOptions,
+    tf_fetcher: TransformationFetcher,
+    service_name: str,
+) -> List[Tuple[SkeletonsHeatmap, str]]:
+    heatmaps = []
+    for view, topic in heatmap_views(options, service_name):
+        checkpoint = None
+        if options.checkpoint.path:
+            checkpoint = HistogramCheckpoint(
+                path=os.path.join(options.checkpoint.path, topic),
+                options=view,
+                period=options.checkpoint.period_s if options.checkpoint.period_s > 0 else 60.0,
+            )
+        heatmaps.append((SkeletonsHeatmap(view, tf_fetcher, checkpoint), topic))
+    return heatmaps
+
+
+class ImagePublisher:
+    def __init__(
+        self,
+        channel: Channel,
+        heatmap: SkeletonsHeatmap,
+        topic: str,
+        heartbeat: float,
+        metrics: ServiceMetrics,
+        layer: int = 0,
+    ) -> None:
+        self._channel = channel
+        self._heatmap = heatmap
+        self._topic = topic
+        self._layer = layer
+        self._heartbeat = heartbeat
+        self._metrics = metrics
+        self._last_publish = -float("inf")
+        self._image: Optional[npt.NDArray[np.uint8]] = None
+        self._pb_image = Image()
+
+    def render(self) -> npt.NDArray[np.uint8]:
+        return self._heatmap.get_np_image(self._layer)
+
+    def publish(self, image: npt.NDArray[np.uint8], span: BaseSpan) -> bool:
+        # a new render always creates a new array, so identity tells if it changed
+        changed = image is not self._image
+        if not changed and self._heartbeat > 0:
+            if now() - self._last_publish < self._heartbeat:
+                return False
+        if changed:
+            with self._metrics.time("encode"):
+                self._pb_image = self._heatmap.encode_image(image)
+            self._image = image
+        message = Message(content=self._pb_image)
+        # spans of periods left out by the sampler can not be propagated
+        if isinstance(span, Span):
+            message.inject_tracing(span)
+        with self._metrics.time("publish"):
+            self._channel.publish(message=message, topic=self._topic)
+        self._metrics.published.labels(self._topic).inc()
+        self._last_publish = now()
+        return True
+
+
+def image_publishers(
+    channel: Channel,
+    heatmap: SkeletonsHeatmap,
+    topic: str,
+    heartbeat: float,
+    metrics: ServiceMetrics,
+) -> List[ImagePublisher]:
+    # each layer is published on its own topic
+    if len(heatmap.layers) == 0:
+        return [ImagePublisher(channel, heatmap, topic, heartbeat, metrics)]
+    return [
+        ImagePublisher(channel, heatmap, f"{topic}.{layer.name}", heartbeat, metrics, index)
+        for index, layer in enumerate(heatmap.layers)
+        if not layer.skip_image
+    ]
+
+
+# topic and values of each message of a histogram stream on a period
+Snapshot = List[Tuple[str, npt.NDArray[Any]]]
+
+
+class HistogramPublisher:
+    def __init__(
+        self,
+        channel: Channel,
+        heatmap: SkeletonsHeatmap,
+        topic: str,
+        keyframe_period: int,
+        metrics: ServiceMetrics,
+    ) -> None:
+        self._channel = channel
+        self._heatmap = heatmap
+        self._heatmap.track_changes()
+        self._topic = f"{topic}.Histogram"
+        self._keyframe_period = keyframe_period if keyframe_period > 0 else 50
+        self._metrics = metrics
+        self._tick = 0
+        self._force_keyframe = False
+
+    def force_keyframe(self) -> None:
+        # e.g. after a snapshot was dropped, since deltas only hold bins of their period
+        self._force_keyframe = True
+
+    def snapshot(self) -> Snapshot:
+        # Must run right after the heatmap update, on the same thread, so the published
+        # values match the changed bins even if they are published on another thread.
+        # Only copies the values, serializing them is left to 'publish'. On decay mode
+        # stored values are published, along with the scale they are multiplied by.
+        changed = self._heatmap.pop_changed_bins()
+        keyframe = self._force_keyframe or self._tick % self._keyframe_period == 0
+        self._force_keyframe = False
+        self._tick += 1
+        histogram = self._heatmap.get_stored_histogram()
+        snapshot: Snapshot = []
+        if changed is None or keyframe:
+            if self._heatmap.decaying:
+                snapshot.append((f"{self._topic}.Keyframe", histogram.copy()))
+            else:
+                snapshot.append((f"{self._topic}.Keyframe", histogram.astype(np.int64)))
+            # every bin is on the keyframe
+            indices = np.empty(0, dtype=np.int64)
+        else:
+            indices = changed
+        values = histogram.reshape(-1)[indices]
+        if self._heatmap.decaying:
+            # the scale changes on every period, so there is always a delta
+            delta = np.column_stack([indices, values])
+            delta = np.vstack([[-1.0, self._heatmap.scale], delta])
+            snapshot.append((f"{self._topic}.Delta", delta))
+        elif indices.size > 0:
+            delta = np.column_stack([indices, values.astype(np.int64)])
+            snapshot.append((f"{self._topic}.Delta", delta))
+        return snapshot
+
+    def publish(self, snapshot: Snapshot, span: BaseSpan) -> bool:
+        for topic, values in snapshot:
+            with self._metrics.time("encode"):
+                message = Message(content=encode_tensor(values), content_type=ContentType.PROTOBUF)
+            if isinstance(span, Span):
+                message.inject_tracing(span)
+            with self._metrics.time("publish"):
+                self._channel.publish(message=message, topic=topic)
+            self._metrics.published.labels(topic).inc()
+        return len(snapshot) > 0
+
+
+class PeriodSampler(Sampler):
+    # Samples a fraction of the periods. opencensus' ProbabilitySampler can not be used
+    # since it expects 128-bit trace ids and is-wire propagates 64-bit ones.
+    def __init__(self, rate: float) -> None:
+        self.rate = rate
+
+    def should_sample(self, trace_id: str) -> bool:
+        return random.random() < self.rate
+
+
+def new_sampler(options: SkeletonsHeatmapOptions) -> Sampler:
+    if options.HasField("tracing"):
+        return PeriodSampler(rate=options.tracing.sampling_rate)
+    return PeriodSampler(rate=1.0)
+
+
+def new_exporter(options: SkeletonsHeatmapOptions, service_name: str) -> Exporter:
+    # imported here, as it pulls 'requests' and is not needed to validate options
+    from opencensus.ext.zipkin.trace_exporter import ZipkinExporter
+
+    return ZipkinExporter(
         service_name=service_name,
         host_name=options.zipkin_host,
         port=options.zipkin_port,
         transport=AsyncTransport,
     )
-    for group_id in options.group_ids:
-        subscription.subscribe(topic=f"SkeletonsGrouper.{group_id}.Localization")
-    heatmap = SkeletonsHeatmap(options=options)
-    period = options.period_ms / 1000.0
 
-    while True:
-        messages = channel.consume_for(period=period)
-        span_context = messages[-1].extract_tracing() if len(messages) > 0 else None
 
-        tracer = Tracer(exporter=exporter, span_context=span_context)
-        span = tracer.start_span(name="render")
-        update_span = None
+def new_tracer(exporter: Exporter, messages: List[Message], sampler: Sampler) -> Tracer:
+    span_context = messages[-1].extract_tracing() if len(messages) > 0 else None
+    if span_context is None:
+        span_context = SpanContext()
+    # the trace is kept, but whether this period is sampled is decided locally
+    span_context.trace_options.set_enabled(False)
+    return Tracer(span_context=span_context, sampler=sampler, exporter=exporter)
 
-        with tracer.span(name="unpack"):
-            list_annotations = unpack_all(messages=messages)
 
-        with tracer.span(name="update_heatmap") as _span:
-            heatmap.update_heatmap(list_annotations=list_annotations)
-            update_span = _span
+def update_heatmaps(
+    heatmaps: List[SkeletonsHeatmap],
+    tf_fetcher: TransformationFetcher,
+    messages: List[Message],
+    tracer: Tracer,
+    metrics: ServiceMetrics,
+) -> float:
+    # returns how many milliseconds updating the histograms took
+    with tracer.span(name="unpack"), metrics.time("unpack") as unpack:
+        list_annotations = unpack_all(messages=messages)
+        localizations = Localizations(list_annotations, tf_fetcher)
+    with tracer.span(name="update_heatmap"):
+        with metrics.time("transform") as transform:
+            list_keypoints = [heatmap.localize(localizations) for heatmap in heatmaps]
+        with metrics.time("bin") as binning:
+            for heatmap, (positions, keypoint_ids) in zip(heatmaps, list_keypoints):
+                heatmap.update_positions(positions, keypoint_ids=keypoint_ids)
+    metrics.messages.observe(len(messages))
+    metrics.points.observe(len(localizations))
+    metrics.untransformable.inc(localizations.untransformable)
+    return unpack.elapsed_ms + transform.elapsed_ms + binning.elapsed_ms
 
-        with tracer.span(name="pack_and_publish_heatmap"):
-            im_pb = heatmap.get_pb_image()
-            msg = Message(content=im_pb)
-            msg.inject_tracing(span)
-            channel.publish(message=msg, topic=f"{service_name}.Rendered")
 
+def render_heatmaps(
+    publishers: List[ImagePublisher],
+    tracer: Tracer,
+    metrics: ServiceMetrics,
+) -> List[npt.NDArray[np.uint8]]:
+    with tracer.span(name="render_heatmap"), metrics.time("render"):
+        return [publisher.render() for publisher in publishers]
+
+
+def publish_heatmaps(
+    publishers: List[ImagePublisher],
+    streams: List[HistogramPublisher],
+    tracer: Tracer,
+    span: BaseSpan,
+    metrics: ServiceMetrics,
+) -> int:
+    snapshots = [stream.snapshot() for stream in streams]
+    images = render_heatmaps(publishers, tracer, metrics) if len(publishers) > 0 else []
+    with tracer.span(name="pack_and_publish_heatmap"):
+        published = sum(
+            publisher.publish(image=image, span=span)
+            for image, publisher in zip(images, publishers)
+        )
+        published += sum(
+            stream.publish(snapshot=snapshot, span=span)
+            for snapshot, stream in zip(snapshots, streams)
+        )
+    return published
+
+
+def consume(channel: CustomChannel, period: float, metrics: ServiceMetrics) -> List[Message]:
+    with metrics.time("consume"):
+        messages = channel.consume_for(period=period)
+    metrics.overrun.observe(channel.overrun)
+    return messages
+
+
+def run_sequential(
+    channel: CustomChannel,
+    heatmaps: List[SkeletonsHeatmap],
+    publishers: List[ImagePublisher],
+    streams: List[HistogramPublisher],
+    tf_fetcher: TransformationFetcher,
+    exporter: Exporter,
+    sampler: Sampler,
+    metrics: ServiceMetrics,
+    period: float,
+    log: Logger,
+) -> None:
+    while True:
+        messages = consume(channel, period, metrics)
+        start = time.perf_counter()
+        tracer = new_tracer(exporter=exporter, messages=messages, sampler=sampler)
+        span = tracer.start_span(name="render")
+        update_ms = update_heatmaps(heatmaps, tf_fetcher, messages, tracer, metrics)
+        published = publish_heatmaps(publishers, streams, tracer, span, metrics)
         tracer.end_span()
-        log.info("event=Render messages={}", len(messages))
+        log.info(
+            "event=Render messages={} changed={} published={}",
+            len(messages),
+            sum(heatmap.changed for heatmap in heatmaps),
+            published,
+        )
         log.info(
             "took_ms= {{ update_heatmap={:4.2f}, service={:4.2f} }}",
-            span_duration_ms(update_span),
-            span_duration_ms(span),
+            update_ms,
+            (time.perf_counter() - start) * 1000.0,
+        )
+
+
+def run_sharded(
+    pool: ShardPool,
+    heatmaps: List[SkeletonsHeatmap],
+    publishers: List[ImagePublisher],
+    streams: List[HistogramPublisher],
+    exporter: Exporter,
+    sampler: Sampler,
+    metrics: ServiceMetrics,
+    period: float,
+    log: Logger,
+) -> None:
+    deadline = now()
+    while True:
+        # late periods are not caught up, the next one starts right away instead
+        deadline = max(deadline + period, now())
+        with metrics.time("consume"):
+            time.sleep(max(deadline - now(), 0.0))
+        start = time.perf_counter()
+        tracer = new_tracer(exporter=exporter, messages=[], sampler=sampler)
+        span = tracer.start_span(name="render")
+        with tracer.span(name="update_heatmap"):
+            with metrics.time("shards") as shards:
+                list_bins, stats = pool.collect()
+            with metrics.time("bin") as binning:
+                for heatmap, (indices, counts) in zip(heatmaps, list_bins):
+                    heatmap.update_bins(indices, counts)
+        metrics.messages.observe(stats.messages)
+        metrics.points.observe(stats.points)
+        metrics.untransformable.inc(stats.untransformable)
+        published = publish_heatmaps(publishers, streams, tracer, span, metrics)
+        tracer.end_span()
+        log.info(
+            "event=Render messages={} changed={} published={}",
+            stats.messages,
+            sum(heatmap.changed for heatmap in heatmaps),
+            published,
+        )
+        log.info(
+            "took_ms= {{ shards={:4.2f}, update_heatmap={:4.2f}, service={:4.2f} }}",
+            shards.elapsed_ms,
+            binning.elapsed_ms,
+            (time.perf_counter() - start) * 1000.0,
+        )
+
+
+def run_pipelined(
+    channel: CustomChannel,
+    heatmaps: List[SkeletonsHeatmap],
+    publishers: List[ImagePublisher],
+    streams: List[HistogramPublisher],
+    tf_fetcher: TransformationFetcher,
+    exporter: Exporter,
+    sampler: Sampler,
+    metrics: ServiceMetrics,
+    period: float,
+    options: PipelineOptions,
+    log: Logger,
+) -> None:
+    queue_size = options.queue_size if options.queue_size > 0 else 2
+    drop_oldest = options.queue_policy == QueuePolicy.Value("DROP_OLDEST")
+    consumed: StageQueue[List[Message]] = StageQueue(queue_size, drop_oldest)
+    # dropping a period with deltas of the histogram stream leaves subscribers out of
+    # sync, so the next snapshot is a keyframe
+    rendered: StageQueue[
+        Tuple[
+            List[npt.NDArray[np.uint8]],
+            List[Snapshot],
+            List[Message],
+        ]
+    ] = StageQueue(queue_size, drop_oldest)
+    metrics.track_dropped("consumed", lambda: consumed.dropped)
+    metrics.track_dropped("rendered", lambda: rendered.dropped)
+    stream_dropped = 0
+
+    def consume_stage() -> None:
+        consumed.put(consume(channel, period, metrics))
+
+    def update() -> None:
+        nonlocal stream_dropped
+        messages, lag = consumed.get()
+        metrics.observe_lag("consumed", lag)
+        tracer = new_tracer(exporter=exporter, messages=messages, sampler=sampler)
+        update_ms = update_heatmaps(heatmaps, tf_fetcher, messages, tracer, metrics)
+        if rendered.dropped > stream_dropped:
+            stream_dropped = rendered.dropped
+            for stream in streams:
+                stream.force_keyframe()
+        snapshots = [stream.snapshot() for stream in streams]
+        images = render_heatmaps(publishers, tracer, metrics) if len(publishers) > 0 else []
+        rendered.put((images, snapshots, messages[-1:]))
+        log.info(
+            "event=Render messages={} changed={} lag_ms={:4.2f} dropped={}",
+            len(messages),
+            sum(heatmap.changed for heatmap in heatmaps),
+            lag * 1000.0,
+            consumed.dropped,
+        )
+        log.info("took_ms= {{ update_heatmap={:4.2f} }}", update_ms)
+
+    def publish() -> None:
+        (images, snapshots, messages), lag = rendered.get()
+        metrics.observe_lag("rendered", lag)
+        start = time.perf_counter()
+        tracer = new_tracer(exporter=exporter, messages=messages, sampler=sampler)
+        with tracer.span(name="pack_and_publish_heatmap") as span:
+            published = sum(
+                publisher.publish(image=image, span=span)
+                for image, publisher in zip(images, publishers)
+            )
+            published += sum(
+                stream.publish(snapshot=snapshot, span=span)
+                for snapshot, stream in zip(snapshots, streams)
+            )
+        log.info(
+            "event=Publish published={} lag_ms={:4.2f} dropped={} took_ms={:4.2f}",
+            published,
+            lag * 1000.0,
+            rendered.dropped,
+            (time.perf_counter() - start) * 1000.0,
+        )
+
+    failed = threading.Event()
+    start_stage(name="Consume", target=consume_stage, failed=failed)
+    start_stage(name="Update", target=update, failed=failed)
+    start_stage(name="Publish", target=publish, failed=failed)
+    failed.wait()
+    log.critical("One of the pipeline stages stopped unexpectedly.")
+
+
+def main() -> None:
+    service_name = "SkeletonsHeatmap"
+    # CPU time before 'main' is mostly spent importing modules
+    imports_ms = time.process_time() * 1000.0
+    started = time.perf_counter()
+    log = Logger(name=service_name)
+    options = load_options(logger=log)
+    options_ms = (time.perf_counter() - started) * 1000.0
+    channel = CustomChannel(uri=options.broker_uri, exchange="is", options=options.consumer)
+    exporter = new_exporter(options, service_name)
+    pool = None
+    if options.sharding.workers > 1:
+        # localizations are consumed and transformed by the workers
+        pool = ShardPool(
+            options=options,
+            views=[view for view, _ in heatmap_views(options, service_name)],
+            workers=options.sharding.workers,
+            service_name=service_name,
+        )
+        log.info("event=ShardsStarted, workers={}", len(pool))
+        tf_fetcher: TransformationFetcher = StaticTransformationFetcher()
+    else:
+        subscription = Subscription(channel=channel, name=f"{service_name}.Render")
+        channel.set_prefetch(subscription)
+        for group_id in options.group_ids:
+            subscription.subscribe(topic=f"SkeletonsGrouper.{group_id}.Localization")
+        tf_fetcher = TransformationFetcher(
+            broker_uri=options.broker_uri,
+            options=options.transformations,
+        )
+    connect_ms = (time.perf_counter() - started) * 1000.0 - options_ms
+    views = create_heatmaps(options, tf_fetcher, service_name)
+    heatmaps = [heatmap for heatmap, _ in views]
+    heatmaps_ms = (time.perf_counter() - started) * 1000.0 - options_ms - connect_ms
+    period = options.period_ms / 1000.0
+    heartbeat = options.heartbeat_ms / 1000.0
+    sampler = new_sampler(options)
+    metrics = ServiceMetrics()
+    for heatmap, topic in views:
+        metrics.track_occupancy(topic, heatmap.get_window_occupancy)
+    if options.metrics.port > 0:
+        metrics.serve(port=options.metrics.port, host=options.metrics.host)
+        log.info("event=ServingMetrics, port={}", options.metrics.port)
+    if options.queries.enabled:
+        QueryServer(broker_uri=options.broker_uri, heatmaps=views).start()
+
+    stream = options.histogram_stream
+    image_views = [] if stream.enabled and stream.skip_images else views
+
+    # AMQP channels are not thread-safe, on pipeline mode the publisher stage
+    # needs its own connection
+    publish_channel = channel
+    if options.pipeline.enabled:
+        publish_channel = Channel(uri=options.broker_uri, exchange="is")
+    publishers = [
+        publisher
+        for heatmap, topic in image_views
+        for publisher in image_publishers(publish_channel, heatmap, topic, heartbeat, metrics)
+    ]
+    streams = []
+    if stream.enabled:
+        streams = [
+            HistogramPublisher(publish_channel, heatmap, topic, stream.keyframe_period, metrics)
+            for heatmap, topic in views
+        ]
+    log.info(
+        "event=Started, imports_cpu_ms={:.1f}, options_ms={:.1f}, connect_ms={:.1f}, "
+        "heatmaps_ms={:.1f}, total_ms={:.1f}",
+        imports_ms,
+        options_ms,
+        connect_ms,
+        heatmaps_ms,
+        (time.perf_counter() - started) * 1000.0,
+    )
+    if pool is not None:
+        try:
+            run_sharded(
+                pool,
+                heatmaps,
+                publishers,
+                streams,
+                exporter,
+                sampler,
+                metrics,
+                period,
+                log,
+            )
+        finally:
+            pool.close()
+    elif options.pipeline.enabled:
+        run_pipelined(
+            channel,
+            heatmaps,
+            publishers,
+            streams,
+            tf_fetcher,
+            exporter,
+            sampler,
+            metrics,
+            period,
+            options.pipeline,
+            log,
+        )
+    else:
+        run_sequential(
+            channel,
+            heatmaps,
+            publishers,
+            streams,
+            tf_fetcher,
+            exporter,
+            sampler,
+            metrics,
+            period,
+            log,
         )
 
 
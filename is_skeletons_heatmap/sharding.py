@@ -0,0 +1,213 @@
+import multiprocessing
+import socket
+from multiprocessing.connection import Connection, wait
+from multiprocessing.shared_memory import SharedMemory
+from typing import List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+import numpy.typing as npt
+from is_msgs.image_pb2 import ObjectAnnotations
+from is_wire.core import Subscription
+
+from is_skeletons_heatmap.binning import Bins, HistogramBinning, merge_bins
+from is_skeletons_heatmap.channel import CustomChannel
+from is_skeletons_heatmap.conf.options_pb2 import SkeletonsHeatmapOptions
+from is_skeletons_heatmap.localizations import Localizations
+from is_skeletons_heatmap.logger import Logger
+from is_skeletons_heatmap.transformation import TransformationFetcher
+
+
+class ShardStats(NamedTuple):
+    messages: int
+    points: int
+    untransformable: int
+
+
+def shard_group_ids(group_ids: Sequence[int], workers: int) -> List[List[int]]:
+    # round-robin, so each worker gets at least one stream
+    workers = max(1, min(workers, len(group_ids)))
+    return [list(group_ids[worker::workers]) for worker in range(workers)]
+
+
+def shard_buffers(
+    memory: SharedMemory,
+    binnings: List[HistogramBinning],
+) -> List[Tuple[npt.NDArray[np.int64], npt.NDArray[np.int64]]]:
+    # indices and counts of the bins hit on a period, for each view. A period can not
+    # hit more bins than the histogram has, so this is also the capacity.
+    buffers, offset = [], 0
+    for binning in binnings:
+        indices: npt.NDArray[np.int64] = np.ndarray(
+            binning.size,
+            dtype=np.int64,
+            buffer=memory.buf,
+            offset=offset,
+        )
+        offset += indices.nbytes
+        counts: npt.NDArray[np.int64] = np.ndarray(
+            binning.size,
+            dtype=np.int64,
+            buffer=memory.buf,
+            offset=offset,
+        )
+        offset += counts.nbytes
+        buffers.append((indices, counts))
+    return buffers
+
+
+def write_bins(
+    localizations: Localizations,
+    views: List[SkeletonsHeatmapOptions],
+    binnings: List[HistogramBinning],
+    buffers: List[Tuple[npt.NDArray[np.int64], npt.NDArray[np.int64]]],
+) -> List[int]:
+    # bins the localizations of a period on the buffers of each view, returning how
+    # many bins of each buffer were written
+    sizes = []
+    for view, binning, (indices, counts) in zip(views, binnings, buffers):
+        positions, keypoint_ids = localizations.keypoints(
+            view.frame_id,
+            view.average_coordinates,
+        )
+        view_indices, view_counts = binning.count(positions, keypoint_ids)
+        indices[: view_indices.size] = view_indices
+        counts[: view_counts.size] = view_counts
+        sizes.append(view_indices.size)
+    return sizes
+
+
+def run_shard(
+    name: str,
+    options: SkeletonsHeatmapOptions,
+    views: List[SkeletonsHeatmapOptions],
+    group_ids: List[int],
+    memory_name: str,
+    connection: Connection,
+) -> None:
+    log = Logger(name)
+    channel = CustomChannel(uri=options.broker_uri, exchange="is", options=options.consumer)
+    subscription = Subscription(channel=channel, name=name)
+    channel.set_prefetch(subscription)
+    for group_id in group_ids:
+        subscription.subscribe(topic=f"SkeletonsGrouper.{group_id}.Localization")
+    tf_fetcher = TransformationFetcher(
+        broker_uri=options.broker_uri,
+        options=options.transformations,
+    )
+    for view in views:
+        tf_fetcher.prefetch(sources=view.transformations.prefetch_frame_ids, dst=view.frame_id)
+    binnings = [
+        HistogramBinning(limits=view.limits, step=view.bins_step, layers=view.layers)
+        for view in views
+    ]
+    memory = SharedMemory(name=memory_name)
+    buffers = shard_buffers(memory, binnings)
+    log.info("event=ShardStarted, group_ids={}", group_ids)
+
+    list_annotations: List[ObjectAnnotations] = []
+
+    def drain() -> None:
+        while True:
+            try:
+                message = channel.consume(timeout=0.0)
+            except socket.timeout:
+                return
+            list_annotations.append(message.unpack(ObjectAnnotations))
+
+    # Messages are unpacked as they arrive. On each request from the main process,
+    # localizations received so far are transformed and binned on the shared buffers.
+    while True:
+        ready = wait([connection, channel.connection.sock])
+        drain()
+        if connection not in ready:
+            continue
+        if connection.recv() is None:
+            break
+        localizations = Localizations(list_annotations, tf_fetcher)
+        sizes = write_bins(localizations, views, binnings, buffers)
+        stats = ShardStats(
+            messages=len(list_annotations),
+            points=len(localizations),
+            untransformable=localizations.untransformable,
+        )
+        list_annotations = []
+        # messages of the period are binned, so the broker can send the next ones
+        channel.acknowledge()
+        connection.send((sizes, stats))
+    memory.close()
+
+
+class ShardPool:
+    # Splits group_ids among worker processes, each one with its own connection to the
+    # broker. Bins of a period are merged on the main process, so the heatmaps are the
+    # same as if every stream were consumed by a single process.
+    def __init__(
+        self,
+        options: SkeletonsHeatmapOptions,
+        views: List[SkeletonsHeatmapOptions],
+        workers: int,
+        service_name: str,
+    ) -> None:
+        self.log = Logger("ShardPool")
+        binnings = [
+            HistogramBinning(limits=view.limits, step=view.bins_step, layers=view.layers)
+            for view in views
+        ]
+        nbytes = max(1, sum(2 * binning.size * 8 for binning in binnings))
+        context = multiprocessing.get_context("spawn")
+        self._memories: List[SharedMemory] = []
+        self._buffers = []
+        self._connections: List[Connection] = []
+        self._processes = []
+        for worker, group_ids in enumerate(shard_group_ids(options.group_ids, workers)):
+            memory = SharedMemory(create=True, size=nbytes)
+            connection, worker_connection = context.Pipe()
+            process = context.Process(
+                target=run_shard,
+                args=(
+                    f"{service_name}.Render.Shard{worker}",
+                    options,
+                    views,
+                    group_ids,
+                    memory.name,
+                    worker_connection,
+                ),
+                name=f"Shard{worker}",
+                daemon=True,
+            )
+            process.start()
+            self._memories.append(memory)
+            self._buffers.append(shard_buffers(memory, binnings))
+            self._connections.append(connection)
+            self._processes.append(process)
+        self._views = len(views)
+
+    def __len__(self) -> int:
+        return len(self._processes)
+
+    def collect(self) -> Tuple[List[Bins], ShardStats]:
+        # Bins of each view received by every worker since the last call.
+        for connection in self._connections:
+            connection.send(True)
+        replies = [connection.recv() for connection in self._connections]
+        # the same bin may have been hit on several workers
+        merged = [
+            merge_bins(
+                [
+                    (buffers[view][0][: sizes[view]], buffers[view][1][: sizes[view]])
+                    for buffers, (sizes, _) in zip(self._buffers, replies)
+                ]
+            )
+            for view in range(self._views)
+        ]
+        stats = ShardStats(*(sum(values) for values in zip(*(stats for _, stats in replies))))
+        return merged, stats
+
+    def close(self, timeout: Optional[float] = 5.0) -> None:
+        for connection, process in zip(self._connections, self._processes):
+            if process.is_alive():
+                connection.send(None)
+            process.join(timeout)
+        for memory in self._memories:
+            memory.close()
+            memory.unlink()
@@ -1,14 +1,21 @@
 import socket
-from typing import Any, Optional, Dict
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 
 import numpy as np
 import numpy.typing as npt
 from is_msgs.camera_pb2 import FrameTransformation
 from is_msgs.image_pb2 import ObjectAnnotations, Vertex
-from is_wire.core import Channel, Subscription
+from is_wire.core import Channel, Subscription, now
 
+from is_skeletons_heatmap.conf.options_pb2 import TransformationOptions
 from is_skeletons_heatmap.logger import Logger
-from is_skeletons_heatmap.utils import array2vertex, tensor2array, vertex2array
+from is_skeletons_heatmap.utils import (
+    annotations2array,
+    array2vertex,
+    tensor2array,
+    vertex2array,
+)
 
 
 def transform_vertex(vertex: Vertex, transformation: npt.NDArray[np.float32]) -> Vertex:
@@ -22,55 +29,163 @@ def transform_vertex(vertex: Vertex, transformation: npt.NDArray[np.float32]) ->
     return array2vertex(vertex=new_vertex)
 
 
+def transform_array(
+    positions: npt.NDArray[np.float64],
+    transformation: npt.NDArray[Any],
+) -> npt.NDArray[np.float64]:
+    return positions @ transformation[:3, :3].T + transformation[:3, 3]
+
+
 def transform_object_annotations(
     annotations: ObjectAnnotations,
     transformation: npt.NDArray[np.float32],
     referential: int,
 ) -> ObjectAnnotations:
+    positions, _, _ = annotations2array(annotations)
+    new_positions = iter(transform_array(positions, transformation).tolist())
     new_objs = ObjectAnnotations(frame_id=referential)
     for obj in annotations.objects:
         new_obj = new_objs.objects.add()
         for keypoint in obj.keypoints:
             new_keypoint = new_obj.keypoints.add()
             new_keypoint.id = keypoint.id
-            new_keypoint.position.CopyFrom(
-                transform_vertex(keypoint.position, transformation)
-            )
+            x, y, z = next(new_positions)
+            new_keypoint.position.x = x
+            new_keypoint.position.y = y
+            new_keypoint.position.z = z
     return new_objs
 
 
 class TransformationFetcher:
-    def __init__(self, broker_uri: str) -> None:
+    def __init__(
+        self,
+        broker_uri: str,
+        options: Optional[TransformationOptions] = None,
+    ) -> None:
         self.log = Logger("TransformationFetcher")
-        self.channel = Channel(uri=broker_uri, exchange="is")
-        self.subscription = Subscription(
-            channel=self.channel,
-            name="TransformationFetcher",
-        )
+        self.broker_uri = broker_uri
+        options = TransformationOptions() if options is None else options
+        self.timeout = options.timeout_s if options.timeout_s > 0 else 5.0
+        self.ttl = options.ttl_s
+        self.max_backoff = options.max_backoff_s if options.max_backoff_s > 0 else 60.0
         self.transformations: Dict[int, Dict[int, npt.NDArray[Any]]] = {}
+        # pending requests and refreshes, with time of next attempt and current backoff
+        self._requests: Dict[Tuple[int, int], Tuple[float, float]] = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def prefetch(self, sources: Iterable[int], dst: int) -> None:
+        for src in sources:
+            if src != dst:
+                self._request(src, dst)
 
     def get_transformation(self, src: int, dst: int) -> Optional[npt.NDArray[Any]]:
-        if src in self.transformations and dst in self.transformations[src]:
-            return self.transformations[src][dst]
-        self.log.debug("event=RequestTranformation, from={}, to={}", src, dst)
-        if self._request_transformation(src, dst):
-            self.log.debug("event=ReceivedTranformation, from={}, to={}", src, dst)
-            return self.transformations[src][dst]
-        self.log.warn("event=FailedRequestTranformation, from={}, to={}", src, dst)
+        with self._lock:
+            if src in self.transformations and dst in self.transformations[src]:
+                return self.transformations[src][dst]
+        self._request(src, dst)
         return None
 
-    def _request_transformation(self, src: int, dst: int) -> bool:
-        topic = f"FrameTransformation.{src}.{dst}"
-        self.subscription.subscribe(topic)
+    def _request(self, src: int, dst: int) -> None:
+        with self._lock:
+            if (src, dst) in self._requests:
+                return
+            self.log.debug("event=RequestTranformation, from={}, to={}", src, dst)
+            self._requests[(src, dst)] = (0.0, self.timeout)
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run,
+                    name="TransformationFetcher",
+                    daemon=True,
+                )
+                self._thread.start()
+        self._wakeup.set()
+
+    def _run(self) -> None:
+        channel: Optional[Channel] = None
+        subscription: Optional[Subscription] = None
+        while True:
+            with self._lock:
+                attempts = {key: attempt for key, (attempt, _) in self._requests.items()}
+            keys = [key for key, attempt in attempts.items() if attempt <= now()]
+            if len(keys) == 0:
+                next_attempt = min(attempts.values(), default=None)
+                self._wakeup.wait(None if next_attempt is None else next_attempt - now())
+                self._wakeup.clear()
+                continue
+            try:
+                if channel is None or subscription is None:
+                    channel = Channel(uri=self.broker_uri, exchange="is")
+                    subscription = Subscription(channel=channel, name="TransformationFetcher")
+                received = self._fetch(channel, subscription, keys)
+            except Exception as ex:
+                self.log.warn("event=FetchError, error={}", ex)
+                channel, subscription, received = None, None, {}
+            self._update(keys, received)
+
+    def _fetch(
+        self,
+        channel: Channel,
+        subscription: Subscription,
+        keys: List[Tuple[int, int]],
+    ) -> Dict[Tuple[int, int], npt.NDArray[Any]]:
+        topics = {f"FrameTransformation.{src}.{dst}": (src, dst) for src, dst in keys}
+        for topic in topics:
+            subscription.subscribe(topic)
+        received: Dict[Tuple[int, int], npt.NDArray[Any]] = {}
+        deadline = now() + self.timeout
         try:
-            msg = self.channel.consume(timeout=5.0)
-            self.subscription.unsubscribe(topic)
+            while len(received) < len(topics):
+                msg = channel.consume(timeout=max(deadline - now(), 0.0))
+                if msg.topic in topics:
+                    transformation = msg.unpack(FrameTransformation)
+                    received[topics[msg.topic]] = tensor2array(transformation.tf)
         except socket.timeout:
-            self.log.warn("event=Timeout, topic={}, timeout={}", topic, 5.0)
-            self.subscription.unsubscribe(topic)
-            return False
-        transformation = msg.unpack(FrameTransformation)
-        if src not in self.transformations:
-            self.transformations[src] = {}
-        self.transformations[src][dst] = tensor2array(transformation.tf)
-        return True
+            pass
+        for topic in topics:
+            subscription.unsubscribe(topic)
+        return received
+
+    def _update(
+        self,
+        keys: List[Tuple[int, int]],
+        received: Dict[Tuple[int, int], npt.NDArray[Any]],
+    ) -> None:
+        with self._lock:
+            for src, dst in keys:
+                _, backoff = self._requests[(src, dst)]
+                if (src, dst) in received:
+                    self.log.debug("event=ReceivedTranformation, from={}, to={}", src, dst)
+                    self.transformations.setdefault(src, {})[dst] = received[(src, dst)]
+                    if self.ttl > 0:
+                        self._requests[(src, dst)] = (now() + self.ttl, self.timeout)
+                    else:
+                        del self._requests[(src, dst)]
+                else:
+                    self.log.warn(
+                        "event=FailedRequestTranformation, from={}, to={}, retry_in={:.1f}s",
+                        src,
+                        dst,
+                        backoff,
+                    )
+                    self._requests[(src, dst)] = (
+                        now() + backoff,
+                        min(2 * backoff, self.max_backoff),
+                    )
+
+
+class StaticTransformationFetcher(TransformationFetcher):
+    # In-memory stand-in that never connects to a broker, for replays and benchmarks.
+    def __init__(
+        self,
+        transformations: Optional[Dict[int, Dict[int, npt.NDArray[Any]]]] = None,
+    ) -> None:
+        self.log = Logger("StaticTransformationFetcher")
+        self.transformations = {} if transformations is None else transformations
+
+    def prefetch(self, sources: Iterable[int], dst: int) -> None:
+        pass
+
+    def get_transformation(self, src: int, dst: int) -> Optional[npt.NDArray[Any]]:
+        return self.transformations.get(src, {}).get(dst)
@@ -1,10 +1,11 @@
-from typing import Any
+import struct
+from typing import Any, List, Tuple
 
 import cv2
 import numpy as np
 import numpy.typing as npt
 from is_msgs.common_pb2 import DataType, Tensor
-from is_msgs.image_pb2 import Image, Vertex
+from is_msgs.image_pb2 import Image, ObjectAnnotations, Vertex
 
 
 def array2image(
@@ -16,6 +17,8 @@ def array2image(
         params = [cv2.IMWRITE_JPEG_QUALITY, int(compression_level * (100 - 0) + 0)]
     elif encode_format == ".png":
         params = [cv2.IMWRITE_PNG_COMPRESSION, int(compression_level * (9 - 0) + 0)]
+    elif encode_format == ".webp":
+        params = [cv2.IMWRITE_WEBP_QUALITY, int(compression_level * (100 - 1) + 1)]
     else:
         return Image()
     cimage = cv2.imencode(ext=encode_format, img=input_image, params=params)
@@ -23,9 +26,10 @@ def array2image(
 
 
 def tensor2array(tensor: Tensor) -> npt.NDArray[Any]:
-    if len(tensor.shape.dims) != 2 or tensor.shape.dims[0].name != "rows":
+    names = tuple(dim.name for dim in tensor.shape.dims)
+    if names not in (("rows", "cols"), ("layers", "rows", "cols")):
         return np.array([])
-    shape = (tensor.shape.dims[0].size, tensor.shape.dims[1].size)
+    shape = tuple(dim.size for dim in tensor.shape.dims)
     if tensor.type == DataType.Value("INT32_TYPE"):
         return np.array(tensor.ints32, dtype=np.int32, copy=False).reshape(shape)
     if tensor.type == DataType.Value("INT64_TYPE"):
@@ -37,6 +41,49 @@ def tensor2array(tensor: Tensor) -> npt.NDArray[Any]:
     return np.array([])
 
 
+def array2tensor(array: npt.NDArray[Any]) -> Tensor:
+    tensor = Tensor()
+    # layered histograms have a leading dimension
+    for size, name in zip(array.shape, ("layers", "rows", "cols")[-array.ndim:]):
+        tensor.shape.dims.add(size=size, name=name)
+    if array.dtype == np.int32:
+        tensor.type = DataType.Value("INT32_TYPE")
+        tensor.ints32.extend(array.ravel().tolist())
+    elif array.dtype == np.int64:
+        tensor.type = DataType.Value("INT64_TYPE")
+        tensor.ints64.extend(array.ravel().tolist())
+    elif array.dtype == np.float32:
+        tensor.type = DataType.Value("FLOAT_TYPE")
+        tensor.floats.extend(array.ravel().tolist())
+    elif array.dtype == np.float64:
+        tensor.type = DataType.Value("DOUBLE_TYPE")
+        tensor.doubles.extend(array.ravel().tolist())
+    return tensor
+
+
+def encode_tensor(array: npt.NDArray[Any]) -> bytes:
+    # Same bytes of array2tensor(array).SerializeToString(), for int64 and float64
+    # arrays, written straight to the wire format. Building repeated fields with the
+    # pure python protobuf implementation takes seconds on large histograms.
+    shape = b""
+    for size, name in zip(array.shape, ("layers", "rows", "cols")[-array.ndim:]):
+        dim = _varint(1 << 3 | 0) + _varint(size) if size != 0 else b""
+        dim += _varint(2 << 3 | 2) + _varint(len(name)) + name.encode()
+        shape += _varint(1 << 3 | 2) + _varint(len(dim)) + dim
+    data = _varint(1 << 3 | 2) + _varint(len(shape)) + shape
+    if array.dtype == np.int64:
+        data += _varint(2 << 3 | 0) + _varint(DataType.Value("INT64_TYPE"))
+        values, tag = _varints(array.ravel()), 6 << 3 | 2
+    elif array.dtype == np.float64:
+        data += _varint(2 << 3 | 0) + _varint(DataType.Value("DOUBLE_TYPE"))
+        values, tag = array.astype("<f8", copy=False).tobytes(), 4 << 3 | 2
+    else:
+        raise TypeError(f"Unsupported dtype {array.dtype}")
+    if len(values) == 0:
+        return data
+    return b"".join([data, _varint(tag), _varint(len(values)), values])
+
+
 def vertex2array(vertex: Vertex, homogeneous: bool = False) -> npt.NDArray[np.float32]:
     if homogeneous:
         return np.array([vertex.x, vertex.y, vertex.z, 1.0])
@@ -45,3 +92,154 @@ def vertex2array(vertex: Vertex, homogeneous: bool = False) -> npt.NDArray[np.fl
 
 def array2vertex(vertex: npt.NDArray[np.float32]) -> Vertex:
     return Vertex(x=vertex[0], y=vertex[1], z=vertex[2])
+
+
+def annotations2array(
+    annotations: ObjectAnnotations,
+) -> Tuple[npt.NDArray[np.float64], npt.NDArray[np.int64], npt.NDArray[np.int64]]:
+    # positions of all keypoints, the index of the object and the id of each one
+    positions = np.array(
+        [
+            (keypoint.position.x, keypoint.position.y, keypoint.position.z)
+            for obj in annotations.objects
+            for keypoint in obj.keypoints
+        ],
+        dtype=np.float64,
+    ).reshape(-1, 3)
+    sizes = [len(obj.keypoints) for obj in annotations.objects]
+    objects = np.repeat(np.arange(len(sizes), dtype=np.int64), sizes)
+    ids = np.array(
+        [keypoint.id for obj in annotations.objects for keypoint in obj.keypoints],
+        dtype=np.int64,
+    )
+    return positions, objects, ids
+
+
+_unpack_float = struct.Struct("<f").unpack_from
+
+
+def _read_varint(data: bytes, pos: int) -> Tuple[int, int]:
+    result, shift = 0, 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return result, pos
+        shift += 7
+
+
+def _varint(value: int) -> bytes:
+    # negative values are encoded as 64-bit two's complement
+    value &= (1 << 64) - 1
+    data = bytearray()
+    while value > 0x7F:
+        data.append(value & 0x7F | 0x80)
+        value >>= 7
+    data.append(value)
+    return bytes(data)
+
+
+def _varints(values: npt.NDArray[np.int64]) -> bytes:
+    # varints of every value, one 7-bit group at a time for all values at once
+    remaining = values.view(np.uint64)
+    groups, lengths = [], np.ones(values.size, dtype=np.int64)
+    while True:
+        groups.append((remaining & np.uint64(0x7F)).astype(np.uint8))
+        remaining = remaining >> np.uint64(7)
+        more = remaining > 0
+        if not more.any():
+            break
+        groups[-1] |= more.astype(np.uint8) << 7
+        lengths += more
+    stacked = np.stack(groups, axis=1)
+    return stacked[np.arange(len(groups)) < lengths[:, np.newaxis]].tobytes()
+
+
+def _skip_field(data: bytes, pos: int, wire_type: int) -> int:
+    if wire_type == 0:
+        return _read_varint(data, pos)[1]
+    if wire_type == 1:
+        return pos + 8
+    if wire_type == 2:
+        size, pos = _read_varint(data, pos)
+        return pos + size
+    if wire_type == 5:
+        return pos + 4
+    raise ValueError(f"Unsupported wire type {wire_type}")
+
+
+def _int64(value: int) -> int:
+    # int64 fields are encoded as 64-bit two's complement
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def decode_annotations(
+    data: bytes,
+) -> Tuple[int, npt.NDArray[np.float64], npt.NDArray[np.int64], npt.NDArray[np.int64]]:
+    # Same as annotations2array(ObjectAnnotations.FromString(data)), with the frame_id
+    # first, but only reading keypoint positions from the wire format. It is several
+    # times faster than the pure python protobuf implementation.
+    frame_id, pos, end = 0, 0, len(data)
+    coordinates: List[Tuple[float, float, float]] = []
+    ids: List[int] = []
+    sizes: List[int] = []
+    while pos < end:
+        tag, pos = _read_varint(data, pos)
+        if tag == (1 << 3 | 2):  # ObjectAnnotations.objects
+            size, pos = _read_varint(data, pos)
+            object_end, n_keypoints = pos + size, 0
+            while pos < object_end:
+                tag, pos = _read_varint(data, pos)
+                if tag != (5 << 3 | 2):  # ObjectAnnotation.keypoints
+                    pos = _skip_field(data, pos, tag & 0x7)
+                    continue
+                size, pos = _read_varint(data, pos)
+                keypoint_end = pos + size
+                x = y = z = 0.0
+                keypoint_id = 0
+                while pos < keypoint_end:
+                    tag, pos = _read_varint(data, pos)
+                    if tag == (1 << 3 | 0):  # PointAnnotation.id
+                        keypoint_id, pos = _read_varint(data, pos)
+                        keypoint_id = _int64(keypoint_id)
+                        continue
+                    if tag != (3 << 3 | 2):  # PointAnnotation.position
+                        pos = _skip_field(data, pos, tag & 0x7)
+                        continue
+                    size, pos = _read_varint(data, pos)
+                    vertex_end = pos + size
+                    while pos < vertex_end:
+                        tag, pos = _read_varint(data, pos)
+                        if tag == (1 << 3 | 5):
+                            x = _unpack_float(data, pos)[0]
+                        elif tag == (2 << 3 | 5):
+                            y = _unpack_float(data, pos)[0]
+                        elif tag == (3 << 3 | 5):
+                            z = _unpack_float(data, pos)[0]
+                        pos = _skip_field(data, pos, tag & 0x7)
+                coordinates.append((x, y, z))
+                ids.append(keypoint_id)
+                n_keypoints += 1
+            sizes.append(n_keypoints)
+        elif tag == (3 << 3 | 0):  # ObjectAnnotations.frame_id
+            frame_id, pos = _read_varint(data, pos)
+            frame_id = _int64(frame_id)
+        else:
+            pos = _skip_field(data, pos, tag & 0x7)
+    positions = np.array(coordinates, dtype=np.float64).reshape(-1, 3)
+    objects = np.repeat(np.arange(len(sizes), dtype=np.int64), sizes)
+    return frame_id, positions, objects, np.array(ids, dtype=np.int64)
+
+
+def group_mean(
+    values: npt.NDArray[np.float64],
+    groups: npt.NDArray[np.int64],
+) -> npt.NDArray[np.float64]:
+    counts = np.bincount(groups)
+    sums = np.stack(
+        [np.bincount(groups, weights=values[:, axis]) for axis in range(values.shape[1])],
+        axis=1,
+    ).reshape(-1, values.shape[1])
+    valid = counts > 0
+    return sums[valid] / counts[valid, np.newaxis]
@@ -0,0 +1,200 @@
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+import numpy as np
+import numpy.typing as npt
+
+from is_skeletons_heatmap.binning import Bins, merge_bins
+
+# seconds covered by a bucket of each level of TimeWindow
+TIME_LEVELS = (1, 60, 3600)
+# a window keeps at least this number of buckets, if it is long enough
+MIN_BUCKETS = 24
+
+
+class SlidingWindow:
+    def __init__(self, samples: int, capacity: int = 4096) -> None:
+        self._samples = samples
+        # number of entries stored by each of the last 'samples' ticks, indexed by tick
+        self._sizes = np.zeros(shape=samples, dtype=np.int64)
+        self._indices = np.empty(shape=capacity, dtype=np.int64)
+        self._counts = np.empty(shape=capacity, dtype=np.int64)
+        self._head = 0
+        self._length = 0
+        self._tick = 0
+
+    def __len__(self) -> int:
+        return self._length
+
+    @property
+    def full(self) -> bool:
+        return self._tick >= self._samples
+
+    @property
+    def occupancy(self) -> float:
+        return min(self._tick, self._samples) / self._samples
+
+    def push(
+        self,
+        indices: npt.NDArray[np.int64],
+        counts: npt.NDArray[np.int64],
+    ) -> Tuple[npt.NDArray[np.int64], npt.NDArray[np.int64]]:
+        # Returns the entries of the tick that left the window, if it is already full.
+        # Entries of a single tick have unique indices, so they can be subtracted from
+        # the histogram with plain fancy indexing.
+        slot = self._tick % self._samples
+        expired = self._pop(int(self._sizes[slot]))
+        self._append(indices, counts)
+        self._sizes[slot] = indices.size
+        self._tick += 1
+        return expired
+
+    def get_state(self) -> Dict[str, npt.NDArray[Any]]:
+        positions = (self._head + np.arange(self._length)) % self._indices.size
+        return {
+            "window_sizes": self._sizes.copy(),
+            "window_indices": self._indices[positions],
+            "window_counts": self._counts[positions],
+            "window_tick": np.array([self._tick], dtype=np.int64),
+        }
+
+    def set_state(self, state: Dict[str, npt.NDArray[Any]]) -> None:
+        self._sizes[:] = state["window_sizes"]
+        self._length = state["window_indices"].size
+        capacity = max(self._indices.size, self._length)
+        self._indices = np.empty(shape=capacity, dtype=np.int64)
+        self._counts = np.empty(shape=capacity, dtype=np.int64)
+        self._indices[: self._length] = state["window_indices"]
+        self._counts[: self._length] = state["window_counts"]
+        self._head = 0
+        self._tick = int(state["window_tick"][0])
+
+    def _pop(self, size: int) -> Tuple[npt.NDArray[np.int64], npt.NDArray[np.int64]]:
+        positions = (self._head + np.arange(size)) % self._indices.size
+        self._head = (self._head + size) % self._indices.size
+        self._length -= size
+        return self._indices[positions], self._counts[positions]
+
+    def _append(self, indices: npt.NDArray[np.int64], counts: npt.NDArray[np.int64]) -> None:
+        if self._length + indices.size > self._indices.size:
+            self._grow(self._length + indices.size)
+        positions = (self._head + self._length + np.arange(indices.size)) % self._indices.size
+        self._indices[positions] = indices
+        self._counts[positions] = counts
+        self._length += indices.size
+
+    def _grow(self, required: int) -> None:
+        capacity = max(2 * self._indices.size, required)
+        positions = (self._head + np.arange(self._length)) % self._indices.size
+        indices = np.empty(shape=capacity, dtype=np.int64)
+        counts = np.empty(shape=capacity, dtype=np.int64)
+        indices[: self._length] = self._indices[positions]
+        counts[: self._length] = self._counts[positions]
+        self._indices, self._counts = indices, counts
+        self._head = 0
+
+
+class TimeWindow:
+    # Window over the last 'seconds' of wall time. Counts received on each second are
+    # rolled up into a per-minute bucket, and closed minutes into a per-hour one, up to
+    # the coarsest level where the window still has MIN_BUCKETS buckets. Only closed
+    # buckets of that level are kept, so memory depends on the number of buckets and
+    # not on how many periods they cover, e.g. 24 hourly buckets for a whole day.
+    # The window holds the open bucket plus the closed ones younger than 'seconds', so
+    # it is accurate up to the size of a bucket of its level.
+    def __init__(self, seconds: int) -> None:
+        self._seconds = seconds
+        levels = [size for size in TIME_LEVELS if seconds // size >= MIN_BUCKETS]
+        self._levels = TIME_LEVELS[: max(1, len(levels))]
+        self._buckets = max(1, round(seconds / self._levels[-1]))
+        # index of the open bucket of each level, and entries received on it so far
+        self._open = [-1] * len(self._levels)
+        self._pending: List[List[Bins]] = [[] for _ in self._levels]
+        # closed buckets of the last level with their index, oldest first
+        self._closed: Deque[Tuple[int, Bins]] = deque()
+        self._start: Optional[float] = None
+        self._last = 0.0
+
+    @property
+    def occupancy(self) -> float:
+        if self._start is None:
+            return 0.0
+        return min(self._last - self._start, self._seconds) / self._seconds
+
+    def push(
+        self,
+        timestamp: float,
+        indices: npt.NDArray[np.int64],
+        counts: npt.NDArray[np.int64],
+    ) -> Bins:
+        # Returns the entries of the buckets that left the window, with unique indices.
+        # Timestamps going backwards are counted on the open bucket.
+        if self._start is None:
+            self._start = timestamp
+        self._last = max(self._last, timestamp)
+        for level, size in enumerate(self._levels):
+            bucket = int(self._last // size)
+            # boundaries of a level are also boundaries of the finer ones
+            if bucket == self._open[level]:
+                break
+            self._close(level)
+            self._open[level] = bucket
+        expired = []
+        while len(self._closed) > 0 and self._closed[0][0] <= self._open[-1] - self._buckets:
+            expired.append(self._closed.popleft()[1])
+        if indices.size > 0:
+            self._pending[0].append((indices, counts))
+        return merge_bins(expired)
+
+    def get_state(self) -> Dict[str, npt.NDArray[Any]]:
+        # pending entries are stored with their level, closed buckets with their index
+        keys, list_bins = [], []
+        for level, pending in enumerate(self._pending):
+            for bins in pending:
+                keys.append((level, self._open[level]))
+                list_bins.append(bins)
+        for bucket, bins in self._closed:
+            keys.append((len(self._levels), bucket))
+            list_bins.append(bins)
+        return {
+            "time_window_open": np.array(self._open, dtype=np.int64),
+            "time_window_time": np.array(
+                [np.nan if self._start is None else self._start, self._last],
+                dtype=np.float64,
+            ),
+            "time_window_keys": np.array(keys, dtype=np.int64).reshape(-1, 2),
+            "time_window_sizes": np.array([bins[0].size for bins in list_bins], dtype=np.int64),
+            "time_window_indices": _concatenate([bins[0] for bins in list_bins]),
+            "time_window_counts": _concatenate([bins[1] for bins in list_bins]),
+        }
+
+    def set_state(self, state: Dict[str, npt.NDArray[Any]]) -> None:
+        self._open = [int(bucket) for bucket in state["time_window_open"]]
+        start, self._last = (float(value) for value in state["time_window_time"])
+        self._start = None if np.isnan(start) else start
+        self._pending = [[] for _ in self._levels]
+        self._closed.clear()
+        offsets = np.cumsum(np.concatenate([[0], state["time_window_sizes"]]))
+        for (level, bucket), begin, end in zip(state["time_window_keys"], offsets, offsets[1:]):
+            bins = (
+                np.array(state["time_window_indices"][begin:end]),
+                np.array(state["time_window_counts"][begin:end]),
+            )
+            if level < len(self._levels):
+                self._pending[level].append(bins)
+            else:
+                self._closed.append((int(bucket), bins))
+
+    def _close(self, level: int) -> None:
+        if len(self._pending[level]) == 0:
+            return
+        bins = merge_bins(self._pending[level])
+        self._pending[level] = []
+        if level + 1 < len(self._levels):
+            self._pending[level + 1].append(bins)
+        else:
+            self._closed.append((self._open[level], bins))
+
+
+def _concatenate(arrays: List[npt.NDArray[np.int64]]) -> npt.NDArray[np.int64]:
+    return np.concatenate([np.empty(0, dtype=np.int64), *arrays])
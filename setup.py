@@ -12,6 +12,7 @@ setup(
     entry_points={
         'console_scripts': [
             'is-skeletons-heatmap=is_skeletons_heatmap.service:main',
+            'is-skeletons-heatmap-replay=is_skeletons_heatmap.replay:main',
         ],
     },
     zip_safe=False,
@@ -21,7 +22,6 @@ setup(
         'opencensus-ext-zipkin==0.2.1',
         'opencv-python==4.8.0.76',
         'numpy==1.26.0',
-        'scipy==1.11.2',
-        'matplotlib==3.8.0',
+        'prometheus-client==0.3.1',
     ],
 )
@@ -0,0 +1,69 @@
+from typing import Any, Dict, List, Sequence
+
+import numpy as np
+import numpy.typing as npt
+from is_msgs.image_pb2 import ObjectAnnotations
+
+from is_skeletons_heatmap.conf.options_pb2 import AreaLimits
+from is_skeletons_heatmap.transformation import transform_array
+
+
+def synthetic_transformations(
+    frame_ids: Sequence[int],
+    dst: int,
+    rng: np.random.Generator,
+) -> Dict[int, Dict[int, npt.NDArray[Any]]]:
+    # random rotations around z axis followed by a translation, from each frame to 'dst'
+    transformations: Dict[int, Dict[int, npt.NDArray[Any]]] = {}
+    for frame_id in frame_ids:
+        if frame_id == dst:
+            continue
+        angle = rng.uniform(-np.pi, np.pi)
+        transformation = np.eye(4, dtype=np.float64)
+        transformation[:2, :2] = [
+            [np.cos(angle), -np.sin(angle)],
+            [np.sin(angle), np.cos(angle)],
+        ]
+        transformation[:3, 3] = rng.uniform(-2.0, 2.0, size=3)
+        transformations[frame_id] = {dst: transformation}
+    return transformations
+
+
+def synthetic_annotations(
+    people: int,
+    keypoints: int,
+    frame_ids: Sequence[int],
+    limits: AreaLimits,
+    transformations: Dict[int, Dict[int, npt.NDArray[Any]]],
+    dst: int,
+    rng: np.random.Generator,
+) -> List[ObjectAnnotations]:
+    # One message per source frame, each one with 'people' skeletons of 'keypoints'
+    # joints placed inside 'limits' of frame 'dst', as a SkeletonsGrouper would publish.
+    list_annotations = []
+    for frame_id in frame_ids:
+        centers = np.column_stack(
+            [
+                rng.uniform(limits.xmin, limits.xmax, size=people),
+                rng.uniform(limits.ymin, limits.ymax, size=people),
+                np.zeros(people),
+            ]
+        )
+        positions = np.repeat(centers, keypoints, axis=0)
+        positions[:, :2] += rng.normal(0.0, 0.15, size=(positions.shape[0], 2))
+        positions[:, 2] = np.tile(np.linspace(0.0, 1.8, keypoints), people)
+        if frame_id != dst:
+            inverse = np.linalg.inv(transformations[frame_id][dst])
+            positions = transform_array(positions, inverse)
+
+        annotations = ObjectAnnotations(frame_id=frame_id)
+        for skeleton in positions.reshape(people, keypoints, 3).tolist():
+            obj = annotations.objects.add()
+            for keypoint_id, (x, y, z) in enumerate(skeleton, start=1):
+                keypoint = obj.keypoints.add()
+                keypoint.id = keypoint_id
+                keypoint.position.x = x
+                keypoint.position.y = y
+                keypoint.position.z = z
+        list_annotations.append(annotations)
+    return list_annotations
@@ -0,0 +1,161 @@
+import socket
+from types import SimpleNamespace
+
+import pytest
+from is_wire.core import Channel
+
+from is_skeletons_heatmap import channel as channel_module
+from is_skeletons_heatmap.channel import CustomChannel
+from is_skeletons_heatmap.conf.options_pb2 import ConsumerOptions, OverrunPolicy
+
+
+class Clock:
+    def __init__(self):
+        self.time = 0.0
+
+    def now(self):
+        return self.time
+
+    def sleep(self, seconds):
+        self.time += max(seconds, 0.0)
+
+
+class AmqpMessage:
+    def __init__(self, body, delivery_tag):
+        self.body = body
+        self.delivery_info = {"delivery_tag": delivery_tag}
+
+
+class StubConnection:
+    # delivers messages to the channel once the clock reaches their arrival time
+    def __init__(self, clock, arrivals):
+        self.clock = clock
+        self.arrivals = sorted(arrivals)
+        self.channel = None
+
+    def drain_events(self, timeout=None):
+        if self.arrivals and self.arrivals[0] <= self.clock.time + (timeout or 0.0):
+            self.clock.time = max(self.clock.time, self.arrivals[0])
+            while self.arrivals and self.arrivals[0] <= self.clock.time:
+                arrival = self.arrivals.pop(0)
+                tag = len(self.channel.delivered) + 1
+                self.channel.delivered.append(arrival)
+                self.channel._on_message(AmqpMessage(arrival, tag))
+            return
+        self.clock.time += timeout or 0.0
+        raise socket.timeout()
+
+
+class StubAmqpChannel:
+    def __init__(self):
+        self.calls = []
+
+    def __getattr__(self, name):
+        return lambda **kwargs: self.calls.append((name, kwargs))
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(channel_module, "now", clock.now)
+    monkeypatch.setattr(channel_module.time, "sleep", clock.sleep)
+    return clock
+
+
+def create_channel(monkeypatch, clock, arrivals, decode_s=0.0, **options):
+    def init(self, uri, exchange):
+        self.connection = StubConnection(clock, arrivals)
+        self._channel = StubAmqpChannel()
+
+    def from_amqp_message(message):
+        clock.time += decode_s
+        return message.body
+
+    monkeypatch.setattr(Channel, "__init__", init)
+    monkeypatch.setattr(channel_module.WireV1, "from_amqp_message", from_amqp_message)
+    channel = CustomChannel(options=ConsumerOptions(**options))
+    channel.connection.channel = channel
+    channel.delivered = []
+    return channel
+
+
+@pytest.mark.parametrize("bulk_drain", [False, True])
+def test_consume_for_returns_messages_of_each_period(monkeypatch, clock, bulk_drain):
+    channel = create_channel(monkeypatch, clock, [0.1, 0.3, 0.5], bulk_drain=bulk_drain)
+    assert channel.consume_for(period=0.4) == [0.1, 0.3]
+    assert clock.time == pytest.approx(0.4)
+    assert channel.consume_for(period=0.4) == [0.5]
+    assert clock.time == pytest.approx(0.8)
+    assert channel.overrun == 0.0
+
+
+@pytest.mark.parametrize("bulk_drain", [False, True])
+def test_max_batch_size_leaves_messages_for_next_periods(monkeypatch, clock, bulk_drain):
+    arrivals = [0.01 * index for index in range(5)]
+    channel = create_channel(
+        monkeypatch, clock, arrivals, bulk_drain=bulk_drain, max_batch_size=2
+    )
+    batches = [channel.consume_for(period=0.2) for _ in range(3)]
+    assert batches == [arrivals[:2], arrivals[2:4], arrivals[4:]]
+    # a full batch does not end the period early
+    assert clock.time == pytest.approx(0.6)
+
+
+def test_max_drain_ms_stops_bulk_drain(monkeypatch, clock):
+    arrivals = [0.01 * index for index in range(10)]
+    channel = create_channel(
+        monkeypatch, clock, arrivals, decode_s=0.001, bulk_drain=True, max_drain_ms=2.5
+    )
+    assert len(channel.consume_for(period=0.2)) == 3
+    assert len(channel.consume_for(period=0.2)) == 3
+
+
+@pytest.mark.parametrize(
+    "policy, ends",
+    [
+        # deadlines keep one period apart, so late periods end right away
+        ("CATCH_UP", [0.75, 0.75]),
+        # two periods are skipped, keeping deadlines on the grid of 0.2 s
+        ("SKIP", [0.8, 1.0]),
+        # the period starts when the overrun is detected
+        ("REALIGN", [0.95, 1.15]),
+    ],
+)
+def test_overrun_policies(monkeypatch, clock, policy, ends):
+    channel = create_channel(
+        monkeypatch, clock, [], overrun_policy=OverrunPolicy.Value(policy)
+    )
+    channel.consume_for(period=0.2)
+    # processing the period took until 0.75 s, past the next deadline of 0.4 s
+    clock.time = 0.75
+    channel.consume_for(period=0.2)
+    assert channel.overrun == pytest.approx(0.35)
+    assert clock.time == pytest.approx(ends[0])
+    channel.consume_for(period=0.2)
+    assert clock.time == pytest.approx(ends[1])
+
+
+def test_prefetch_acknowledges_once_per_period(monkeypatch, clock):
+    channel = create_channel(monkeypatch, clock, [0.1, 0.2, 0.3, 0.5], prefetch_count=10)
+    subscription = SimpleNamespace(name="Heatmap", id="tag")
+    channel.set_prefetch(subscription)
+    calls = [name for name, _ in channel._channel.calls]
+    assert calls == ["basic_qos", "basic_cancel", "basic_consume"]
+    assert channel._channel.calls[0][1]["prefetch_count"] == 10
+    assert channel._channel.calls[2][1]["no_ack"] is False
+
+    channel._channel.calls.clear()
+    assert channel.consume_for(period=0.4) == [0.1, 0.2, 0.3]
+    assert channel._channel.calls == [("basic_ack", {"delivery_tag": 3, "multiple": True})]
+    channel._channel.calls.clear()
+    channel.consume_for(period=0.4)
+    channel.consume_for(period=0.4)
+    # nothing is acknowledged on periods without messages
+    assert channel._channel.calls == [("basic_ack", {"delivery_tag": 4, "multiple": True})]
+
+
+def test_without_prefetch_messages_are_not_acknowledged(monkeypatch, clock):
+    channel = create_channel(monkeypatch, clock, [0.1])
+    channel.set_prefetch(SimpleNamespace(name="Heatmap", id="tag"))
+    assert channel.consume_for(period=0.4) == [0.1]
+    assert channel._channel.calls == []
@@ -0,0 +1,91 @@
+import os
+
+import numpy as np
+import pytest
+from google.protobuf.json_format import ParseDict
+
+from is_skeletons_heatmap.checkpoint import HistogramCheckpoint
+from is_skeletons_heatmap.conf.options_pb2 import SkeletonsHeatmapOptions
+from is_skeletons_heatmap.heatmap import SkeletonsHeatmap
+from is_skeletons_heatmap.transformation import StaticTransformationFetcher
+
+
+def create_heatmap(path, mode: dict) -> tuple:
+    options = ParseDict(
+        {
+            "limits": {"xmin": -4.0, "xmax": 4.0, "ymin": -4.0, "ymax": 4.0},
+            "bins_step": 0.1,
+            "frame_id": 1000,
+            "period_ms": 200,
+            **mode,
+        },
+        SkeletonsHeatmapOptions(),
+    )
+    checkpoint = HistogramCheckpoint(path=str(path), options=options, period=3600.0)
+    heatmap = SkeletonsHeatmap(options, StaticTransformationFetcher({}), checkpoint)
+    return heatmap, checkpoint
+
+
+def random_positions(rng: np.random.Generator) -> np.ndarray:
+    return rng.uniform(-4.0, 4.0, size=(40, 3))
+
+
+@pytest.mark.parametrize(
+    "mode",
+    [{}, {"samples": 3}, {"window_s": 120}, {"half_life_s": 1.0}],
+)
+def test_checkpoint_restores_state(tmp_path, mode):
+    rng = np.random.default_rng(seed=0)
+    heatmap, checkpoint = create_heatmap(tmp_path, mode)
+    for tick in range(5):
+        heatmap.update_positions(random_positions(rng), timestamp=30.0 * tick)
+    assert checkpoint.save(heatmap.get_state())
+    checkpoint.join()
+
+    restored, _ = create_heatmap(tmp_path, mode)
+    np.testing.assert_allclose(restored.get_histogram(), heatmap.get_histogram())
+    # windows and decay go on from the restored state
+    for tick in range(5, 9):
+        positions = random_positions(rng)
+        heatmap.update_positions(positions, timestamp=30.0 * tick)
+        restored.update_positions(positions, timestamp=30.0 * tick)
+    np.testing.assert_allclose(restored.get_histogram(), heatmap.get_histogram())
+
+
+def test_checkpoint_of_other_options_is_ignored(tmp_path):
+    rng = np.random.default_rng(seed=1)
+    heatmap, checkpoint = create_heatmap(tmp_path, {"samples": 3})
+    heatmap.update_positions(random_positions(rng))
+    checkpoint.save(heatmap.get_state())
+    checkpoint.join()
+
+    for mode in [{"samples": 4}, {"samples": 3, "bins_step": 0.2}, {"half_life_s": 1.0}]:
+        restored, _ = create_heatmap(tmp_path, mode)
+        assert restored.get_histogram().sum() == 0
+
+
+def test_partial_generation_is_not_loaded(tmp_path):
+    rng = np.random.default_rng(seed=2)
+    heatmap, checkpoint = create_heatmap(tmp_path, {})
+    heatmap.update_positions(random_positions(rng))
+    checkpoint.save(heatmap.get_state())
+    checkpoint.join()
+    saved = heatmap.get_histogram().copy()
+
+    # a crash while writing leaves a generation that 'CURRENT' does not point to
+    partial = tmp_path / "ffffffffffffffff"
+    partial.mkdir()
+    (partial / "histogram.npy").write_bytes(b"\x93NUMPY")
+    restored, checkpoint = create_heatmap(tmp_path, {})
+    np.testing.assert_array_equal(restored.get_histogram(), saved)
+
+    # and it is removed by the next save
+    checkpoint.save(restored.get_state())
+    checkpoint.join()
+    assert not partial.exists()
+    assert len([name for name in os.listdir(tmp_path) if (tmp_path / name).is_dir()]) == 1
+
+
+def test_missing_checkpoint_starts_empty(tmp_path):
+    heatmap, _ = create_heatmap(tmp_path / "missing", {"window_s": 60})
+    assert heatmap.get_histogram().sum() == 0
@@ -0,0 +1,262 @@
+import cv2
+import numpy as np
+import pytest
+from google.protobuf.json_format import ParseDict
+from is_msgs.image_pb2 import ObjectAnnotations
+
+from is_skeletons_heatmap.conf.options_pb2 import RotateFlags, SkeletonsHeatmapOptions
+from is_skeletons_heatmap.conf.query_pb2 import HeatmapQuery, HeatmapZone
+from is_skeletons_heatmap.heatmap import SkeletonsHeatmap
+from is_skeletons_heatmap.localizations import Localizations
+from is_skeletons_heatmap.render import JET_R_LUT, HeatmapRenderer
+from is_skeletons_heatmap.transformation import (
+    StaticTransformationFetcher,
+    transform_object_annotations,
+)
+from is_skeletons_heatmap.utils import tensor2array
+
+from tests.synthetic import synthetic_annotations, synthetic_transformations
+
+
+def create_heatmap(
+    samples: int, frame_ids: list, rng: np.random.Generator, window_s: int = 0
+) -> tuple:
+    options = ParseDict(
+        {
+            "limits": {"xmin": -4.0, "xmax": 4.0, "ymin": -4.0, "ymax": 4.0},
+            "bins_step": 0.1,
+            "frame_id": 1000,
+            "samples": samples,
+            "period_ms": 200,
+            "window_s": window_s,
+        },
+        SkeletonsHeatmapOptions(),
+    )
+    transformations = synthetic_transformations(frame_ids, 1000, rng)
+    heatmap = SkeletonsHeatmap(options, StaticTransformationFetcher(transformations))
+    return options, transformations, heatmap
+
+
+def reference_histogram(options, transformations, list_annotations) -> np.ndarray:
+    x_bins = np.arange(options.limits.xmin, options.limits.xmax, options.bins_step)
+    y_bins = np.arange(options.limits.ymin, options.limits.ymax, options.bins_step)
+    x, y = [], []
+    for annotations in list_annotations:
+        if annotations.frame_id != options.frame_id:
+            transformation = transformations[annotations.frame_id][options.frame_id]
+            annotations = transform_object_annotations(
+                annotations, transformation, options.frame_id
+            )
+        for obj in annotations.objects:
+            x.extend(keypoint.position.x for keypoint in obj.keypoints)
+            y.extend(keypoint.position.y for keypoint in obj.keypoints)
+    histogram, _, _ = np.histogram2d(x, y, bins=(x_bins, y_bins))
+    return histogram.T
+
+
+def test_update_heatmap_matches_histogram2d():
+    rng = np.random.default_rng(seed=0)
+    frame_ids = [1000, 1, 2]
+    options, transformations, heatmap = create_heatmap(0, frame_ids, rng)
+    list_annotations = synthetic_annotations(
+        10, 18, frame_ids, options.limits, transformations, 1000, rng
+    )
+    heatmap.update_heatmap(list_annotations)
+    expected = reference_histogram(options, transformations, list_annotations)
+    np.testing.assert_allclose(heatmap.get_histogram(), expected, atol=1e-9)
+    assert heatmap.changed
+
+
+def test_window_keeps_last_samples():
+    rng = np.random.default_rng(seed=1)
+    frame_ids = [1000, 1]
+    options, transformations, heatmap = create_heatmap(3, frame_ids, rng)
+    ticks = [
+        synthetic_annotations(4, 18, frame_ids, options.limits, transformations, 1000, rng)
+        for _ in range(6)
+    ]
+    for tick in ticks:
+        heatmap.update_heatmap(tick)
+    expected = sum(
+        reference_histogram(options, transformations, tick) for tick in ticks[-3:]
+    )
+    np.testing.assert_allclose(heatmap.get_histogram(), expected, atol=1e-9)
+
+
+def test_time_window_keeps_last_seconds():
+    rng = np.random.default_rng(seed=2)
+    frame_ids = [1000, 1]
+    options, transformations, heatmap = create_heatmap(0, frame_ids, rng, window_s=3600)
+    # one hour is kept as 60 buckets of one minute, so ticks of the oldest minute expire
+    timestamps = [0.0, 30.0, 130.0, 1800.0, 3610.0, 3659.0, 3665.0]
+    ticks = [
+        synthetic_annotations(4, 18, frame_ids, options.limits, transformations, 1000, rng)
+        for _ in timestamps
+    ]
+    for timestamp, tick in zip(timestamps, ticks):
+        localizations = Localizations(tick, StaticTransformationFetcher(transformations))
+        heatmap.update_localizations(localizations, timestamp=timestamp)
+    expected = sum(
+        reference_histogram(options, transformations, tick) for tick in ticks[2:]
+    )
+    np.testing.assert_allclose(heatmap.get_histogram(), expected, atol=1e-9)
+    assert heatmap.get_window_occupancy() == 1.0
+
+
+def test_decay_follows_elapsed_time():
+    rng = np.random.default_rng(seed=5)
+    frame_ids = [1000, 1]
+    options, transformations, _ = create_heatmap(0, frame_ids, rng)
+    options.half_life_s = 0.4
+    heatmap = SkeletonsHeatmap(options, StaticTransformationFetcher(transformations))
+    # periods of 0.2 s, with some of them skipped, long enough to renormalize the scale
+    timestamps = [0.0, 0.2, 0.4, 1.4, 1.6, 9.0, 9.2, 9.4, 19.0, 19.2]
+    ticks = [
+        synthetic_annotations(4, 18, frame_ids, options.limits, transformations, 1000, rng)
+        for _ in timestamps
+    ]
+    for timestamp, tick in zip(timestamps, ticks):
+        localizations = Localizations(tick, StaticTransformationFetcher(transformations))
+        heatmap.update_localizations(localizations, timestamp=timestamp)
+        expected = sum(
+            reference_histogram(options, transformations, past) * 0.5 ** ((timestamp - t) / 0.4)
+            for t, past in zip(timestamps, ticks)
+            if t <= timestamp
+        )
+        np.testing.assert_allclose(heatmap.get_histogram(), expected, rtol=1e-7, atol=1e-12)
+
+
+def test_untransformable_messages_are_counted_once():
+    rng = np.random.default_rng(seed=6)
+    options, transformations, _ = create_heatmap(0, [1000, 1], rng)
+    list_annotations = synthetic_annotations(
+        2, 18, [1000, 1], options.limits, transformations, 1000, rng
+    )
+    unknown = ObjectAnnotations()
+    unknown.CopyFrom(list_annotations[-1])
+    unknown.frame_id = 2
+    list_annotations.append(unknown)
+    localizations = Localizations(list_annotations, StaticTransformationFetcher(transformations))
+    # frame 2 is dropped on every view, frame 1000 only on the view of frame 1
+    for frame_id, average in [(1000, False), (1000, True), (1, False)]:
+        localizations.keypoints(frame_id, average)
+    assert localizations.untransformable == 2
+
+
+def test_layers_select_keypoints_and_heights():
+    rng = np.random.default_rng(seed=3)
+    frame_ids = [1000, 1]
+    options, transformations, _ = create_heatmap(0, frame_ids, rng)
+    options.layers.add(name="Feet", keypoint_ids=[15, 16])
+    options.layers.add(name="High").zmin.value = 1.0
+    options.layers.add(name="All")
+    fetcher = StaticTransformationFetcher(transformations)
+    heatmap = SkeletonsHeatmap(options, fetcher)
+    list_annotations = synthetic_annotations(
+        6, 18, frame_ids, options.limits, transformations, 1000, rng
+    )
+    heatmap.update_heatmap(list_annotations)
+    histogram = heatmap.get_histogram()
+    assert histogram.shape[0] == 3
+    positions, keypoint_ids = Localizations(list_annotations, fetcher).keypoints(1000)
+    selections = [
+        np.isin(keypoint_ids, [15, 16]),
+        positions[:, 2] >= 1.0,
+        np.ones(len(positions), dtype=bool),
+    ]
+    for layer, selected in zip(histogram, selections):
+        expected, _, _ = np.histogram2d(
+            positions[selected, 0],
+            positions[selected, 1],
+            bins=(
+                np.arange(options.limits.xmin, options.limits.xmax, options.bins_step),
+                np.arange(options.limits.ymin, options.limits.ymax, options.bins_step),
+            ),
+        )
+        np.testing.assert_allclose(layer, expected.T, atol=1e-9)
+    assert heatmap.get_np_image(layer=1).shape == heatmap.get_np_image(layer=2).shape
+
+
+def test_queries_match_histogram_while_window_slides():
+    rng = np.random.default_rng(seed=4)
+    frame_ids = [1000, 1]
+    options, transformations, heatmap = create_heatmap(3, frame_ids, rng)
+    heatmap.track_queries()
+    request = HeatmapQuery(area=HeatmapZone(xmin=-1.05, xmax=2.0, ymin=-3.0, ymax=0.5))
+    request.zones.add(xmin=-4.0, xmax=4.0, ymin=-4.0, ymax=4.0)
+    request.zones.add(xmin=0.0, xmax=1.0, ymin=-1.0, ymax=0.0)
+    for _ in range(5):
+        heatmap.update_heatmap(
+            synthetic_annotations(4, 18, frame_ids, options.limits, transformations, 1000, rng)
+        )
+        histogram = heatmap.get_histogram()
+        reply = heatmap.query(request)
+        # bins of 0.1 m start at -4.0, zones are snapped outwards
+        assert list(reply.totals) == [histogram.sum(), histogram[30:40, 40:50].sum()]
+        np.testing.assert_allclose(tensor2array(reply.histogram), histogram[10:45, 29:60])
+    request.max_size = 10
+    reply = heatmap.query(request)
+    # 4x4 bins on each cell, snapped to multiples of 4 bins
+    assert reply.cell_size == pytest.approx(0.4)
+    assert (reply.area.xmin, reply.area.ymin) == pytest.approx((-1.2, -3.2))
+    expected = histogram[8:48, 28:60].reshape(10, 4, 8, 4).sum(axis=(1, 3))
+    np.testing.assert_allclose(tensor2array(reply.histogram), expected)
+
+
+def test_render_resizes_by_output_scale():
+    rng = np.random.default_rng(seed=7)
+    frame_ids = [1000, 1]
+    options, transformations, _ = create_heatmap(0, frame_ids, rng)
+    options.output_scale.value = 2.5
+    options.flip_horizontal = True
+    options.output_rotate = RotateFlags.Value("ROTATE_90_CW")
+    heatmap = SkeletonsHeatmap(options, StaticTransformationFetcher(transformations))
+    heatmap.update_heatmap(
+        synthetic_annotations(4, 18, frame_ids, options.limits, transformations, 1000, rng)
+    )
+    # colored, resized, flipped and rotated, in that order
+    values = heatmap.get_histogram()
+    levels = (values - values.min()) / (values.max() - values.min()) * 256.0
+    image = JET_R_LUT[np.clip(levels, 0, 255).astype(np.uint8)]
+    image = cv2.resize(src=image, dsize=(0, 0), fx=2.5, fy=2.5)
+    image = cv2.rotate(src=cv2.flip(src=image, flipCode=1), rotateCode=cv2.ROTATE_90_CLOCKWISE)
+    np.testing.assert_array_equal(heatmap.get_np_image(), image)
+
+
+@pytest.mark.parametrize("scale", [2.0, 3.0, 2.5])
+@pytest.mark.parametrize("rotate", ["NONE", "ROTATE_90_CW", "ROTATE_180", "ROTATE_90_CCW"])
+@pytest.mark.parametrize("flips", [(False, False), (True, False), (False, True), (True, True)])
+def test_render_matches_resize_flip_rotate(scale, rotate, flips):
+    options = ParseDict(
+        {
+            "limits": {"xmin": -4.0, "xmax": 3.0, "ymin": -2.0, "ymax": 3.0},
+            "bins_step": 0.1,
+            "referential": {"x": 0.0, "y": 0.0, "length": 20},
+            "draw_grid": True,
+            "output_scale": scale,
+            "output_rotate": rotate,
+            "flip_horizontal": flips[0],
+            "flip_vertical": flips[1],
+        },
+        SkeletonsHeatmapOptions(),
+    )
+    values = np.random.default_rng(seed=5).exponential(size=(49, 69))
+    renderer = HeatmapRenderer(options, values.shape)
+    # colored, resized, flipped and rotated by cv2, each one a full pass
+    levels = (values - values.min()) / (values.max() - values.min()) * 256.0
+    image = JET_R_LUT[np.clip(levels, 0, 255).astype(np.uint8)]
+    image = cv2.resize(src=image, dsize=(0, 0), fx=scale, fy=scale)
+    overlay = np.zeros_like(image)
+    renderer._draw_grid(overlay)
+    renderer._draw_referential(overlay)
+    if any(flips):
+        flip_code = -1 if all(flips) else (1 if flips[0] else 0)
+        image = cv2.flip(src=image, flipCode=flip_code)
+        overlay = cv2.flip(src=overlay, flipCode=flip_code)
+    if rotate != "NONE":
+        rotate_code = RotateFlags.Value(rotate) - 1
+        image = cv2.rotate(src=image, rotateCode=rotate_code)
+        overlay = cv2.rotate(src=overlay, rotateCode=rotate_code)
+    drawn = overlay.any(axis=2)
+    image[drawn] = overlay[drawn]
+    np.testing.assert_array_equal(renderer.render(values), image)
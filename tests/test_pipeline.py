@@ -0,0 +1,131 @@
+import threading
+
+import pytest
+
+from is_skeletons_heatmap import pipeline
+from is_skeletons_heatmap.metrics import ServiceMetrics
+from is_skeletons_heatmap.pipeline import StageQueue, start_stage
+
+
+class Clock:
+    def __init__(self):
+        self.time = 0.0
+
+    def perf_counter(self):
+        return self.time
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(pipeline.time, "perf_counter", clock.perf_counter)
+    return clock
+
+
+def test_items_are_returned_in_order_with_their_lag(clock):
+    queue = StageQueue(maxsize=3)
+    for item in "abc":
+        queue.put(item)
+        clock.time += 0.5
+    assert len(queue) == 3
+    # each item waited since it was put, until it was taken
+    assert [queue.get() for _ in range(3)] == [("a", 1.5), ("b", 1.0), ("c", 0.5)]
+    assert len(queue) == 0
+
+
+def test_lag_is_exported_for_each_queue(clock):
+    metrics = ServiceMetrics()
+    consumed, rendered = StageQueue(maxsize=2), StageQueue(maxsize=2)
+    consumed.put("a")
+    clock.time += 0.3
+    rendered.put("b")
+    clock.time += 0.02
+    # as the update and publish stages do with what they take from each queue
+    for name, queue in (("consumed", consumed), ("rendered", rendered)):
+        _, lag = queue.get()
+        metrics.observe_lag(name, lag)
+
+    def sample(suffix, queue):
+        name = f"skeletons_heatmap_stage_queue_lag_seconds_{suffix}"
+        return metrics.registry.get_sample_value(name, {"queue": queue})
+
+    assert sample("sum", "consumed") == pytest.approx(0.32)
+    assert sample("sum", "rendered") == pytest.approx(0.02)
+    assert sample("count", "consumed") == sample("count", "rendered") == 1.0
+    # only the rendered item waited less than 25 ms
+    name = "skeletons_heatmap_stage_queue_lag_seconds_bucket"
+    for queue, count in (("consumed", 0.0), ("rendered", 1.0)):
+        assert metrics.registry.get_sample_value(name, {"queue": queue, "le": "0.025"}) == count
+
+
+def test_drop_oldest_keeps_newest_items_and_counts_dropped():
+    queue = StageQueue(maxsize=2, drop_oldest=True)
+    for item in range(5):
+        queue.put(item)
+    assert queue.dropped == 3
+    assert [queue.get()[0] for _ in range(2)] == [3, 4]
+    queue.put(5)
+    assert queue.dropped == 3
+
+
+def test_block_waits_for_room_without_dropping():
+    queue = StageQueue(maxsize=1)
+    queue.put(0)
+    put = threading.Event()
+
+    def produce():
+        queue.put(1)
+        put.set()
+
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+    # the producer waits while the queue is full
+    assert not put.wait(timeout=0.1)
+    assert queue.get()[0] == 0
+    assert put.wait(timeout=5.0)
+    producer.join(timeout=5.0)
+    assert queue.get()[0] == 1
+    assert queue.dropped == 0
+
+
+def test_get_waits_for_an_item():
+    queue = StageQueue(maxsize=1)
+    items = []
+    consumer = threading.Thread(target=lambda: items.append(queue.get()[0]), daemon=True)
+    consumer.start()
+    consumer.join(timeout=0.1)
+    assert consumer.is_alive() and items == []
+    queue.put("item")
+    consumer.join(timeout=5.0)
+    assert items == ["item"]
+
+
+def test_maxsize_is_at_least_one():
+    queue = StageQueue(maxsize=0, drop_oldest=True)
+    queue.put(0)
+    queue.put(1)
+    assert len(queue) == 1 and queue.dropped == 1
+
+
+@pytest.mark.filterwarnings("ignore::pytest.PytestUnhandledThreadExceptionWarning")
+def test_failing_stage_stops_every_stage():
+    failed = threading.Event()
+    queue = StageQueue(maxsize=1)
+    calls = []
+
+    def fail():
+        calls.append(None)
+        if len(calls) == 3:
+            raise RuntimeError("stage failed")
+
+    def wait():
+        # a stage blocked on its queue only stops once the queue gets an item
+        queue.get()
+
+    waiting = start_stage("Waiting", wait, failed)
+    failing = start_stage("Failing", fail, failed)
+    failing.join(timeout=5.0)
+    assert failed.is_set() and len(calls) == 3
+    queue.put(None)
+    waiting.join(timeout=5.0)
+    assert not waiting.is_alive()
@@ -0,0 +1,146 @@
+import json
+
+import numpy as np
+import pytest
+from google.protobuf.json_format import MessageToDict, ParseDict
+from is_msgs.camera_pb2 import FrameTransformation
+
+from is_skeletons_heatmap.conf.options_pb2 import SkeletonsHeatmapOptions
+from is_skeletons_heatmap.heatmap import SkeletonsHeatmap
+from is_skeletons_heatmap.localizations import Localizations
+from is_skeletons_heatmap.replay import main, read_annotations, replay, write_delimited
+from is_skeletons_heatmap.transformation import StaticTransformationFetcher
+from is_skeletons_heatmap.utils import array2tensor
+
+from tests.synthetic import synthetic_annotations, synthetic_transformations
+
+OPTIONS = {
+    "group_ids": [0, 1],
+    "limits": {"xmin": -4.0, "xmax": 4.0, "ymin": -4.0, "ymax": 4.0},
+    "bins_step": 0.1,
+    "frame_id": 1000,
+    "log_scale": True,
+    "period_ms": 200,
+}
+
+
+def test_replay_matches_service_heatmap(tmp_path):
+    rng = np.random.default_rng(seed=0)
+    options = ParseDict(OPTIONS, SkeletonsHeatmapOptions())
+    transformations = synthetic_transformations([1000, 1], 1000, rng)
+    periods = [
+        synthetic_annotations(3, 18, [1000, 1], options.limits, transformations, 1000, rng)
+        for _ in range(10)
+    ]
+    with open(tmp_path / "recording.bin", "wb") as file:
+        for period in periods:
+            for annotations in period:
+                write_delimited(file, annotations)
+    (tmp_path / "options.json").write_text(json.dumps(OPTIONS))
+    tf = FrameTransformation(to=1000, tf=array2tensor(transformations[1][1000]))
+    setattr(tf, "from", 1)
+    (tmp_path / "transformations.json").write_text(json.dumps([MessageToDict(tf)]))
+
+    main(
+        [
+            str(tmp_path / "options.json"),
+            str(tmp_path / "recording.bin"),
+            "--output",
+            str(tmp_path / "output"),
+            "--transformations",
+            str(tmp_path / "transformations.json"),
+            "--every",
+            "5",
+            "--chunk-size",
+            "4",
+        ]
+    )
+
+    heatmap = SkeletonsHeatmap(options, StaticTransformationFetcher(transformations))
+    for period in periods[:5]:
+        heatmap.update_heatmap(period)
+    output = tmp_path / "output" / "SkeletonsHeatmap.Rendered"
+    np.testing.assert_array_equal(np.load(output / "00000005.npy"), heatmap.get_histogram())
+    for period in periods[5:]:
+        heatmap.update_heatmap(period)
+    np.testing.assert_array_equal(np.load(output / "heatmap.npy"), heatmap.get_histogram())
+    assert (output / "heatmap.png").exists()
+
+
+@pytest.mark.parametrize("mode", [{"window_s": 1}, {"half_life_s": 0.5}])
+def test_replay_keeps_the_replay_clock(tmp_path, mode):
+    rng = np.random.default_rng(seed=1)
+    options = ParseDict({**OPTIONS, **mode}, SkeletonsHeatmapOptions())
+    transformations = synthetic_transformations([1000, 1], 1000, rng)
+    periods = [
+        synthetic_annotations(3, 18, [1000, 1], options.limits, transformations, 1000, rng)
+        for _ in range(10)
+    ]
+    recording = tmp_path / "recording.bin"
+    with open(recording, "wb") as file:
+        for period in periods:
+            for annotations in period:
+                write_delimited(file, annotations)
+
+    fetcher = StaticTransformationFetcher(transformations)
+    heatmap = SkeletonsHeatmap(options, fetcher)
+    n_periods = replay(
+        heatmaps=[heatmap],
+        list_annotations=read_annotations([str(recording)]),
+        tf_fetcher=fetcher,
+        period_size=3,
+        period_s=0.2,
+        chunk_size=100,
+    )
+    assert n_periods == 7
+
+    # periods of the service, timestamped by the replay clock
+    expected = SkeletonsHeatmap(options, fetcher)
+    messages = [annotations for period in periods for annotations in period]
+    for index in range(n_periods):
+        localizations = Localizations(messages[3 * index:3 * index + 3], fetcher)
+        expected.update_localizations(localizations, timestamp=0.2 * (index + 1))
+    np.testing.assert_allclose(heatmap.get_histogram(), expected.get_histogram())
+    # earlier periods were neither expired nor faded by a jump to the wall clock
+    last = SkeletonsHeatmap(options, fetcher)
+    last.update_heatmap(messages[18:])
+    assert heatmap.get_histogram().sum() > 1.5 * last.get_histogram().sum()
+
+
+def test_replay_flushes_chunks_on_the_replay_clock(tmp_path):
+    rng = np.random.default_rng(seed=2)
+    options = ParseDict(OPTIONS, SkeletonsHeatmapOptions())
+    transformations = synthetic_transformations([1000, 1], 1000, rng)
+    recording = tmp_path / "recording.bin"
+    with open(recording, "wb") as file:
+        for _ in range(10):
+            for annotations in synthetic_annotations(
+                3, 18, [1000, 1], options.limits, transformations, 1000, rng
+            ):
+                write_delimited(file, annotations)
+    fetcher = StaticTransformationFetcher(transformations)
+    heatmap = SkeletonsHeatmap(options, fetcher)
+    timestamps = []
+
+    def update_localizations(localizations, timestamp=None):
+        timestamps.append(timestamp)
+
+    heatmap.update_localizations = update_localizations
+    # chunks of 8 messages, the last 4 are flushed after the loop
+    replay([heatmap], read_annotations([str(recording)]), fetcher, 2, 0.2, chunk_size=8)
+    assert timestamps == pytest.approx([0.8, 1.6, 2.0])
+
+
+def test_replay_rejects_invalid_options(tmp_path):
+    (tmp_path / "options.json").write_text(json.dumps({**OPTIONS, "period_ms": 0}))
+    (tmp_path / "recording.bin").write_bytes(b"")
+    with pytest.raises(SystemExit):
+        main(
+            [
+                str(tmp_path / "options.json"),
+                str(tmp_path / "recording.bin"),
+                "--output",
+                str(tmp_path / "output"),
+            ]
+        )
+    assert not (tmp_path / "output").exists()
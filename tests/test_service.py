@@ -1,6 +1,162 @@
+import numpy as np
 import pytest
+from google.protobuf.json_format import ParseDict
+from is_msgs.common_pb2 import Tensor
+from is_msgs.image_pb2 import Image
+
 import is_skeletons_heatmap
+from is_skeletons_heatmap import service
+from is_skeletons_heatmap.conf.options_pb2 import SkeletonsHeatmapOptions
+from is_skeletons_heatmap.heatmap import SkeletonsHeatmap
+from is_skeletons_heatmap.metrics import ServiceMetrics
+from is_skeletons_heatmap.logger import Logger
+from is_skeletons_heatmap.service import HistogramPublisher, ImagePublisher, validate_options
+from is_skeletons_heatmap.transformation import StaticTransformationFetcher
+from is_skeletons_heatmap.utils import tensor2array
+
+from tests.synthetic import synthetic_annotations, synthetic_transformations
 
 
 def test_service():
     pass
+
+
+class FakeChannel:
+    def __init__(self):
+        self.messages = []
+
+    def publish(self, message, topic):
+        self.messages.append((topic, message))
+
+
+def create_image_publisher(monkeypatch, heartbeat):
+    clock = {"time": 0.0}
+    monkeypatch.setattr(service, "now", lambda: clock["time"])
+    rng = np.random.default_rng(seed=0)
+    options = ParseDict(
+        {
+            "limits": {"xmin": -4.0, "xmax": 4.0, "ymin": -3.0, "ymax": 4.0},
+            "bins_step": 0.1,
+            "frame_id": 1000,
+        },
+        SkeletonsHeatmapOptions(),
+    )
+    heatmap = SkeletonsHeatmap(options, StaticTransformationFetcher({}))
+    encoded = []
+
+    def encode_image(image):
+        encoded.append(image)
+        return Image(data=bytes([len(encoded)]))
+
+    monkeypatch.setattr(heatmap, "encode_image", encode_image)
+
+    def update():
+        positions = rng.uniform(-3.0, 3.0, size=(20, 3))
+        heatmap.update_positions(positions)
+
+    channel = FakeChannel()
+    publisher = ImagePublisher(channel, heatmap, "Heatmap", heartbeat, ServiceMetrics())
+    return publisher, channel, clock, update, encoded
+
+
+def test_unchanged_images_are_not_encoded_again(monkeypatch):
+    publisher, channel, clock, update, encoded = create_image_publisher(monkeypatch, 0.0)
+    update()
+    published = []
+    for tick in range(6):
+        clock["time"] = 0.2 * tick
+        if tick == 3:
+            update()
+        published.append(publisher.publish(publisher.render(), span=None))
+    # without heartbeat every tick is published, only the changed ones encoded again
+    assert published == [True] * 6
+    assert len(encoded) == 2
+    contents = [message.unpack(Image).data for _, message in channel.messages]
+    assert contents == [b"\x01"] * 3 + [b"\x02"] * 3
+
+
+def test_heartbeat_gates_unchanged_images(monkeypatch):
+    publisher, channel, clock, update, encoded = create_image_publisher(monkeypatch, 1.0)
+    update()
+    published = []
+    for tick in range(12):
+        clock["time"] = 0.2 * tick
+        if tick == 7:
+            update()
+        published.append(publisher.publish(publisher.render(), span=None))
+    # unchanged images are published once per heartbeat, changed ones right away
+    assert [tick for tick, done in enumerate(published) if done] == [0, 5, 7]
+    assert len(encoded) == 2
+    assert [topic for topic, _ in channel.messages] == ["Heatmap"] * 3
+
+
+@pytest.mark.parametrize("mode", [{"samples": 4}, {"half_life_s": 0.5}])
+def test_histogram_stream_rebuilds_histogram(mode):
+    rng = np.random.default_rng(seed=0)
+    options = ParseDict(
+        {
+            "limits": {"xmin": -4.0, "xmax": 4.0, "ymin": -3.0, "ymax": 4.0},
+            "bins_step": 0.1,
+            "frame_id": 1000,
+            "period_ms": 200,
+            **mode,
+        },
+        SkeletonsHeatmapOptions(),
+    )
+    transformations = synthetic_transformations([1000, 1], 1000, rng)
+    heatmap = SkeletonsHeatmap(options, StaticTransformationFetcher(transformations))
+    channel = FakeChannel()
+    stream = HistogramPublisher(channel, heatmap, "Heatmap", 5, ServiceMetrics())
+    stored, scale, topics = None, 1.0, []
+    for tick in range(12):
+        if tick % 4 != 3:
+            heatmap.update_heatmap(
+                synthetic_annotations(3, 18, [1000, 1], options.limits, transformations, 1000, rng)
+            )
+        if tick == 7:
+            stream.force_keyframe()
+        stream.publish(stream.snapshot(), span=None)
+        for topic, message in channel.messages:
+            values = tensor2array(message.unpack(Tensor))
+            topics.append(topic.rsplit(".", 1)[1])
+            if topic == "Heatmap.Histogram.Keyframe":
+                stored = values.astype(np.float64)
+                continue
+            # on decay mode, flat index -1 holds the scale of the stored values
+            scale = next((value for index, value in values if index == -1), scale)
+            rows = values[values[:, 0] >= 0]
+            stored.reshape(-1)[rows[:, 0].astype(np.int64)] = rows[:, 1]
+        channel.messages.clear()
+        np.testing.assert_allclose(stored * scale, heatmap.get_histogram())
+    keyframes = [index for index, topic in enumerate(topics) if topic == "Keyframe"]
+    assert len(keyframes) == 4
+    assert all(topic == "Delta" for topic in topics[1:keyframes[1]])
+
+
+@pytest.mark.parametrize(
+    "consumer, valid",
+    [
+        ({}, True),
+        ({"prefetch_count": 10}, True),
+        ({"prefetch_count": 10, "max_batch_size": 100}, False),
+        ({"max_drain_ms": 5.0}, False),
+        ({"bulk_drain": True}, False),
+        ({"overrun_policy": "SKIP"}, False),
+    ],
+)
+def test_sharding_only_accepts_prefetch(consumer, valid):
+    options = ParseDict(
+        {
+            "limits": {"xmin": -4.0, "xmax": 4.0, "ymin": -3.0, "ymax": 4.0},
+            "bins_step": 0.1,
+            "period_ms": 200,
+            "sharding": {"workers": 2},
+            "consumer": consumer,
+        },
+        SkeletonsHeatmapOptions(),
+    )
+    if valid:
+        assert validate_options(options, Logger("Test")) is options
+    else:
+        with pytest.raises(SystemExit):
+            validate_options(options, Logger("Test"))
@@ -0,0 +1,242 @@
+import socket
+from multiprocessing import Pipe
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+import pytest
+from google.protobuf.json_format import ParseDict
+
+from is_skeletons_heatmap.binning import HistogramBinning
+from is_skeletons_heatmap.conf.options_pb2 import SkeletonsHeatmapOptions
+from is_skeletons_heatmap.heatmap import SkeletonsHeatmap, heatmap_views
+from is_skeletons_heatmap.localizations import Localizations
+from is_skeletons_heatmap import sharding
+from is_skeletons_heatmap.sharding import (
+    ShardPool,
+    ShardStats,
+    run_shard,
+    shard_buffers,
+    shard_group_ids,
+    write_bins,
+)
+from is_skeletons_heatmap.transformation import StaticTransformationFetcher
+
+from tests.synthetic import synthetic_annotations, synthetic_transformations
+
+
+def create_options() -> SkeletonsHeatmapOptions:
+    # each view replaces every global field
+    view = {
+        "frame_id": 1000,
+        "limits": {"xmin": -3.0, "xmax": 3.0, "ymin": -3.0, "ymax": 3.0},
+        "bins_step": 0.1,
+    }
+    return ParseDict(
+        {
+            "group_ids": [0, 1, 2, 3, 4],
+            "views": [
+                {**view, "topic": "Heatmap.Keypoints"},
+                {**view, "topic": "Heatmap.Skeletons", "average_coordinates": True},
+                {
+                    **view,
+                    "topic": "Heatmap.Layers",
+                    "layers": [
+                        {"name": "Feet", "keypoint_ids": [15, 16]},
+                        {"name": "High", "zmin": 1.0},
+                    ],
+                },
+                # frame 2 has no transformation to frame 1, so its keypoints are dropped
+                {**view, "topic": "Heatmap.Camera", "frame_id": 1, "bins_step": 0.25},
+            ],
+        },
+        SkeletonsHeatmapOptions(),
+    )
+
+
+class Pool(ShardPool):
+    # the pool of 'collect', without worker processes. Each shard is a pipe and a
+    # shared buffer written by the test as a worker would.
+    def __init__(self, binnings, shards):
+        nbytes = sum(2 * binning.size * 8 for binning in binnings)
+        self.memories = [SharedMemory(create=True, size=nbytes) for _ in range(shards)]
+        self._buffers = [shard_buffers(memory, binnings) for memory in self.memories]
+        pipes = [Pipe() for _ in range(shards)]
+        self._connections = [connection for connection, _ in pipes]
+        self.workers = [connection for _, connection in pipes]
+        self._views = len(binnings)
+
+    def release(self):
+        # views of the shared buffers must go before their memory is closed
+        self._buffers = []
+        for memory in self.memories:
+            memory.close()
+            memory.unlink()
+
+
+@pytest.mark.parametrize("workers", [1, 2, 3, 5, 8])
+def test_shard_group_ids_splits_every_stream_once(workers):
+    shards = shard_group_ids([10, 11, 12, 13, 14], workers)
+    assert len(shards) == min(workers, 5)
+    assert all(len(group_ids) > 0 for group_ids in shards)
+    assert sorted(sum(shards, [])) == [10, 11, 12, 13, 14]
+
+
+def test_shard_buffers_do_not_overlap():
+    options = create_options()
+    binnings = [
+        HistogramBinning(limits=view.limits, step=view.bins_step, layers=view.layers)
+        for view, _ in heatmap_views(options, "Heatmap")
+    ]
+    memory = SharedMemory(create=True, size=sum(2 * b.size * 8 for b in binnings))
+    buffers = shard_buffers(memory, binnings)
+    for index, (indices, counts) in enumerate(buffers):
+        assert indices.size == counts.size == binnings[index].size
+        indices[:] = 2 * index
+        counts[:] = 2 * index + 1
+    for index, (indices, counts) in enumerate(buffers):
+        assert np.all(indices == 2 * index) and np.all(counts == 2 * index + 1)
+    del buffers, indices, counts
+    memory.close()
+    memory.unlink()
+
+
+def test_merged_shards_match_single_process():
+    rng = np.random.default_rng(seed=11)
+    options = create_options()
+    views = [view for view, _ in heatmap_views(options, "Heatmap")]
+    frame_ids = [1000, 1, 2]
+    transformations = synthetic_transformations(frame_ids, 1000, rng)
+    transformations[1000] = {1: np.linalg.inv(transformations[1][1000])}
+    fetcher = StaticTransformationFetcher(transformations)
+    binnings = [
+        HistogramBinning(limits=view.limits, step=view.bins_step, layers=view.layers)
+        for view in views
+    ]
+    single = [SkeletonsHeatmap(view, fetcher) for view in views]
+    merged = [SkeletonsHeatmap(view, fetcher) for view in views]
+    shards = shard_group_ids(options.group_ids, workers=3)
+    pool = Pool(binnings, len(shards))
+    try:
+        for _ in range(4):
+            # messages of a period published on each stream
+            published = {
+                group_id: synthetic_annotations(
+                    3, 18, frame_ids, views[0].limits, transformations, 1000, rng
+                )
+                for group_id in options.group_ids
+            }
+            localizations = Localizations(sum(published.values(), []), fetcher)
+            for heatmap in single:
+                heatmap.update_localizations(localizations, timestamp=0.0)
+
+            for worker, buffers, group_ids in zip(pool.workers, pool._buffers, shards):
+                shard = Localizations(
+                    sum((published[group_id] for group_id in group_ids), []), fetcher
+                )
+                sizes = write_bins(shard, views, binnings, buffers)
+                stats = ShardStats(
+                    messages=sum(len(published[group_id]) for group_id in group_ids),
+                    points=len(shard),
+                    untransformable=shard.untransformable,
+                )
+                worker.send((sizes, stats))
+            list_bins, stats = pool.collect()
+            assert all(worker.recv() is True for worker in pool.workers)
+            for heatmap, (indices, counts) in zip(merged, list_bins):
+                # merged bins are unique, as bins counted on a single process
+                assert np.unique(indices).size == indices.size
+                heatmap.update_bins(indices, counts, timestamp=0.0)
+
+            assert stats.messages == 5 * len(frame_ids)
+            assert stats.points == len(localizations)
+            assert stats.untransformable == localizations.untransformable == 5
+        for expected, heatmap in zip(single, merged):
+            np.testing.assert_array_equal(heatmap.get_histogram(), expected.get_histogram())
+            assert expected.get_histogram().sum() > 0
+    finally:
+        pool.release()
+
+
+class WorkerMessage:
+    def __init__(self, annotations):
+        self.annotations = annotations
+
+    def unpack(self, schema):
+        return self.annotations
+
+
+class WorkerChannel:
+    # the broker as seen by a worker, each wakeup receives the messages of a period
+    def __init__(self, batches):
+        self.batches = batches
+        self.connection = type("Connection", (), {"sock": None})()
+        self.received = None
+        self.calls = []
+
+    def __call__(self, uri, exchange, options=None):
+        self.calls.append(("init", options))
+        return self
+
+    def set_prefetch(self, subscription):
+        self.calls.append(("set_prefetch", subscription.name))
+
+    def consume(self, timeout=None):
+        if self.received is None:
+            self.received = list(self.batches.pop(0))
+        if len(self.received) == 0:
+            self.received = None
+            raise socket.timeout()
+        return WorkerMessage(self.received.pop(0))
+
+    def acknowledge(self):
+        self.calls.append(("acknowledge", None))
+
+
+class WorkerSubscription:
+    def __init__(self, channel, name):
+        self.name = name
+
+    def subscribe(self, topic):
+        pass
+
+
+def test_worker_applies_consumer_options(monkeypatch):
+    rng = np.random.default_rng(seed=12)
+    options = create_options()
+    options.consumer.prefetch_count = 10
+    views = [view for view, _ in heatmap_views(options, "Heatmap")]
+    frame_ids = [1000, 1, 2]
+    transformations = synthetic_transformations(frame_ids, 1000, rng)
+    batches = [
+        synthetic_annotations(3, 18, frame_ids, views[0].limits, transformations, 1000, rng)
+        for _ in range(2)
+    ]
+    channel = WorkerChannel([*batches, []])
+    monkeypatch.setattr(sharding, "CustomChannel", channel)
+    monkeypatch.setattr(sharding, "Subscription", WorkerSubscription)
+    monkeypatch.setattr(
+        sharding,
+        "TransformationFetcher",
+        lambda broker_uri, options: StaticTransformationFetcher(transformations),
+    )
+    # the main process is always ready, with two periods and then the request to stop
+    monkeypatch.setattr(sharding, "wait", lambda objects: objects[:1])
+    binnings = [
+        HistogramBinning(limits=view.limits, step=view.bins_step, layers=view.layers)
+        for view in views
+    ]
+    memory = SharedMemory(create=True, size=sum(2 * b.size * 8 for b in binnings))
+    main, worker = Pipe()
+    for request in (True, True, None):
+        main.send(request)
+    try:
+        run_shard("Heatmap.Shard0", options, views, [0, 1], memory.name, worker)
+    finally:
+        memory.close()
+        memory.unlink()
+    assert channel.calls[:2] == [("init", options.consumer), ("set_prefetch", "Heatmap.Shard0")]
+    # messages are acknowledged once per period, after they are binned
+    assert [name for name, _ in channel.calls[2:]] == ["acknowledge", "acknowledge"]
+    for batch in batches:
+        _, stats = main.recv()
+        assert stats.messages == len(batch)
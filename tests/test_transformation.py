@@ -0,0 +1,155 @@
+import numpy as np
+import pytest
+
+from is_skeletons_heatmap import transformation as transformation_module
+from is_skeletons_heatmap.conf.options_pb2 import TransformationOptions
+from is_skeletons_heatmap.transformation import TransformationFetcher
+
+
+class Stop(BaseException):
+    # not caught by the fetcher loop, so tests can end it
+    pass
+
+
+class Clock:
+    def __init__(self):
+        self.time = 0.0
+
+    def now(self):
+        return self.time
+
+
+class Wakeup:
+    # waiting advances the clock instead of blocking, and ends the loop when there
+    # is nothing left to wait for
+    def __init__(self, clock):
+        self.clock = clock
+
+    def wait(self, timeout=None):
+        if timeout is None:
+            raise Stop()
+        self.clock.time += max(timeout, 0.0)
+
+    def set(self):
+        pass
+
+    def clear(self):
+        pass
+
+
+class FakeFetch:
+    def __init__(self, clock, responses, max_calls):
+        self.clock = clock
+        self.responses = responses
+        self.max_calls = max_calls
+        self.calls = []
+
+    def __call__(self, channel, subscription, keys):
+        if len(self.calls) == self.max_calls:
+            raise Stop()
+        self.calls.append((self.clock.time, sorted(keys)))
+        response = self.responses(len(self.calls) - 1)
+        if isinstance(response, Exception):
+            raise response
+        return {key: value for key, value in response.items() if key in keys}
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(transformation_module, "now", clock.now)
+    return clock
+
+
+def create_fetcher(monkeypatch, clock, responses, max_calls, **options):
+    channels = []
+
+    def connect(**kwargs):
+        channels.append(kwargs)
+        return object()
+
+    monkeypatch.setattr(transformation_module, "Channel", connect)
+    monkeypatch.setattr(transformation_module, "Subscription", lambda **kwargs: object())
+    fetcher = TransformationFetcher("amqp://broker", TransformationOptions(**options))
+    fetcher._wakeup = Wakeup(clock)
+    # keeps requests from starting the background thread, '_run' is called by the tests
+    fetcher._thread = object()
+    fetcher._fetch = FakeFetch(clock, responses, max_calls)
+    return fetcher, channels
+
+
+def run(fetcher):
+    with pytest.raises(Stop):
+        fetcher._run()
+    return fetcher._fetch.calls
+
+
+def test_failed_requests_back_off_exponentially(monkeypatch, clock):
+    fetcher, _ = create_fetcher(
+        monkeypatch, clock, lambda _: {}, max_calls=6, timeout_s=1.0, max_backoff_s=4.0
+    )
+    assert fetcher.get_transformation(1, 2) is None
+    calls = run(fetcher)
+    assert [time for time, _ in calls] == pytest.approx([0.0, 1.0, 3.0, 7.0, 11.0, 15.0])
+    assert fetcher._requests[(1, 2)] == pytest.approx((19.0, 4.0))
+
+
+def test_missing_transformations_are_not_requested_again(monkeypatch, clock):
+    fetcher, _ = create_fetcher(monkeypatch, clock, lambda _: {}, max_calls=2, timeout_s=1.0)
+    fetcher.get_transformation(1, 2)
+    run(fetcher)
+    pending = fetcher._requests[(1, 2)]
+    # lookups while waiting for a retry neither reset the backoff nor fetch right away
+    for _ in range(3):
+        assert fetcher.get_transformation(1, 2) is None
+    assert fetcher._requests == {(1, 2): pending}
+
+
+def test_transformations_are_refreshed_after_ttl(monkeypatch, clock):
+    def responses(call):
+        return {(1, 2): np.full((4, 4), call, dtype=np.float64)}
+
+    fetcher, _ = create_fetcher(
+        monkeypatch, clock, responses, max_calls=3, timeout_s=1.0, ttl_s=10.0
+    )
+    fetcher.get_transformation(1, 2)
+    calls = run(fetcher)
+    assert [time for time, _ in calls] == pytest.approx([0.0, 10.0, 20.0])
+    np.testing.assert_array_equal(fetcher.get_transformation(1, 2), np.full((4, 4), 2.0))
+    assert fetcher._requests[(1, 2)] == pytest.approx((30.0, 1.0))
+
+
+def test_transformations_without_ttl_are_fetched_once(monkeypatch, clock):
+    fetcher, _ = create_fetcher(
+        monkeypatch, clock, lambda _: {(1, 2): np.eye(4)}, max_calls=3, timeout_s=1.0
+    )
+    fetcher.get_transformation(1, 2)
+    assert len(run(fetcher)) == 1
+    assert fetcher._requests == {}
+    np.testing.assert_array_equal(fetcher.get_transformation(1, 2), np.eye(4))
+
+
+def test_prefetch_requests_every_source_at_once(monkeypatch, clock):
+    fetcher, _ = create_fetcher(
+        monkeypatch, clock, lambda _: {(1, 3): np.eye(4)}, max_calls=2, timeout_s=1.0
+    )
+    fetcher.prefetch([1, 2, 3], dst=3)
+    calls = run(fetcher)
+    # the destination itself is skipped, and only failed sources are retried
+    assert calls == [(0.0, [(1, 3), (2, 3)]), (1.0, [(2, 3)])]
+    np.testing.assert_array_equal(fetcher.get_transformation(1, 3), np.eye(4))
+    assert fetcher.get_transformation(2, 3) is None
+
+
+def test_fetch_errors_reconnect_and_back_off(monkeypatch, clock):
+    def responses(call):
+        return ConnectionError("broker unavailable") if call == 0 else {(1, 2): np.eye(4)}
+
+    fetcher, channels = create_fetcher(
+        monkeypatch, clock, responses, max_calls=3, timeout_s=1.0, ttl_s=10.0
+    )
+    fetcher.get_transformation(1, 2)
+    calls = run(fetcher)
+    assert [time for time, _ in calls] == pytest.approx([0.0, 1.0, 11.0])
+    # a new connection is only opened after the error
+    assert len(channels) == 2